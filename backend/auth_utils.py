@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
 import os
 from passlib.context import CryptContext
-from jose import jwt
+from jose import JWTError, jwt
 
 # Load secret from environment for security (see SENSITIVE_DATA_MIGRATION.md)
 SECRET_KEY = os.environ.get("AUTH_SECRET_KEY")
@@ -24,4 +24,11 @@ def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
\ No newline at end of file
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+def decode_access_token(token: str):
+    """Claims de um token válido (assinatura e expiração conferidas) ou None."""
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
@@ -0,0 +1,4 @@
+import os
+
+# Os benchmarks medem o backend, não o rate limit (bench_rate_limit liga o seu)
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
@@ -0,0 +1,134 @@
+"""
+Benchmark: single-flight (coalesce.py) num pico de perguntas iguais no /chat.
+
+Rajada de --requests /chat concorrentes, cada um numa sessão, com --questions
+perguntas distintas escritas de jeitos diferentes (caixa, acentos, pontuação,
+espaços). Stub do Prompt Flow com latência fixa e Cosmos em memória.
+
+- chamadas ao /score, p50/p95 do /chat e histórico gravado por sessão, com o
+  coalescing desligado e ligado
+- chaves distintas da rajada para cada normalização (texto exato ... padrão)
+- segunda rajada depois da primeira terminar: chamadas novas (não é cache)
+
+Uso (a partir de backend/):
+    AUTH_SECRET_KEY=dev python -m benchmarks.bench_coalesce --requests 200 --questions 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+# Antes de importar main: a rajada vem de poucos usuários; /internal/metrics exige o token de admin
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("INTERNAL_METRICS_TOKEN", "bench")
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks.fake_cosmos import install_fake_containers  # noqa: E402
+from benchmarks.stub_pf_server import create_app, serve_in_thread  # noqa: E402
+from auth_utils import create_access_token  # noqa: E402
+from coalesce import SingleFlight, single_flight  # noqa: E402
+
+QUESTIONS = [
+    "Qual a proposta do Eduardo Paes para a saúde?",
+    "O que os candidatos propõem para o transporte público?",
+    "Quem tem proposta de tarifa zero no ônibus?",
+    "Compare Maria e João na educação",
+    "Quando é o primeiro turno da eleição?",
+    "Qual candidato defende mais creches?",
+    "O que o Ciro Gomes propõe para a segurança?",
+    "Qual a proposta para o Maracanã?",
+]
+VARIANTS = [
+    lambda q: q,
+    lambda q: q.lower(),
+    lambda q: q.rstrip("?") + " ?",
+    lambda q: "  " + q.upper() + "  ",
+    lambda q: q.replace("ú", "u").replace("é", "e").replace("ô", "o").replace("ã", "a"),
+]
+# Dono das sessões da rajada: GET /history só devolve sessões do usuário do token
+BENCH_EMAIL = "coalesce@example.com"
+NORMALIZATIONS = ["", "whitespace", "casefold,whitespace", "casefold,accents,punctuation,whitespace"]
+
+
+def burst_messages(n, questions):
+    return [VARIANTS[(i // questions) % len(VARIANTS)](QUESTIONS[i % questions]) for i in range(n)]
+
+
+def client_for(base_url):
+    # Um cliente por fase: conexões ociosas entre as rajadas são fechadas pelo uvicorn (keep-alive)
+    return httpx.AsyncClient(base_url=base_url, timeout=None, limits=httpx.Limits(max_connections=None))
+
+
+async def burst(base_url, messages, label):
+    async def one(i, message):
+        t0 = time.perf_counter()
+        resp = await client.post("/chat", json={"message": message, "session_id": f"{label}-{i}",
+                                                "user_email": BENCH_EMAIL})
+        resp.raise_for_status()
+        return (time.perf_counter() - t0) * 1000
+
+    async with client_for(base_url) as client:
+        return sorted(await asyncio.gather(*(one(i, m) for i, m in enumerate(messages))))
+
+
+async def saved_sessions(base_url, n, label):
+    """Sessões com pergunta e resposta gravadas (GET /history espera o write-behind da sessão)."""
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': BENCH_EMAIL})}"}
+    async with client_for(base_url) as client:
+        histories = await asyncio.gather(*(client.get(f"/history/{label}-{i}", headers=headers) for i in range(n)))
+    return sum(len(resp.json()["items"]) == 2 for resp in histories)
+
+
+async def bench(base_url, calls, messages):
+    for label, enabled in (("desligado", False), ("ligado", True)):
+        single_flight.enabled = enabled
+        before = len(calls)
+        totals = await burst(base_url, messages, label)
+        saved = await saved_sessions(base_url, len(messages), label)
+        print(f"coalescing {label:9}  /score: {len(calls) - before:4d} chamadas  /chat p50 "
+              f"{statistics.median(totals):7.1f} ms  p95 {totals[int(0.95 * (len(totals) - 1))]:7.1f} ms  "
+              f"histórico completo: {saved}/{len(messages)} sessões")
+
+    before = len(calls)
+    await burst(base_url, messages, "segunda")
+    print(f"segunda rajada (depois da primeira terminar): {len(calls) - before} chamadas ao /score")
+    async with client_for(base_url) as client:
+        metrics = (await client.get("/internal/metrics", headers={"X-Internal-Token": main.INTERNAL_METRICS_TOKEN})
+                   ).json()["coalescing"]
+    print(f"/internal/metrics coalescing: {metrics}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    messages = burst_messages(args.requests, min(args.questions, len(QUESTIONS)))
+    print(f"rajada: {len(messages)} /chat concorrentes, {args.questions} perguntas x {len(VARIANTS)} grafias")
+    for steps in NORMALIZATIONS:
+        keys = {SingleFlight(normalize=steps).key({"user_query": m, "user_tier": "default"}) for m in messages}
+        print(f"  normalização {steps or '(texto exato)':42} {len(keys):4d} chaves")
+    print()
+
+    install_fake_containers(main.db)
+    app = create_app(args.latency_ms)
+    calls = []
+
+    @app.middleware("http")
+    async def count(request, call_next):
+        calls.append(request.url.path)
+        return await call_next(request)
+
+    with serve_in_thread(app) as pf_url:
+        main.PF_ENDPOINT_URL = f"{pf_url}/score"
+        with serve_in_thread(main.app) as base_url:
+            asyncio.run(bench(base_url, calls, messages))
+
+
+if __name__ == "__main__":
+    main_cli()
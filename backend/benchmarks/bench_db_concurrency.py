@@ -0,0 +1,69 @@
+"""
+Benchmark: requests/s do backend com Cosmos bloqueante (SDK síncrono) vs. assíncrono.
+
+Usa o stand-in em memória (benchmarks/fake_cosmos.py) com latência simulada por
+round-trip e o stub do Prompt Flow. No modo "blocking" cada chamada ao Cosmos
+trava o event loop, como acontecia com azure.cosmos.CosmosClient.
+
+Uso (a partir de backend/):
+    AUTH_SECRET_KEY=dev python -m benchmarks.bench_db_concurrency --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+import main
+from auth_utils import create_access_token
+from benchmarks.fake_cosmos import install_fake_containers, seed_history
+from benchmarks.stub_pf_server import run_stub_server
+
+# Dono das sessões: GET /history só devolve sessões do usuário do token
+BENCH_EMAIL = "bench@example.com"
+
+
+async def run(label, n, concurrency):
+    transport = httpx.ASGITransport(app=main.app)
+    sem = asyncio.Semaphore(concurrency)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': BENCH_EMAIL})}"}
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://backend", timeout=None) as client:
+        async def one(i):
+            async with sem:
+                sid = f"session_{i % concurrency}"
+                if i % 2:
+                    resp = await client.get(f"/history/{sid}", headers=headers)
+                else:
+                    resp = await client.post("/chat", json={"message": "Qual a proposta?", "session_id": sid,
+                                                            "user_email": BENCH_EMAIL})
+                resp.raise_for_status()
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n)))
+        elapsed = time.perf_counter() - t0
+
+    print(f"{label:<10} {n / elapsed:8.1f} req/s  ({n} requests, concurrency={concurrency})")
+    await main.pf_client.close()
+    await main.db.close()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--cosmos-latency-ms", type=float, default=10.0)
+    parser.add_argument("--pf-latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    with run_stub_server(latency_ms=args.pf_latency_ms) as url:
+        main.PF_ENDPOINT_URL = url
+        for label, blocking in (("blocking", True), ("async", False)):
+            install_fake_containers(main.db, latency_ms=args.cosmos_latency_ms, blocking=blocking)
+            for i in range(args.concurrency):
+                seed_history(main.db, f"session_{i}", 0, BENCH_EMAIL)
+            asyncio.run(run(label, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,82 @@
+"""
+Benchmark: novo httpx.AsyncClient por request vs. PromptFlowClient compartilhado.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_pf_client --requests 500 --concurrency 20
+    python -m benchmarks.bench_pf_client --url https://civic-flow-api.azurewebsites.net/score
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from pf_client import PromptFlowClient
+from benchmarks.stub_pf_server import run_stub_server
+
+PAYLOAD = {"user_query": "Qual a proposta do Eduardo Paes?", "session_id": "bench", "user_tier": "default"}
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+async def per_request_client(url):
+    # Comportamento antigo do /chat
+    async with httpx.AsyncClient() as client:
+        return await client.post(url, json=PAYLOAD, timeout=60)
+
+
+async def run(label, send, n, concurrency):
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            t0 = time.perf_counter()
+            resp = await send()
+            resp.raise_for_status()
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n)))
+    elapsed = time.perf_counter() - t0
+    print(
+        f"{label:<22} p50={percentile(latencies, 50):7.2f}ms  p95={percentile(latencies, 95):7.2f}ms  "
+        f"mean={statistics.mean(latencies):7.2f}ms  rps={n / elapsed:8.1f}"
+    )
+
+
+async def bench(url, n, concurrency):
+    await run("new client / request", lambda: per_request_client(url), n, concurrency)
+
+    shared = PromptFlowClient()
+    await shared.start()
+    try:
+        await run("shared pooled client", lambda: shared.post(url, json=PAYLOAD), n, concurrency)
+        print("pool stats:", shared.stats())
+    finally:
+        await shared.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="latência simulada do stub")
+    parser.add_argument("--url", help="endpoint real (pula o stub local)")
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(bench(args.url, args.requests, args.concurrency))
+        return
+
+    with run_stub_server(latency_ms=args.latency_ms) as url:
+        asyncio.run(bench(url, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark do rate limit (rate_limit.py).
+
+1. Atomicidade: P processos × T threads disputam a mesma janela diária de L
+   requisições. Contadores por processo sem lock (o SimpleProtection antigo)
+   deixam passar ~P × L; o backend SQLite compartilhado deixa passar exatamente L.
+2. Custo por acquire() em cada backend (3 regras: usuário burst/dia + tier).
+3. /chat ponta a ponta com o stub do Prompt Flow: rajada de um usuário (JWT no
+   Authorization); as requisições negadas voltam 429 sem chamar o Prompt Flow.
+   Rajada sem token trocando o user_email do corpo: continua no limite anônimo
+   do IP.
+
+Uso (a partir de backend/):
+    AUTH_SECRET_KEY=dev python -m benchmarks.bench_rate_limit --processes 4 --threads 8
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+import httpx
+
+import main
+import rate_limit
+from auth_utils import create_access_token
+from benchmarks.fake_cosmos import install_fake_containers
+from benchmarks.stub_pf_server import run_stub_server
+from rate_limit import MemoryBackend, RateLimiter, Rule, SQLiteBackend, SlidingWindow, request_rules
+
+
+class LegacyCounter:
+    """Contador do SimpleProtection antigo: global do processo, sem lock."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.count = 0
+
+    def check_and_increment(self):
+        if self.count >= self.limit:
+            return False
+        self.count += 1
+        return True
+
+
+def worker(mode, db_path, limit, threads, attempts, out):
+    if mode == "legacy":
+        counter = LegacyCounter(limit)
+        check = counter.check_and_increment
+    else:
+        limiter = RateLimiter(SQLiteBackend(db_path), prefix="bench")
+        rule = Rule("global:requests:day", SlidingWindow(limit, rate_limit.DAY_SECONDS))
+        check = lambda: limiter.acquire([rule])["allowed"]
+
+    allowed = [0] * threads
+
+    def run(i):
+        for _ in range(attempts):
+            allowed[i] += check()
+
+    pool = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    out.put(sum(allowed))
+
+
+def atomicity(processes, threads, limit, attempts):
+    print(f"1. atomicidade: {processes} processos × {threads} threads × {attempts} tentativas, limite {limit}/dia")
+    for mode in ("legacy", "sqlite"):
+        db_path = os.path.join(tempfile.mkdtemp(), "rate_limits.db")
+        if mode == "sqlite":
+            SQLiteBackend(db_path)  # cria a tabela antes dos workers
+        out = multiprocessing.Queue()
+        t0 = time.perf_counter()
+        procs = [
+            multiprocessing.Process(target=worker, args=(mode, db_path, limit, threads, attempts, out))
+            for _ in range(processes)
+        ]
+        for p in procs:
+            p.start()
+        total = sum(out.get() for _ in procs)
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - t0
+        label = "antes (contador por processo)" if mode == "legacy" else "sqlite compartilhado"
+        print(f"   {label:32} permitidas {total:5d} (limite {limit}, {total / limit:.1f}×)  {elapsed:.2f}s")
+
+
+def throughput(n):
+    print(f"\n2. custo por acquire() ({n} chamadas, 3 regras)")
+    db_path = os.path.join(tempfile.mkdtemp(), "rate_limits.db")
+    for label, backend in (("memory", MemoryBackend()), ("sqlite", SQLiteBackend(db_path))):
+        limiter = RateLimiter(backend, prefix="bench")
+        t0 = time.perf_counter()
+        for i in range(n):
+            limiter.acquire(request_rules(f"user{i % 100}@x.com", "default"))
+        elapsed = time.perf_counter() - t0
+        print(f"   {label:8} {elapsed / n * 1e6:8.1f} µs/acquire  {n / elapsed:9.0f} acquires/s")
+
+
+async def burst(client, n, token=None):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+
+    async def one(i):
+        # user_email do corpo muda a cada requisição: não pode separar os limites
+        return await client.post("/chat", headers=headers, json={
+            "message": "Qual a proposta?", "session_id": "bench", "user_email": f"spoof{i}@x.com"
+        })
+
+    return await asyncio.gather(*(one(i) for i in range(n)))
+
+
+async def bursts(n):
+    transport = httpx.ASGITransport(app=main.app)
+    token = create_access_token({"sub": "burst@x.com"})
+    async with httpx.AsyncClient(transport=transport, base_url="http://backend", timeout=None) as client:
+        for label, tier, bearer in (("JWT de burst@x.com", "default", token), ("sem token (IP)", "anonymous", None)):
+            _, limits = rate_limit.tier_limits(tier)
+            before = main.pf_client.stats()["requests_total"]
+            responses = await burst(client, n, bearer)
+            pf_calls = main.pf_client.stats()["requests_total"] - before
+            codes = [r.status_code for r in responses]
+            print(f"   {label:20} (tier {tier}, burst {limits['burst']})  200: {codes.count(200)}  "
+                  f"429: {codes.count(429)}  chamadas ao Prompt Flow: {pf_calls}")
+            denied = [r for r in responses if r.status_code == 429]
+            if denied:
+                print(f"   {'':20} 429 Retry-After: {denied[0].headers.get('retry-after')}s  "
+                      f"corpo: {denied[0].json()['detail']}")
+    await main.pf_client.close()
+    await main.db.close()
+
+
+def end_to_end(n):
+    print(f"\n3. /chat: rajadas de {n} requisições")
+    rate_limit.RATE_LIMIT_ENABLED = True
+    rate_limit.limiter = RateLimiter(MemoryBackend(), prefix="bench")
+    with run_stub_server(latency_ms=20) as url:
+        main.PF_ENDPOINT_URL = url
+        install_fake_containers(main.db, latency_ms=1)
+        asyncio.run(bursts(n))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--attempts", type=int, default=100)
+    parser.add_argument("--acquires", type=int, default=5000)
+    parser.add_argument("--burst", type=int, default=20)
+    args = parser.parse_args()
+
+    atomicity(args.processes, args.threads, args.limit, args.attempts)
+    throughput(args.acquires)
+    end_to_end(args.burst)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,136 @@
+"""
+Benchmark: backend de ponta a ponta com o flow real em replay.
+
+O /score é o multi-agents/benchmarks/flow_server.py (DAG do Prompt Flow de
+verdade, LLM/embeddings/busca servidos do fixture store do llm_replay), num
+processo separado. Cosmos em memória (fake_cosmos).
+
+- grava o fixture store (bench_replay --record-only do multi-agents) se --store
+  não for passado
+- /chat com as perguntas dos datasets: p50/p95, respostas idênticas entre as
+  rodadas, e o GET /internal/latency (etapas do backend + flow.<etapa>)
+
+Uso (a partir de backend/):
+    AUTH_SECRET_KEY=dev python -m benchmarks.bench_replay [--rounds 3] [--concurrency 4]
+"""
+import argparse
+import asyncio
+import csv
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Antes de importar main: /internal/latency exige o token de admin
+os.environ.setdefault("INTERNAL_METRICS_TOKEN", "bench")
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks.fake_cosmos import install_fake_containers  # noqa: E402
+from benchmarks.stub_pf_server import free_port, serve_in_thread  # noqa: E402
+
+MULTI_AGENTS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "multi-agents")
+DATASETS = ["dataset_refinamento.csv", "test_dataset.csv"]
+STAGES = ("POST /chat", "prompt_flow", "cosmos.save_message", "rate_limit", "flow.rag_retriever",
+          "flow.policy_summarizer", "flow.intent_agent", "flow.context_budgeter")
+
+
+def load_queries():
+    queries = []
+    for name in DATASETS:
+        with open(os.path.join(MULTI_AGENTS_DIR, name), encoding="utf-8") as f:
+            queries.extend(row["user_query"] for row in csv.DictReader(f))
+    return queries
+
+
+def record_fixtures(store):
+    subprocess.run([sys.executable, "-m", "benchmarks.bench_replay", "--record-only", "--store", store],
+                   cwd=MULTI_AGENTS_DIR, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def start_flow_server(store, latency):
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.flow_server", "--store", store, "--port", str(port), "--latency", latency],
+        cwd=MULTI_AGENTS_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    # Pronto quando o executor foi criado e a porta aceita conexões
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline and proc.poll() is None:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return proc, f"http://127.0.0.1:{port}/score"
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("flow_server não iniciou")
+
+
+async def run_round(client, queries, concurrency, round_id):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i, query):
+        async with semaphore:
+            t0 = time.perf_counter()
+            resp = await client.post("/chat", json={"message": query, "session_id": f"replay-{round_id}-{i}"})
+            return query, resp.json()["final_response"]["answer"], (time.perf_counter() - t0) * 1000
+
+    return await asyncio.gather(*(one(i, q) for i, q in enumerate(queries)))
+
+
+async def bench(base_url, queries, rounds, concurrency):
+    answers, totals = {}, []
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        for round_id in range(rounds):
+            for query, answer, ms in await run_round(client, queries, concurrency, round_id):
+                answers.setdefault(query, set()).add(answer)
+                totals.append(ms)
+        report = (await client.get("/internal/latency", headers={"X-Internal-Token": main.INTERNAL_METRICS_TOKEN})).json()
+    return answers, sorted(totals), report
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--store", help="Fixture store já gravado (padrão: grava num diretório temporário)")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", default="none", help="Latência do replay: none | recorded | ms")
+    args = parser.parse_args()
+
+    store = args.store
+    if not store:
+        store = tempfile.mkdtemp(prefix="replay_fixtures_")
+        print(f"gravando fixtures em {store} ...")
+        record_fixtures(store)
+
+    install_fake_containers(main.db)
+    queries = load_queries()
+    proc, pf_url = start_flow_server(store, args.latency)
+    try:
+        main.PF_ENDPOINT_URL = pf_url
+        with serve_in_thread(main.app) as base_url:
+            answers, totals, report = asyncio.run(bench(base_url, queries, args.rounds, args.concurrency))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    failed = sum(any(a.startswith("Erro") for a in values) for values in answers.values())
+    stable = sum(len(values) == 1 for values in answers.values())
+    print(f"/chat com o flow em replay (latência {args.latency}): {args.rounds} rodadas x {len(queries)} perguntas, "
+          f"concorrência {args.concurrency}")
+    print(f"  respostas idênticas entre rodadas: {stable}/{len(answers)}; com erro: {failed}")
+    print(f"  p50 {statistics.median(totals):.1f} ms, p95 {totals[int(0.95 * (len(totals) - 1))]:.1f} ms")
+    print(f"\n/internal/latency (janela {report['window']}):")
+    print(f"  {'etapa':24} {'n':>5} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for stage in STAGES:
+        s = report["stages"].get(stage)
+        if s:
+            print(f"  {stage:24} {s['count']:5d} {s['p50_ms']:8.2f} {s['p95_ms']:8.2f} {s['p99_ms']:8.2f}")
+
+
+if __name__ == "__main__":
+    main_cli()
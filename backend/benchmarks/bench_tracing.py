@@ -0,0 +1,103 @@
+"""
+Benchmark: propagação do trace /chat -> Prompt Flow, latência por etapa e custo dos spans.
+
+- um traceparent enviado pelo cliente vira o trace de todos os spans do backend,
+  chega ao payload do /score e volta no trace_id da resposta
+- GET /internal/latency depois de N requisições (etapas do backend + flow.<etapa>
+  devolvidas pelo stub)
+- custo de um span (exportador none / memory) e de /chat com o stub sem latência
+
+Uso (a partir de backend/):
+    AUTH_SECRET_KEY=dev python -m benchmarks.bench_tracing --requests 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+# Antes de importar main: spans em memória para conferir a árvore; /internal/latency exige o token de admin
+os.environ.setdefault("TRACE_EXPORTER", "memory")
+os.environ.setdefault("INTERNAL_METRICS_TOKEN", "bench")
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks.fake_cosmos import install_fake_containers  # noqa: E402
+from benchmarks.stub_pf_server import create_app, serve_in_thread  # noqa: E402
+from telemetry import BackendTelemetry, telemetry  # noqa: E402
+
+TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+BODY = {"message": "Qual a proposta do Eduardo Paes?", "session_id": "bench-trace"}
+
+
+def span_cost(exporter, n=20000):
+    """µs por span (start/end com atributos), com StageStats sempre ligado."""
+    from telemetry import create_processor
+    bench = BackendTelemetry(processor=create_processor(exporter))
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with bench.span("stage", attr="x"):
+            pass
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+async def propagation(client, received):
+    resp = await client.post("/chat", json=BODY, headers={"traceparent": TRACEPARENT})
+    expected = TRACEPARENT.split("-")[1]
+    await asyncio.sleep(0.2)  # cosmos.flush (write-behind) termina em segundo plano
+    spans = [s for s in telemetry.processor.span_exporter.spans if s["trace_id"] == expected]
+    print("propagação (traceparent do cliente):")
+    print(f"  trace_id da resposta     {resp.json()['trace_id']}  {'ok' if resp.json()['trace_id'] == expected else 'DIFERENTE'}")
+    print(f"  traceparent no /score    {received[-1]}")
+    print(f"  spans do backend no trace: {', '.join(s['name'] for s in spans)}")
+
+
+async def latency_stats(client, n):
+    totals = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        await client.post("/chat", json=BODY)
+        totals.append((time.perf_counter() - t0) * 1000)
+    report = (await client.get("/internal/latency", headers={"X-Internal-Token": main.INTERNAL_METRICS_TOKEN})).json()
+    print(f"\n/internal/latency após {n} requisições (janela {report['window']}):")
+    print(f"  {'etapa':24} {'n':>5} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for stage, s in report["stages"].items():
+        print(f"  {stage:24} {s['count']:5d} {s['p50_ms']:8.2f} {s['p95_ms']:8.2f} {s['p99_ms']:8.2f}")
+    return statistics.median(totals)
+
+
+async def bench(base_url, received, n):
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        await propagation(client, received)
+        return await latency_stats(client, n)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    install_fake_containers(main.db)
+
+    app = create_app(args.latency_ms)
+    received = []
+
+    @app.middleware("http")
+    async def capture(request, call_next):
+        received.append(request.headers.get("traceparent"))
+        return await call_next(request)
+
+    with serve_in_thread(app) as pf_url:
+        main.PF_ENDPOINT_URL = f"{pf_url}/score"
+        with serve_in_thread(main.app) as base_url:
+            median = asyncio.run(bench(base_url, received, args.requests))
+
+    print(f"\n/chat mediana {median:.2f} ms (stub com {args.latency_ms:.0f} ms)")
+    for exporter in ("none", "memory"):
+        print(f"custo por span (exportador {exporter:6}) {span_cost(exporter):6.1f} µs")
+
+
+if __name__ == "__main__":
+    main_cli()
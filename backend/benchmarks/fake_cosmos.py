@@ -0,0 +1,242 @@
+"""
+Stand-in em memória para os containers do Cosmos usados pelo DatabaseManager.
+Imita a API de azure.cosmos.aio (métodos async, query_items paginável) e
+simula a latência de rede de cada round-trip.
+
+Documentos guardados por partição: queries com partition_key e batches só
+tocam a própria partição, então o stand-in não vira o gargalo num teste de
+carga com muitas sessões.
+
+blocking=True reproduz o comportamento antigo (SDK síncrono dentro de handlers
+async): a latência é um time.sleep que trava o event loop inteiro.
+"""
+import asyncio
+import copy
+import random
+import re
+import time
+import uuid
+from datetime import datetime
+
+from azure.cosmos import exceptions
+
+_SELECT = re.compile(r"SELECT\s+(.*?)\s+FROM", re.IGNORECASE | re.DOTALL)
+_WHERE_CLAUSE = re.compile(r"c\.(\w+)\s*(=|!=|>=|<=|>|<)\s*(@\w+)")
+_ORDER_BY = re.compile(r"ORDER BY c\.(\w+)(?:\s+(ASC|DESC))?", re.IGNORECASE)
+_OPS = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">": lambda a, b: a is not None and a > b,
+    "<": lambda a, b: a is not None and a < b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "<=": lambda a, b: a is not None and a <= b,
+}
+
+
+class FakeItemPaged:
+    """Equivalente mínimo de AsyncItemPaged: `async for` e `.by_page()`."""
+
+    def __init__(self, container, items, max_item_count=None, project=copy.deepcopy):
+        self.container = container
+        self.items = items
+        # Cópia (ou projeção do SELECT) feita só para os itens efetivamente lidos
+        self.project = project
+        self.page_size = max_item_count or len(items) or 1
+        self.continuation_token = None
+
+    async def __aiter__(self):
+        await self.container._latency()
+        for item in self.items:
+            yield self.project(item)
+
+    def by_page(self, continuation_token=None):
+        return _FakePager(self, int(continuation_token or 0))
+
+
+class _FakePager:
+    def __init__(self, paged, offset):
+        self.paged = paged
+        self.offset = offset
+        self.continuation_token = None
+        self._done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._done:
+            raise StopAsyncIteration
+        await self.paged.container._latency()
+        end = self.offset + self.paged.page_size
+        page = self.paged.items[self.offset:end]
+        self.offset = end
+        if end >= len(self.paged.items):
+            self._done = True
+            self.continuation_token = None
+        else:
+            self.continuation_token = str(end)
+        return _aiter_list(page, self.paged.project)
+
+
+async def _aiter_list(items, project):
+    for item in items:
+        yield project(item)
+
+
+class FakeContainer:
+    def __init__(self, container_id, partition_key_path, latency_ms=0.0, blocking=False, throttle_rate=0.0):
+        self.id = container_id
+        self.pk_field = partition_key_path.lstrip("/")
+        self.latency_ms = latency_ms
+        self.blocking = blocking
+        # Fração de chamadas em batch respondidas com 429 (testa o retry do HistoryWriter)
+        self.throttle_rate = throttle_rate
+        self.partitions = {}  # partition_key -> {id: documento}
+        self.calls = 0
+
+    def __len__(self):
+        return sum(len(docs) for docs in self.partitions.values())
+
+    async def _latency(self):
+        self.calls += 1
+        if not self.latency_ms:
+            return
+        if self.blocking:
+            time.sleep(self.latency_ms / 1000)
+        else:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+    def _partition(self, partition_key):
+        return self.partitions.setdefault(partition_key, {})
+
+    async def create_item(self, body, **kwargs):
+        await self._latency()
+        docs = self._partition(body.get(self.pk_field))
+        if body["id"] in docs:
+            raise exceptions.CosmosResourceExistsError(status_code=409, message="Conflict")
+        docs[body["id"]] = copy.deepcopy(body)
+        return copy.deepcopy(body)
+
+    async def execute_item_batch(self, batch_operations, partition_key, **kwargs):
+        """Batch transacional: tudo ou nada dentro de uma partição."""
+        await self._latency()
+        if self.throttle_rate and random.random() < self.throttle_rate:
+            raise exceptions.CosmosHttpResponseError(status_code=429, message="Too Many Requests")
+        staged = dict(self._partition(partition_key))
+        results = []
+        for index, (op, args) in enumerate(batch_operations):
+            body = args[0]
+            if op not in ("create", "upsert"):
+                raise NotImplementedError(op)
+            if op == "create" and body["id"] in staged:
+                # Como o SDK: a operação que falhou e 424 (Failed Dependency) nas demais
+                responses = [{"statusCode": 424} for _ in batch_operations]
+                responses[index] = {"statusCode": 409}
+                raise exceptions.CosmosBatchOperationError(
+                    error_index=index, headers={}, status_code=409, operation_responses=responses,
+                    message=f"There was an error in the transactional batch on index {index}. Error message: Conflict"
+                )
+            staged[body["id"]] = copy.deepcopy(body)
+            results.append({"statusCode": 201})
+        self.partitions[partition_key] = staged
+        return results
+
+    async def patch_item(self, item, partition_key, patch_operations, **kwargs):
+        await self._latency()
+        doc = self.partitions.get(partition_key, {}).get(item)
+        if doc is None:
+            raise exceptions.CosmosResourceNotFoundError(status_code=404, message="Not Found")
+        for op in patch_operations:
+            field = op["path"].lstrip("/")
+            if op["op"] == "incr":
+                doc[field] = doc.get(field, 0) + op["value"]
+            elif op["op"] in ("set", "add", "replace"):
+                doc[field] = op["value"]
+            elif op["op"] == "remove":
+                doc.pop(field, None)
+        return copy.deepcopy(doc)
+
+    async def upsert_item(self, body, **kwargs):
+        await self._latency()
+        self._partition(body.get(self.pk_field))[body["id"]] = copy.deepcopy(body)
+        return copy.deepcopy(body)
+
+    async def read_item(self, item, partition_key, **kwargs):
+        await self._latency()
+        doc = self.partitions.get(partition_key, {}).get(item)
+        if doc is None:
+            raise exceptions.CosmosResourceNotFoundError(status_code=404, message="Not Found")
+        return copy.deepcopy(doc)
+
+    async def delete_item(self, item, partition_key, **kwargs):
+        await self._latency()
+        if self.partitions.get(partition_key, {}).pop(item, None) is None:
+            raise exceptions.CosmosResourceNotFoundError(status_code=404, message="Not Found")
+
+    def read_all_items(self, max_item_count=None, **kwargs):
+        docs = [d for partition in self.partitions.values() for d in partition.values()]
+        return FakeItemPaged(self, docs, max_item_count)
+
+    def query_items(self, query, parameters=None, partition_key=None, max_item_count=None, **kwargs):
+        params = {p["name"]: p["value"] for p in (parameters or [])}
+        if partition_key is None:
+            docs = [d for partition in self.partitions.values() for d in partition.values()]
+        else:
+            docs = list(self.partitions.get(partition_key, {}).values())
+
+        where = query.split("WHERE", 1)[1] if "WHERE" in query else ""
+        where = _ORDER_BY.split(where)[0]
+        for field, op, name in _WHERE_CLAUSE.findall(where):
+            docs = [d for d in docs if _OPS[op](d.get(field), params[name])]
+
+        order = _ORDER_BY.search(query)
+        if order:
+            field, direction = order.group(1), (order.group(2) or "ASC").upper()
+            # Assim como no Cosmos, itens sem o campo de ordenação ficam de fora
+            docs = sorted((d for d in docs if field in d), key=lambda d: d[field], reverse=direction == "DESC")
+
+        return FakeItemPaged(self, docs, max_item_count, _projection(query))
+
+
+def _projection(query):
+    """Cópia do documento com só os campos do SELECT (SELECT * devolve tudo)."""
+    fields = _SELECT.match(query.strip()).group(1).strip()
+    if fields == "*":
+        return copy.deepcopy
+    names = [f.strip().split(".", 1)[1] for f in fields.split(",")]
+    return lambda doc: {name: copy.deepcopy(doc[name]) for name in names if name in doc}
+
+
+def seed_history(manager, session_id, n, user_email=None):
+    """
+    Pré-carrega n mensagens numa sessão (direto no container, sem passar pelo HistoryWriter).
+    Com user_email, cria também o resumo da sessão (GET /history só devolve sessões do usuário).
+    """
+    from database import next_seq
+    docs = manager.history._partition(session_id)
+    for i in range(n):
+        msg = {
+            "id": str(uuid.uuid4()),
+            "session_id": session_id,
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Mensagem {i} da sessão {session_id}",
+            "timestamp": str(datetime.utcnow()),
+            "seq": next_seq()
+        }
+        if user_email:
+            msg["user_email"] = user_email
+        docs[msg["id"]] = msg
+    if user_email:
+        now = str(datetime.utcnow())
+        manager.sessions._partition(user_email).setdefault(session_id, {
+            "id": session_id, "user_email": user_email, "title": f"Sessão {session_id}",
+            "created_at": now, "last_message_at": now, "last_seq": next_seq(), "message_count": n
+        })
+
+
+def install_fake_containers(manager, latency_ms=0.0, blocking=False):
+    """Troca os containers reais do DatabaseManager pelos stand-ins em memória."""
+    manager.users = FakeContainer("Users", "/email", latency_ms, blocking)
+    manager.history = FakeContainer("ChatHistory", "/session_id", latency_ms, blocking)
+    manager.sessions = FakeContainer("Sessions", "/user_email", latency_ms, blocking)
+    return manager
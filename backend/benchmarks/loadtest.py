@@ -0,0 +1,347 @@
+"""
+Teste de carga do backend (main.py) com stand-ins locais: Prompt Flow stubado
+(stub_pf_server, latência sorteada de uma distribuição) e Cosmos em memória
+(fake_cosmos, latência por round-trip). Responde quantos chats concorrentes
+uma instância sustenta.
+
+Cenários (--scenarios, nesta ordem):
+- auth: rajada de signup de --users usuários, depois signin de todos
+- chat: --sessions sessões concorrentes; cada uma cria a sessão (POST /sessions)
+  e manda --turns mensagens em sequência (loop fechado, --think-ms entre elas)
+- history: recarga da barra lateral e do histórico de cada sessão (--reloads
+  vezes), com --history-size mensagens pré-carregadas por sessão
+
+Relatório por operação: requisições, erros, throughput (req/s no cenário) e
+p50/p95/p99/max. SLOs (LOADTEST_SLOS, --slo): "operação.métrica<=valor" ou
+">=", com as métricas p50_ms, p95_ms, p99_ms, max_ms, rps e error_rate.
+--baseline compara com um relatório salvo (--output): p95 maior (além de
+LOADTEST_MAX_REGRESSION e de LOADTEST_MIN_REGRESSION_MS), rps menor que
+LOADTEST_MAX_REGRESSION ou mais erros também reprovam. Sai com 1 se algo reprovar.
+
+--repeat N roda os cenários N vezes e usa a mediana de cada métrica (máquinas
+compartilhadas oscilam ~20% entre execuções, tanto quanto a tolerância padrão).
+
+--base-url mede um backend já rodando (os stand-ins ficam por conta de quem
+o subiu, ex.: python -m benchmarks.stub_pf_server); sem pré-carga do histórico.
+
+Uso (a partir de backend/):
+    AUTH_SECRET_KEY=dev python -m benchmarks.loadtest --sessions 50 --pf-latency lognormal:800,2500
+    AUTH_SECRET_KEY=dev python -m benchmarks.loadtest --output load_baseline.json
+    AUTH_SECRET_KEY=dev python -m benchmarks.loadtest --baseline load_baseline.json --slo chat.rps>=10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter
+
+# Antes de importar main: mede a capacidade do backend, não a política de rate
+# limit (RATE_LIMIT_ENABLED=true inclui o limiter; 429 conta como erro)
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from auth_utils import create_access_token  # noqa: E402
+from benchmarks.fake_cosmos import install_fake_containers, seed_history  # noqa: E402
+from benchmarks.stub_pf_server import run_stub_server, serve_in_thread  # noqa: E402
+from telemetry import percentile  # noqa: E402
+
+# Configuração (Variáveis de Ambiente)
+LOADTEST_SLOS = os.getenv(
+    "LOADTEST_SLOS",
+    "signup.error_rate<=0,signin.error_rate<=0,chat.error_rate<=0.01,chat.p95_ms<=5000,history.p95_ms<=3000"
+)
+LOADTEST_MAX_REGRESSION = float(os.getenv("LOADTEST_MAX_REGRESSION", "0.2"))  # p95 +20% / rps -20%
+# Variação de p95 abaixo disso é ruído (operações curtas oscilam dezenas de ms entre execuções)
+LOADTEST_MIN_REGRESSION_MS = float(os.getenv("LOADTEST_MIN_REGRESSION_MS", "100"))
+
+SCENARIOS = ("auth", "chat", "history")
+PASSWORD = "Carga123!"
+QUESTIONS = [
+    "Qual a proposta do Eduardo Paes para a saúde?",
+    "Compare Maria e João na educação",
+    "O que os candidatos propõem para o transporte público?",
+    "Quem tem proposta de tarifa zero no ônibus?",
+]
+_SLO = re.compile(r"^\s*(\w+)\.(\w+)\s*(<=|>=)\s*([\d.]+)\s*$")
+
+
+# --- Coleta ---
+
+class Recorder:
+    """Latência e sucesso de cada requisição, por operação, e a duração de cada cenário."""
+
+    def __init__(self):
+        self.samples = {}   # operação -> [(ms, ok)]
+        self.failures = {}  # operação -> Counter(motivo)
+        self.walls = {}     # operação -> duração (s) do cenário em que rodou
+
+    async def call(self, op, request, check=None):
+        """check(resp): motivo da falha numa resposta 2xx, ou None."""
+        t0 = time.perf_counter()
+        try:
+            resp = await request
+            error = f"HTTP {resp.status_code}" if resp.status_code >= 400 else (check(resp) if check else None)
+        except httpx.HTTPError as e:
+            resp, error = None, type(e).__name__
+        self.add(op, (time.perf_counter() - t0) * 1000, error)
+        return resp if error is None else None
+
+    def add(self, op, ms, error=None):
+        self.samples.setdefault(op, []).append((ms, error is None))
+        if error:
+            self.failures.setdefault(op, Counter())[error[:80]] += 1
+
+    async def scenario(self, ops, coro):
+        t0 = time.perf_counter()
+        await coro
+        for op in ops:
+            self.walls[op] = time.perf_counter() - t0
+
+    def report(self) -> dict:
+        report = {}
+        for op, samples in self.samples.items():
+            values = sorted(ms for ms, _ in samples)
+            errors = sum(not ok for _, ok in samples)
+            report[op] = {
+                "requests": len(samples),
+                "errors": errors,
+                "error_rate": round(errors / len(samples), 4),
+                "rps": round(len(samples) / self.walls.get(op, 1) if self.walls.get(op) else 0.0, 2),
+                "p50_ms": round(percentile(values, 50), 1),
+                "p95_ms": round(percentile(values, 95), 1),
+                "p99_ms": round(percentile(values, 99), 1),
+                "max_ms": round(values[-1], 1),
+                "failures": dict(self.failures.get(op, {})),
+            }
+        return report
+
+
+def chat_error(resp):
+    """/chat devolve 200 com "Erro IA"/"Erro conexão" quando o Prompt Flow falha."""
+    answer = (resp.json().get("final_response") or {}).get("answer", "")
+    return answer if answer.startswith("Erro") else None
+
+
+# --- Cenários ---
+
+def auth_headers(email):
+    """JWT do usuário: rate limit do /chat e dono de /sessions e /history vêm do sub do token."""
+    return {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+
+
+async def auth(client, rec, ctx, args):
+    sem = asyncio.Semaphore(args.concurrency or args.users)
+    users = [f"carga{i}-{uuid.uuid4().hex[:8]}@example.com" for i in range(args.users)]
+
+    async def signup(email):
+        async with sem:
+            await rec.call("signup", client.post("/signup", json={"name": "Usuário Carga", "email": email,
+                                                                 "password": PASSWORD}))
+
+    async def signin(email):
+        async with sem:
+            await rec.call("signin", client.post("/signin", json={"email": email, "password": PASSWORD}))
+
+    await rec.scenario(["signup"], asyncio.gather(*(signup(email) for email in users)))
+    await rec.scenario(["signin"], asyncio.gather(*(signin(email) for email in users)))
+    ctx["users"] = users
+
+
+async def chat(client, rec, ctx, args):
+    users = ctx.get("users") or [f"carga{i}-{uuid.uuid4().hex[:8]}@example.com" for i in range(args.sessions)]
+
+    async def send(session_id, email, message):
+        if not args.stream:
+            await rec.call("chat", client.post("/chat", headers=auth_headers(email),
+                                               json={"message": message, "session_id": session_id,
+                                                     "user_email": email}), check=chat_error)
+            return
+        # Streaming: tempo até o primeiro token e até o fim do stream
+        t0 = time.perf_counter()
+        error, first = "stream sem evento done", None
+        try:
+            async with client.stream("POST", "/chat/stream", headers=auth_headers(email),
+                                     json={"message": message, "session_id": session_id,
+                                           "user_email": email}) as resp:
+                async for line in resp.aiter_lines():
+                    if first is None and line == "event: token":
+                        first = (time.perf_counter() - t0) * 1000
+                    if line == "event: error":
+                        error = "evento error"  # o stream ainda termina com "done"
+                    elif line == "event: done" and error != "evento error":
+                        error = f"HTTP {resp.status_code}" if resp.status_code != 200 else None
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+        if first is not None:
+            rec.add("chat_first_token", first)
+        rec.add("chat", (time.perf_counter() - t0) * 1000, error)
+
+    async def session(i):
+        email = users[i % len(users)]
+        resp = await rec.call("session_create", client.post("/sessions", json={"user_email": email}))
+        session_id = resp.json()["id"] if resp else f"carga-{uuid.uuid4().hex}"
+        ctx["sessions"].append((session_id, email))
+        for turn in range(args.turns):
+            # Texto único por mensagem: o single-flight (coalesce.py) não junta as chamadas
+            await send(session_id, email, f"{QUESTIONS[(i + turn) % len(QUESTIONS)]} (sessão {i}, mensagem {turn})")
+            if args.think_ms:
+                await asyncio.sleep(args.think_ms / 1000 * random.uniform(0.5, 1.5))
+
+    ops = ["session_create", "chat", "chat_first_token"]
+    await rec.scenario(ops, asyncio.gather(*(session(i) for i in range(args.sessions))))
+
+
+async def history(client, rec, ctx, args):
+    sessions = ctx["sessions"] or [(f"carga-{uuid.uuid4().hex}", f"carga{i}@example.com")
+                                   for i in range(args.sessions)]
+    if ctx["seed"]:
+        for session_id, email in sessions:
+            seed_history(main.db, session_id, args.history_size, email)
+
+    async def reload(session_id, email):
+        for _ in range(args.reloads):
+            headers = auth_headers(email)
+            await rec.call("sessions_list", client.get(f"/sessions/{email}", headers=headers))
+            await rec.call("history", client.get(f"/history/{session_id}", params={"limit": 50}, headers=headers))
+
+    ops = ["sessions_list", "history"]
+    await rec.scenario(ops, asyncio.gather(*(reload(sid, email) for sid, email in sessions)))
+
+
+async def run(base_url, args, seed):
+    rec = Recorder()
+    ctx = {"users": [], "sessions": [], "seed": seed}
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        for name in args.scenarios:
+            await {"auth": auth, "chat": chat, "history": history}[name](client, rec, ctx, args)
+    return rec.report()
+
+
+def merge_reports(reports) -> dict:
+    """Mediana de cada métrica entre as repetições (requisições e erros somados)."""
+    merged = {}
+    for op in reports[0]:
+        runs = [r[op] for r in reports if op in r]
+        merged[op] = {metric: round(statistics.median(run[metric] for run in runs), 4 if metric == "error_rate" else 1)
+                      for metric in runs[0] if metric != "failures"}
+        merged[op]["requests"] = sum(run["requests"] for run in runs)
+        merged[op]["errors"] = sum(run["errors"] for run in runs)
+        merged[op]["failures"] = dict(sum((Counter(run["failures"]) for run in runs), Counter()))
+    return merged
+
+
+# --- SLOs e comparação ---
+
+def parse_slos(specs) -> list:
+    slos = []
+    for spec in specs:
+        match = _SLO.match(spec)
+        if not match:
+            raise ValueError(f"Invalid SLO: {spec!r} (esperado operação.métrica<=valor ou >=valor)")
+        op, metric, sign, value = match.groups()
+        slos.append((op, metric, sign, float(value)))
+    return slos
+
+
+def check_slos(report, slos) -> list:
+    failures = []
+    for op, metric, sign, limit in slos:
+        if op not in report:
+            continue  # cenário não executado
+        value = report[op][metric]
+        if (sign == "<=" and value > limit) or (sign == ">=" and value < limit):
+            failures.append(f"{op}.{metric} = {value} (SLO {sign} {limit:g})")
+    return failures
+
+
+def compare(report, baseline, max_regression=LOADTEST_MAX_REGRESSION, min_ms=LOADTEST_MIN_REGRESSION_MS) -> list:
+    failures = []
+    for op, base in baseline.items():
+        cur = report.get(op)
+        if cur is None:
+            continue
+        if cur["p95_ms"] > max(base["p95_ms"] * (1 + max_regression), base["p95_ms"] + min_ms):
+            failures.append(f"{op}.p95_ms {base['p95_ms']} -> {cur['p95_ms']} (+{max_regression:.0%} permitido)")
+        if base["rps"] and cur["rps"] < base["rps"] * (1 - max_regression):
+            failures.append(f"{op}.rps {base['rps']} -> {cur['rps']} (-{max_regression:.0%} permitido)")
+        if cur["error_rate"] > base["error_rate"]:
+            failures.append(f"{op}.error_rate {base['error_rate']} -> {cur['error_rate']}")
+    return failures
+
+
+def print_report(report):
+    print(f"{'operação':18} {'req':>6} {'erros':>6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for op, s in report.items():
+        print(f"{op:18} {s['requests']:6d} {s['errors']:6d} {s['rps']:8.1f} {s['p50_ms']:8.1f} "
+              f"{s['p95_ms']:8.1f} {s['p99_ms']:8.1f} {s['max_ms']:8.1f}")
+    for op, s in report.items():
+        for reason, count in sorted(s.get("failures", {}).items(), key=lambda item: -item[1])[:3]:
+            print(f"  ⚠️ {op}: {count}x {reason}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="auth,chat,history")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=0, help="Rajada de auth (padrão: todos os usuários)")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--think-ms", type=float, default=0.0)
+    parser.add_argument("--stream", action="store_true", help="/chat/stream em vez de /chat")
+    parser.add_argument("--history-size", type=int, default=200)
+    parser.add_argument("--reloads", type=int, default=3)
+    parser.add_argument("--pf-latency", default="lognormal:800,2500", help="ms fixos ou distribuição")
+    parser.add_argument("--cosmos-latency-ms", type=float, default=5.0)
+    parser.add_argument("--repeat", type=int, default=1, help="Repetições (relatório com a mediana)")
+    parser.add_argument("--base-url", help="Backend já rodando (sem stand-ins no processo)")
+    parser.add_argument("--slo", action="append", default=[], help="operação.métrica<=valor (soma aos LOADTEST_SLOS)")
+    parser.add_argument("--output", help="Salva o relatório em JSON")
+    parser.add_argument("--baseline", help="Relatório salvo para comparar")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"cenários desconhecidos: {', '.join(sorted(unknown))}")
+    slos = parse_slos([s for s in LOADTEST_SLOS.split(",") if s.strip()] + args.slo)
+
+    if args.base_url:
+        reports = [asyncio.run(run(args.base_url, args, seed=False)) for _ in range(args.repeat)]
+    else:
+        with run_stub_server(latency_ms=args.pf_latency) as pf_url:
+            main.PF_ENDPOINT_URL = pf_url
+            install_fake_containers(main.db, latency_ms=args.cosmos_latency_ms)
+            with serve_in_thread(main.app) as base_url:
+                reports = [asyncio.run(run(base_url, args, seed=True)) for _ in range(args.repeat)]
+    report = merge_reports(reports)
+
+    print(f"\ncarga: {args.users} usuários, {args.sessions} sessões x {args.turns} mensagens, "
+          f"Prompt Flow {args.pf_latency if not args.base_url else args.base_url}"
+          + (f" (mediana de {args.repeat} execuções)" if args.repeat > 1 else ""))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    failures = check_slos(report, slos)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            failures += compare(report, json.load(f))
+    if failures:
+        print("\n❌ Reprovado:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print(f"\n✅ {len(slos)} SLOs ok" + (" e sem regressão contra o baseline" if args.baseline else ""))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,110 @@
+"""
+Servidor local que imita o endpoint /score do Prompt Flow (pf flow serve).
+Usado pelos benchmarks para medir o backend sem rede nem custo de LLM.
+
+A latência de cada /score é sorteada de uma distribuição (latency_model): um
+número fixo de ms ou "fixed:MS", "uniform:MIN,MAX", "normal:MÉDIA,DESVIO",
+"lognormal:P50,P95" (cauda longa, como a de um LLM).
+
+Uso standalone (para um backend rodando fora do processo do benchmark):
+    python -m benchmarks.stub_pf_server --latency lognormal:800,2500 --port 8081
+"""
+import argparse
+import asyncio
+import math
+import random
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import uvicorn
+from fastapi import FastAPI
+
+STAGES = ["intent", "retrieval", "summary", "verification", "safety"]
+_Z95 = 1.6449  # quantil 95% da normal padrão
+
+
+def latency_model(spec=0.0):
+    """Função sem argumentos que sorteia a latência (ms) de uma chamada."""
+    if isinstance(spec, (int, float)):
+        return lambda: float(spec)
+    kind, _, params = str(spec).partition(":")
+    if not params:
+        return latency_model(float(kind))
+    values = [float(v) for v in params.split(",")]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        sigma = max(0.0, math.log(values[1]) - mu) / _Z95
+        return lambda: random.lognormvariate(mu, sigma)
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def create_app(latency_ms=0.0) -> FastAPI:
+    """latency_ms: ms fixos ou uma distribuição (ver latency_model)."""
+    app = FastAPI()
+    app.state.latency = latency_model(latency_ms)
+
+    @app.post("/score")
+    async def score(payload: dict):
+        # Como o pf flow serve com este DAG: JSON inteiro no fim, mesmo com Accept: text/event-stream
+        answer = f"Resposta simulada para: {payload.get('user_query', '')}"
+        latency = app.state.latency()
+        if latency:
+            await asyncio.sleep(latency / 1000)
+        return {"final_response": {"answer": answer}, "trace": flow_trace(payload, latency)}
+
+    return app
+
+
+def flow_trace(payload: dict, latency_ms: float) -> dict:
+    """Saída `trace` do finalize_response: trace_id do traceparent recebido e a latência por etapa."""
+    parts = (payload.get("traceparent") or "").split("-")
+    return {
+        "trace_id": parts[1] if len(parts) == 4 else None,
+        "stages": {stage: latency_ms / len(STAGES) for stage in STAGES}
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def serve_in_thread(app, port: int = None, **uvicorn_kwargs):
+    """Sobe uma app ASGI numa thread e devolve a URL base."""
+    port = port or free_port()
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", **uvicorn_kwargs)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+@contextmanager
+def run_stub_server(latency_ms=0.0, port: int = None, **uvicorn_kwargs):
+    """Sobe o stub numa thread e devolve a URL do /score."""
+    with serve_in_thread(create_app(latency_ms), port, **uvicorn_kwargs) as base_url:
+        yield f"{base_url}/score"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", default="0", help="ms fixos ou distribuição (lognormal:P50,P95, ...)")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency), host="127.0.0.1", port=args.port, log_level="warning")
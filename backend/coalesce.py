@@ -0,0 +1,126 @@
+"""
+Single-flight do /chat: requisições concorrentes com a mesma pergunta
+normalizada e os mesmos parâmetros do flow compartilham uma chamada ao Prompt
+Flow (picos de debate/notícia, quando muita gente pergunta a mesma coisa).
+
+A primeira requisição de uma chave (leader) dispara a chamada numa task
+própria; as que chegam enquanto ela está em voo (followers) aguardam o mesmo
+resultado. Nada fica guardado depois que a chamada termina (não é cache), e
+cada sessão continua gravando pergunta e resposta no próprio histórico.
+
+Chave: user_query normalizada (COALESCE_NORMALIZE: casefold, accents,
+punctuation, whitespace; vazio = texto exato) + os campos do payload em
+COALESCE_KEY_PARAMS. session_id e traceparent ficam de fora: o flow não usa a
+sessão para responder, só para contabilizar uso (que fica com a sessão do
+leader).
+
+Por processo: com várias réplicas/workers, cada uma coalesce o próprio tráfego.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import unicodedata
+
+# Configuração (Variáveis de Ambiente)
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() in ("1", "true", "yes")
+COALESCE_NORMALIZE = os.getenv("COALESCE_NORMALIZE", "casefold,accents,punctuation,whitespace")
+COALESCE_KEY_PARAMS = os.getenv("COALESCE_KEY_PARAMS", "user_tier")
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+# --- Normalização da chave ---
+
+def _strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+NORMALIZERS = {
+    "casefold": str.casefold,
+    "accents": _strip_accents,
+    "punctuation": lambda text: _PUNCTUATION.sub(" ", text),
+    "whitespace": lambda text: _WHITESPACE.sub(" ", text).strip(),
+}
+
+
+def build_normalizer(steps: str = COALESCE_NORMALIZE):
+    """Função de normalização a partir de uma lista "passo,passo" (na ordem dada)."""
+    names = [name.strip() for name in steps.split(",") if name.strip()]
+    unknown = [name for name in names if name not in NORMALIZERS]
+    if unknown:
+        raise ValueError(f"Unknown COALESCE_NORMALIZE steps: {', '.join(unknown)}")
+    functions = [NORMALIZERS[name] for name in names]
+
+    def normalize(text: str) -> str:
+        for function in functions:
+            text = function(text)
+        return text
+
+    return normalize
+
+
+class SingleFlight:
+    def __init__(self, enabled=COALESCE_ENABLED, normalize=None, key_params=COALESCE_KEY_PARAMS):
+        self.enabled = enabled
+        # normalize: passos (str, como COALESCE_NORMALIZE) ou uma função texto -> texto
+        self.normalize = normalize if callable(normalize) else build_normalizer(
+            COALESCE_NORMALIZE if normalize is None else normalize)
+        self.key_params = [p.strip() for p in key_params.split(",") if p.strip()]
+        self._calls = {}  # chave -> (task, nº de requisições aguardando)
+
+        # Estatísticas
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.largest_group = 0
+
+    def key(self, payload: dict) -> str:
+        parts = [self.normalize(payload.get("user_query") or "")]
+        parts += [payload.get(param) for param in self.key_params]
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode()).hexdigest()
+
+    async def do(self, key: str, call):
+        """
+        Executa call() (coroutine function) uma vez por chave em voo.
+        Devolve (resultado, papel): "leader", "follower" ou "off".
+        """
+        if not self.enabled:
+            return await call(), "off"
+
+        entry = self._calls.get(key)
+        if entry is None:
+            # Task própria: se o cliente do leader desconectar, os followers não perdem a chamada
+            task = asyncio.ensure_future(call())
+            self._calls[key] = [task, 1]
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.upstream_calls += 1
+            role = "leader"
+        else:
+            task = entry[0]
+            entry[1] += 1
+            self.largest_group = max(self.largest_group, entry[1])
+            self.coalesced += 1
+            role = "follower"
+        return await asyncio.shield(task), role
+
+    def _forget(self, key, task):
+        entry = self._calls.get(key)
+        if entry is not None and entry[0] is task:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        requests = self.upstream_calls + self.coalesced
+        return {
+            "enabled": self.enabled,
+            "upstream_calls": self.upstream_calls,
+            "coalesced_requests": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / requests, 4) if requests else 0.0,
+            "largest_group": max(self.largest_group, 1) if requests else 0,
+            "in_flight_keys": len(self._calls),
+        }
+
+
+# Instância global
+single_flight = SingleFlight()
@@ -1,83 +1,252 @@
 import os
+import time
 import uuid
-from azure.cosmos import CosmosClient, PartitionKey
+import hashlib
+from datetime import datetime
+from azure.cosmos import PartitionKey, exceptions
+from azure.cosmos.aio import CosmosClient
 from auth_utils import get_password_hash
+from history_writer import HistoryWriter
 
 # Pega credenciais das variáveis de ambiente (Azure App Service)
 URL = os.environ.get("AZURE_COSMOS_ENDPOINT")
 KEY = os.environ.get("AZURE_COSMOS_KEY")
 DB_NAME = "CitizenAppDB"
 
+# Enquanto a migração de ids (migrations.py) não rodou, busca usuários antigos (id UUID)
+# com uma query na partição do email quando o point read não encontra nada
+USERS_LEGACY_FALLBACK = os.environ.get("USERS_LEGACY_FALLBACK", "true").lower() in ("1", "true", "yes")
+
+def normalize_email(email):
+    return email.strip().lower()
+
+def user_id_for(email):
+    """Id determinístico do documento de usuário: permite point read por (id, email)."""
+    return hashlib.sha256(normalize_email(email).encode("utf-8")).hexdigest()
+
+# Campos devolvidos pelo histórico (evita trafegar _rid, _self, _etag...)
+HISTORY_FIELDS = "c.id, c.session_id, c.role, c.content, c.timestamp, c.seq"
+
+_last_seq = 0
+
+def next_seq():
+    """Sequência numérica monotônica (epoch em microssegundos) para ordenar o histórico."""
+    global _last_seq
+    _last_seq = max(time.time_ns() // 1000, _last_seq + 1)
+    return _last_seq
+
 class DatabaseManager:
+    """
+    Camada de dados assíncrona (azure.cosmos.aio).
+    Um único CosmosClient é compartilhado pela app inteira; abre no startup e fecha no shutdown.
+    """
+
     def __init__(self):
+        self.client = None
+        self.db = None
+        self.users = None
+        self.history = None
+        self.sessions = None
+        # Gravação write-behind do histórico (fora do caminho crítico do /chat)
+        self.writer = HistoryWriter(self)
+
+    async def connect(self):
         if not URL or not KEY:
             print("⚠️ AVISO: Cosmos DB não configurado. Auth falhará.")
-            self.users = None
-            self.history = None
             return
 
         # Conecta ao Cosmos
         self.client = CosmosClient(URL, credential=KEY)
-        self.db = self.client.create_database_if_not_exists(id=DB_NAME)
+        self.db = await self.client.create_database_if_not_exists(id=DB_NAME)
 
         # Cria Container de Usuários (Partição: email)
-        self.users = self.db.create_container_if_not_exists(
+        self.users = await self.db.create_container_if_not_exists(
             id="Users",
             partition_key=PartitionKey(path="/email")
         )
 
         # Cria Container de Histórico (Partição: session_id)
-        self.history = self.db.create_container_if_not_exists(
+        self.history = await self.db.create_container_if_not_exists(
             id="ChatHistory",
             partition_key=PartitionKey(path="/session_id")
         )
 
+        # Cria Container de Sessões (Partição: user_email) - índice por usuário
+        self.sessions = await self.db.create_container_if_not_exists(
+            id="Sessions",
+            partition_key=PartitionKey(path="/user_email")
+        )
+
+    async def close(self):
+        # Flush-on-shutdown antes de fechar o cliente
+        await self.writer.close()
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
     # --- USUÁRIOS ---
-    def create_user(self, name, email, password):
-        # Verifica se já existe
-        existing = list(self.users.query_items(
-            query="SELECT * FROM c WHERE c.email=@email",
-            parameters=[{"name": "@email", "value": email}],
-            enable_cross_partition_query=True
-        ))
-        if existing:
-            return None # Email já cadastrado
+    async def create_user(self, name, email, password):
+        if USERS_LEGACY_FALLBACK and await self._find_legacy_user(email):
+            return None # Email já cadastrado (documento antigo)
+
+        email = normalize_email(email)
 
         user_data = {
-            "id": str(uuid.uuid4()),
+            "id": user_id_for(email),
             "email": email,
             "name": name,
             "password_hash": get_password_hash(password),
             "created_at": str(datetime.utcnow())
         }
-        self.users.create_item(body=user_data)
+        # Create-if-absent atômico: o id é derivado do email, então um cadastro duplicado dá 409
+        try:
+            await self.users.create_item(body=user_data)
+        except exceptions.CosmosResourceExistsError:
+            return None # Email já cadastrado
         return user_data
 
-    def get_user_by_email(self, email):
-        items = list(self.users.query_items(
+    async def get_user_by_email(self, email):
+        try:
+            return await self.users.read_item(item=user_id_for(email), partition_key=normalize_email(email))
+        except exceptions.CosmosResourceNotFoundError:
+            if USERS_LEGACY_FALLBACK:
+                return await self._find_legacy_user(email)
+            return None
+
+    async def _find_legacy_user(self, email):
+        # Query restrita a uma partição (sem fan-out) para documentos com id aleatório.
+        # Documentos antigos guardam o email como foi digitado, sem normalizar.
+        email = email.strip()
+        items = [item async for item in self.users.query_items(
             query="SELECT * FROM c WHERE c.email=@email",
             parameters=[{"name": "@email", "value": email}],
-            enable_cross_partition_query=True
-        ))
+            partition_key=email
+        )]
         return items[0] if items else None
 
     # --- HISTÓRICO ---
-    def save_message(self, session_id, role, content):
+    async def save_message(self, session_id, role, content, user_email=None):
+        # Só enfileira: a gravação acontece em batch no HistoryWriter
         msg = {
             "id": str(uuid.uuid4()),
             "session_id": session_id,
             "role": role, # "user" ou "assistant"
             "content": content,
-            "timestamp": str(datetime.utcnow())
+            "timestamp": str(datetime.utcnow()),
+            "seq": next_seq()
         }
-        self.history.create_item(body=msg)
+        if user_email:
+            # Permite atualizar o índice de sessões (partição do usuário) após o flush
+            msg["user_email"] = normalize_email(user_email)
+        self.writer.enqueue(msg)
 
-    def get_history(self, session_id):
-        # Pega mensagens ordenadas por tempo
-        return list(self.history.query_items(
-            query="SELECT * FROM c WHERE c.session_id=@sid ORDER BY c.timestamp ASC",
-            parameters=[{"name": "@sid", "value": session_id}]
-        ))
+    def _history_query(self, session_id, since, limit=None):
+        return self.history.query_items(
+            query=f"SELECT {HISTORY_FIELDS} FROM c WHERE c.session_id=@sid AND c.seq > @since ORDER BY c.seq ASC",
+            parameters=[
+                {"name": "@sid", "value": session_id},
+                {"name": "@since", "value": since or 0},
+            ],
+            partition_key=session_id,
+            max_item_count=limit
+        )
 
-from datetime import datetime
-db = DatabaseManager()
\ No newline at end of file
+    async def get_history(self, session_id, limit=50, continuation=None, since=None):
+        """
+        Uma página do histórico, ordenada por seq.
+        `since` devolve só mensagens mais novas que esse seq; `continuation` é o token do Cosmos.
+        """
+        # Garante que mensagens ainda na fila desta sessão já foram gravadas
+        await self.writer.wait_session(session_id)
+
+        pages = self._history_query(session_id, since, limit).by_page(continuation)
+        try:
+            page = await pages.__anext__()
+        except StopAsyncIteration:
+            return {"items": [], "continuation": None}
+        items = [item async for item in page]
+        return {"items": items, "continuation": pages.continuation_token}
+
+    async def iter_history(self, session_id, since=None, page_size=500):
+        """Todas as mensagens (desde `since`), página a página, sem materializar a sessão inteira."""
+        await self.writer.wait_session(session_id)
+
+        async for page in self._history_query(session_id, since, page_size).by_page():
+            async for item in page:
+                yield item
+
+    # --- SESSÕES ---
+    async def create_session(self, user_email, title=None):
+        now = datetime.utcnow()
+        session = {
+            "id": str(uuid.uuid4()),
+            "user_email": normalize_email(user_email),
+            "title": title or "Nova conversa",
+            "created_at": str(now),
+            "last_message_at": str(now),
+            "last_seq": next_seq(),
+            "message_count": 0
+        }
+        await self.sessions.create_item(body=session)
+        return session
+
+    async def get_session(self, user_email, session_id):
+        """Resumo da sessão na partição do usuário, ou None (inexistente ou de outro usuário)."""
+        try:
+            return await self.sessions.read_item(item=session_id, partition_key=normalize_email(user_email))
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+
+    async def list_sessions(self, user_email, limit=100):
+        # Uma leitura de partição, independente do tamanho do histórico
+        pages = self.sessions.query_items(
+            query="SELECT * FROM c WHERE c.user_email=@email ORDER BY c.last_seq DESC",
+            parameters=[{"name": "@email", "value": normalize_email(user_email)}],
+            partition_key=normalize_email(user_email),
+            max_item_count=limit
+        ).by_page()
+        try:
+            page = await pages.__anext__()
+        except StopAsyncIteration:
+            return []
+        return [
+            {k: v for k, v in item.items() if not k.startswith("_")}
+            async for item in page
+        ]
+
+    async def touch_session(self, session_id, msgs):
+        """Atualiza o resumo da sessão (contagem, última mensagem) após um flush do histórico."""
+        user_email = next((m["user_email"] for m in msgs if m.get("user_email")), None)
+        if not user_email or self.sessions is None:
+            return
+
+        last = max(msgs, key=lambda m: m["seq"])
+        operations = [
+            {"op": "incr", "path": "/message_count", "value": len(msgs)},
+            {"op": "set", "path": "/last_message_at", "value": last["timestamp"]},
+            {"op": "set", "path": "/last_seq", "value": last["seq"]},
+        ]
+        try:
+            await self.sessions.patch_item(item=session_id, partition_key=user_email, patch_operations=operations)
+            return
+        except exceptions.CosmosResourceNotFoundError:
+            pass
+
+        # Sessão sem POST /sessions: cria o resumo com o título da primeira mensagem do usuário
+        first_user_msg = next((m["content"] for m in msgs if m["role"] == "user"), "")
+        session = {
+            "id": session_id,
+            "user_email": user_email,
+            "title": (first_user_msg[:30] + "...") if len(first_user_msg) > 30 else (first_user_msg or "Nova conversa"),
+            "created_at": msgs[0]["timestamp"],
+            "last_message_at": last["timestamp"],
+            "last_seq": last["seq"],
+            "message_count": len(msgs)
+        }
+        try:
+            await self.sessions.create_item(body=session)
+        except exceptions.CosmosResourceExistsError:
+            # Outro flush criou o resumo no meio do caminho
+            await self.sessions.patch_item(item=session_id, partition_key=user_email, patch_operations=operations)
+
+db = DatabaseManager()
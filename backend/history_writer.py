@@ -0,0 +1,197 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import defaultdict
+from azure.cosmos import exceptions
+from telemetry import telemetry
+
+logger = logging.getLogger(__name__)
+
+# Configuração da fila (Variáveis de Ambiente)
+HISTORY_QUEUE_MAX = int(os.getenv("HISTORY_QUEUE_MAX", "10000"))
+HISTORY_BATCH_SIZE = min(int(os.getenv("HISTORY_BATCH_SIZE", "100")), 100)  # limite do batch transacional do Cosmos
+HISTORY_FLUSH_INTERVAL_MS = float(os.getenv("HISTORY_FLUSH_INTERVAL_MS", "50"))
+HISTORY_MAX_RETRIES = int(os.getenv("HISTORY_MAX_RETRIES", "6"))
+HISTORY_BACKOFF_BASE_MS = float(os.getenv("HISTORY_BACKOFF_BASE_MS", "100"))
+
+# Status que valem nova tentativa: throttling (429) e indisponibilidade transitória
+RETRYABLE_STATUS = {408, 429, 449, 503}
+
+
+class HistoryWriter:
+    """
+    Fila write-behind para o ChatHistory.
+    Mensagens são enfileiradas sem I/O e gravadas em segundo plano, agrupadas por
+    session_id (partição) em batches transacionais.
+    """
+
+    def __init__(self, manager):
+        # Lê manager.history a cada flush (permite trocar o container em benchmarks)
+        self.manager = manager
+        self.queue = None
+        self._task = None
+        self._pending = defaultdict(int)
+        self._drained = None
+
+        # Métricas
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+        self.batches = 0
+        self.flush_ms_total = 0.0
+        self.flush_ms_max = 0.0
+        self.flush_ms_last = 0.0
+
+    def start(self):
+        if self._task is not None:
+            return
+        self.queue = asyncio.Queue(maxsize=HISTORY_QUEUE_MAX)
+        self._drained = asyncio.Condition()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Flush-on-shutdown: grava o que está na fila e encerra o worker."""
+        if self._task is None:
+            return
+        await self.queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.queue = None
+
+    def enqueue(self, msg):
+        """Enfileira sem bloquear. Com a fila cheia a mensagem é descartada (memória limitada)."""
+        if self._task is None:
+            self.start()
+        try:
+            self.queue.put_nowait(msg)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.error(f"History queue full ({HISTORY_QUEUE_MAX}); dropping message for session {msg['session_id']}")
+            return False
+        self.enqueued += 1
+        self._pending[msg["session_id"]] += 1
+        return True
+
+    async def wait_session(self, session_id):
+        """Espera as mensagens pendentes de uma sessão (leitura consistente do histórico)."""
+        if self._task is None or not self._pending.get(session_id):
+            return
+        async with self._drained:
+            await self._drained.wait_for(lambda: not self._pending.get(session_id))
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            deadline = time.perf_counter() + HISTORY_FLUSH_INTERVAL_MS / 1000
+
+            # Junta o que chegar na janela de flush
+            while len(batch) < HISTORY_QUEUE_MAX:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            by_session = defaultdict(list)
+            for msg in batch:
+                by_session[msg["session_id"]].append(msg)
+
+            writes = []
+            for session_id, msgs in by_session.items():
+                for i in range(0, len(msgs), HISTORY_BATCH_SIZE):
+                    writes.append(self._write_batch(session_id, msgs[i:i + HISTORY_BATCH_SIZE]))
+            # Trace próprio: um flush junta mensagens de várias requisições (e a tarefa
+            # herda o contexto da requisição que a criou)
+            with telemetry.span("cosmos.flush", new_trace=True, messages=len(batch), sessions=len(by_session)):
+                await asyncio.gather(*writes)
+
+            async with self._drained:
+                for session_id, msgs in by_session.items():
+                    self._pending[session_id] -= len(msgs)
+                    if self._pending[session_id] <= 0:
+                        del self._pending[session_id]
+                self._drained.notify_all()
+            for _ in batch:
+                self.queue.task_done()
+
+    async def _write_batch(self, session_id, msgs):
+        operations = [("create", (msg,)) for msg in msgs]
+        t0 = time.perf_counter()
+
+        for attempt in range(HISTORY_MAX_RETRIES + 1):
+            try:
+                await self.manager.history.execute_item_batch(
+                    batch_operations=operations, partition_key=session_id
+                )
+                self.written += len(msgs)
+                await self._touch_session(session_id, msgs)
+                break
+            except exceptions.CosmosBatchOperationError as e:
+                # 409 num create do batch: a tentativa anterior já gravou o batch inteiro
+                # (ex: timeout depois do commit; o batch é tudo ou nada)
+                if e.status_code != 409:
+                    self.failed += len(msgs)
+                    logger.error(f"History batch failed for session {session_id}: {e}")
+                    break
+                self.written += len(msgs)
+                await self._touch_session(session_id, msgs)
+                break
+            except exceptions.CosmosHttpResponseError as e:
+                if e.status_code not in RETRYABLE_STATUS or attempt == HISTORY_MAX_RETRIES:
+                    self.failed += len(msgs)
+                    logger.error(f"History batch failed for session {session_id}: {e}")
+                    break
+                self.retries += 1
+                await asyncio.sleep(self._backoff(e, attempt))
+            except Exception as e:
+                self.failed += len(msgs)
+                logger.error(f"History batch failed for session {session_id}: {e}")
+                break
+
+        elapsed = (time.perf_counter() - t0) * 1000
+        self.batches += 1
+        self.flush_ms_last = elapsed
+        self.flush_ms_total += elapsed
+        self.flush_ms_max = max(self.flush_ms_max, elapsed)
+
+    async def _touch_session(self, session_id, msgs):
+        # Falha no índice de sessões não invalida o histórico já gravado
+        try:
+            await self.manager.touch_session(session_id, msgs)
+        except Exception as e:
+            logger.warning(f"Session summary update failed for {session_id}: {e}")
+
+    @staticmethod
+    def _backoff(error, attempt):
+        headers = getattr(error, "headers", None) or {}
+        retry_after = headers.get("x-ms-retry-after-ms")
+        if retry_after:
+            return float(retry_after) / 1000
+        # Exponencial com jitter
+        return HISTORY_BACKOFF_BASE_MS * (2 ** attempt) * random.uniform(0.5, 1.5) / 1000
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "queue_max": HISTORY_QUEUE_MAX,
+            "pending_sessions": len(self._pending),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "retries": self.retries,
+            "batches": self.batches,
+            "flush_ms_avg": round(self.flush_ms_total / self.batches, 3) if self.batches else 0.0,
+            "flush_ms_max": round(self.flush_ms_max, 3),
+            "flush_ms_last": round(self.flush_ms_last, 3),
+        }
@@ -1,14 +1,22 @@
 import os
+import hmac
+import json
 import uvicorn
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, EmailStr, Field, validator
 import re
-import httpx
+from typing import Optional
 
 # Imports locais
-from database import db
+from database import db, normalize_email
 from auth_utils import verify_password, create_access_token
+from pf_client import pf_client
+from rate_limit import enforce_rate_limit, limiter, request_identity
+from coalesce import single_flight
+from telemetry import telemetry
+from opentelemetry.trace import SpanKind
 
 app = FastAPI()
 
@@ -22,6 +30,20 @@ app.add_middleware(
 
 # Prompt Flow URL (Variável de Ambiente)
 PF_ENDPOINT_URL = os.getenv("PF_ENDPOINT_URL", "https://civic-flow-api.azurewebsites.net/score")
+# Token de admin dos endpoints /internal/* (header X-Internal-Token); vazio = endpoints desligados (404)
+INTERNAL_METRICS_TOKEN = os.getenv("INTERNAL_METRICS_TOKEN", "")
+
+# --- Ciclo de vida (clientes compartilhados: Cosmos e HTTP) ---
+
+@app.on_event("startup")
+async def startup():
+    await db.connect()
+    await pf_client.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await pf_client.close()
+    await db.close()
 
 # --- Modelos de Dados ---
 class UserSignup(BaseModel):
@@ -48,12 +70,17 @@ class UserLogin(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     session_id: str
+    user_email: Optional[str] = None  # Atualiza o índice de sessões do usuário
+
+class SessionCreate(BaseModel):
+    user_email: str
+    title: Optional[str] = None
 
 # --- Endpoints de Auth ---
 
 @app.post("/signup")
 async def signup(user: UserSignup):
-    new_user = db.create_user(user.name, user.email, user.password)
+    new_user = await db.create_user(user.name, user.email, user.password)
     if not new_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -62,7 +89,7 @@ async def signup(user: UserSignup):
 
 @app.post("/signin")
 async def signin(user: UserLogin):
-    db_user = db.get_user_by_email(user.email)
+    db_user = await db.get_user_by_email(user.email)
     if not db_user or not verify_password(user.password, db_user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
@@ -71,42 +98,252 @@ async def signin(user: UserLogin):
 
 # --- Endpoint de Chat (Com Persistência) ---
 
-@app.post("/chat")
-async def chat(req: ChatRequest):
-    # 1. Salva mensagem do usuário no Cosmos
-    db.save_message(req.session_id, "user", req.message)
+def current_user(request: Request) -> str:
+    """E-mail (sub) do JWT do header Authorization; 401 sem token válido."""
+    email = request_identity(request)
+    if not email:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return normalize_email(email)
 
-    # 2. Chama a IA (Prompt Flow)
-    headers = {"Content-Type": "application/json"}
-    payload = {
+def build_pf_payload(req: ChatRequest, user_tier: str = "default", traceparent: str = ""):
+    return {
         "user_query": req.message,
         "session_id": req.session_id,
-        "user_tier": "default"
+        "user_tier": user_tier,
+        # Os nós do flow continuam o trace do /chat (multi-agents/telemetry.py)
+        "traceparent": traceparent
     }
 
-    ai_text = "Desculpe, erro na IA."
-    
+def extract_answer(data):
+    # Tenta extrair a resposta de vários formatos possíveis
+    final = data.get("final_response") if isinstance(data, dict) else None
+    if isinstance(final, dict):
+        return final.get("answer") or str(data)
+    return final or str(data)
+
+async def call_prompt_flow(payload, traceparent, span):
+    """Uma chamada ao /score; devolve o texto da resposta (ou da falha)."""
+    headers = {"Content-Type": "application/json", "traceparent": traceparent}
+    try:
+        resp = await pf_client.post(PF_ENDPOINT_URL, json=payload, headers=headers)
+        span.set_attribute("http.response.status_code", resp.status_code)
+        if resp.status_code != 200:
+            return f"Erro IA: {resp.text}"
+        data = resp.json()
+        telemetry.record_flow(data.get("trace") if isinstance(data, dict) else None)
+        return extract_answer(data)
+    except Exception as e:
+        span.record_exception(e)
+        return f"Erro conexão: {str(e)}"
+
+@app.post("/chat")
+async def chat(req: ChatRequest, request: Request):
+    with telemetry.span("POST /chat", kind=SpanKind.SERVER, headers=request.headers) as root:
+        # 0. Rate limit por usuário/tier (429 antes de gastar a chamada ao Prompt Flow)
+        with telemetry.span("rate_limit"):
+            user_tier = await enforce_rate_limit(request)
+
+        # 1. Salva mensagem do usuário no Cosmos
+        with telemetry.span("cosmos.save_message"):
+            await db.save_message(req.session_id, "user", req.message, req.user_email)
+
+        # 2. Chama a IA (Prompt Flow); perguntas iguais em voo compartilham a chamada
+        with telemetry.span("prompt_flow", kind=SpanKind.CLIENT, **{"url.full": PF_ENDPOINT_URL}) as span:
+            traceparent = telemetry.traceparent(span)
+            payload = build_pf_payload(req, user_tier, traceparent)
+            ai_text, role = await single_flight.do(
+                single_flight.key(payload), lambda: call_prompt_flow(payload, traceparent, span)
+            )
+            span.set_attribute("coalesce.role", role)
+
+        # 3. Salva resposta da IA no Cosmos (em cada sessão, mesmo com a chamada compartilhada)
+        with telemetry.span("cosmos.save_message"):
+            await db.save_message(req.session_id, "assistant", ai_text, req.user_email)
+
+        return {"final_response": {"answer": ai_text}, "trace_id": telemetry.trace_id(root)}
+
+# --- Endpoint de Chat (Streaming SSE) ---
+
+# Etapas que um flow com saída em streaming pode reportar (flow.dag.yaml), na ordem em que executam
+FLOW_STAGES = ["intent", "retrieval", "summary", "verification", "safety"]
+STREAM_CHUNK_WORDS = int(os.getenv("STREAM_CHUNK_WORDS", "3"))
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def split_tokens(text, words_per_chunk=STREAM_CHUNK_WORDS):
+    words = text.split(" ")
+    for i in range(0, len(words), words_per_chunk):
+        chunk = " ".join(words[i:i + words_per_chunk])
+        yield chunk if i + words_per_chunk >= len(words) else chunk + " "
+
+def parse_sse_data(raw: str) -> dict:
+    """Payload `data:` como dict; texto, JSON inválido ou que não é objeto vira final_response."""
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(PF_ENDPOINT_URL, json=payload, headers=headers, timeout=60)
-            if resp.status_code == 200:
-                data = resp.json()
-                # Tenta extrair a resposta de vários formatos possíveis
-                ai_text = data.get("final_response", {}).get("answer") or str(data)
+        event = json.loads(raw)
+    except ValueError:
+        return {"final_response": raw}
+    if isinstance(event, dict):
+        return event
+    return {"final_response": event if isinstance(event, str) else raw}
+
+async def iter_sse_events(resp):
+    """Lê um corpo text/event-stream e devolve cada payload `data:` como dict."""
+    data_lines = []
+    async for line in resp.aiter_lines():
+        if line.startswith("data:"):
+            data_lines.append(line[5:].strip())
+        elif not line and data_lines:
+            raw = "\n".join(data_lines)
+            data_lines = []
+            yield parse_sse_data(raw)
+    if data_lines:
+        yield parse_sse_data("\n".join(data_lines))
+
+async def stream_chat_events(req: ChatRequest, user_tier: str = "default", root=None):
+    # Só confirma o recebimento (não é progresso do flow nem mede a latência da resposta)
+    yield sse("progress", {"stage": "received", "stages": FLOW_STAGES})
+
+    # Spans sem contexto atual: o gerador é retomado a cada yield
+    span = telemetry.start_span("prompt_flow", kind=SpanKind.CLIENT, parent=root, **{"url.full": PF_ENDPOINT_URL})
+    traceparent = telemetry.traceparent(span)
+    headers = {"Content-Type": "application/json", "Accept": "text/event-stream", "traceparent": traceparent}
+    payload = build_pf_payload(req, user_tier, traceparent)
+    answer_parts = []
+
+    try:
+        async with pf_client.stream(PF_ENDPOINT_URL, json=payload, headers=headers) as resp:
+            if resp.status_code != 200:
+                body = (await resp.aread()).decode(errors="replace")
+                answer_parts = [f"Erro IA: {body}"]
+                yield sse("error", {"status": resp.status_code})
+            elif resp.headers.get("content-type", "").startswith("text/event-stream"):
+                # Flow com saída em streaming: repassa etapas e tokens conforme chegam
+                async for event in iter_sse_events(resp):
+                    telemetry.record_flow(event.get("trace"))
+                    if "stage" in event:
+                        yield sse("progress", event)
+                        continue
+                    chunk = event.get("final_response")
+                    if isinstance(chunk, dict):
+                        chunk = extract_answer(event)
+                    if chunk:
+                        answer_parts.append(chunk)
+                        yield sse("token", {"text": chunk})
             else:
-                ai_text = f"Erro IA: {resp.text}"
+                # Flow sem streaming (pf flow serve com este DAG): a resposta chega inteira
+                # ao fim do DAG, sem etapas intermediárias; é repassada em pedaços
+                data = json.loads(await resp.aread())
+                telemetry.record_flow(data.get("trace") if isinstance(data, dict) else None)
+                for chunk in split_tokens(extract_answer(data)):
+                    answer_parts.append(chunk)
+                    yield sse("token", {"text": chunk})
     except Exception as e:
-        ai_text = f"Erro conexão: {str(e)}"
+        span.record_exception(e)
+        answer_parts = [f"Erro conexão: {str(e)}"]
+        yield sse("error", {"detail": str(e)})
+    finally:
+        span.end()
 
-    # 3. Salva resposta da IA no Cosmos
-    db.save_message(req.session_id, "assistant", ai_text)
+    ai_text = "".join(answer_parts) or "Desculpe, erro na IA."
+
+    # Persiste a resposta só quando o stream termina
+    save = telemetry.start_span("cosmos.save_message", parent=root)
+    try:
+        await db.save_message(req.session_id, "assistant", ai_text, req.user_email)
+    except Exception as e:
+        save.record_exception(e)
+        raise
+    finally:
+        save.end()
+    yield sse("done", {"answer": ai_text, "trace_id": telemetry.trace_id(span)})
+
+async def end_span_after(events, span):
+    """Encerra o span quando o stream termina (inclusive se o cliente desconectar)."""
+    try:
+        async for event in events:
+            yield event
+    finally:
+        span.end()
 
-    return {"final_response": {"answer": ai_text}}
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest, request: Request):
+    # O span raiz termina no fim do stream (stream_chat_events)
+    root = telemetry.start_span("POST /chat/stream", kind=SpanKind.SERVER, headers=request.headers)
+    try:
+        # 429 antes de abrir o stream
+        with telemetry.span("rate_limit", parent=root):
+            user_tier = await enforce_rate_limit(request)
+        with telemetry.span("cosmos.save_message", parent=root):
+            await db.save_message(req.session_id, "user", req.message, req.user_email)
+    except Exception:
+        root.end()
+        raise
+    return StreamingResponse(
+        end_span_after(stream_chat_events(req, user_tier, root), root),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # --- Endpoint de Histórico ---
+async def stream_history_ndjson(session_id, since):
+    async for item in db.iter_history(session_id, since=since):
+        yield json.dumps(item, ensure_ascii=False) + "\n"
+
 @app.get("/history/{session_id}")
-async def get_chat_history(session_id: str):
-    return db.get_history(session_id)
+async def get_chat_history(
+    session_id: str,
+    request: Request,
+    limit: int = Query(50, ge=1, le=500),
+    continuation: str = None,
+    since: int = None,
+    user_email: str = Depends(current_user),
+):
+    # Só o dono lê: a sessão tem de estar no índice de sessões do usuário do token
+    # (sessões sem POST /sessions entram no índice no flush; espera as pendentes)
+    await db.writer.wait_session(session_id)
+    if await db.get_session(user_email, session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    # Sessões grandes: NDJSON em streaming, uma mensagem por linha
+    if "application/x-ndjson" in request.headers.get("accept", ""):
+        return StreamingResponse(stream_history_ndjson(session_id, since), media_type="application/x-ndjson")
+
+    return await db.get_history(session_id, limit=limit, continuation=continuation, since=since)
+
+# --- Endpoints de Sessões ---
+@app.post("/sessions")
+async def create_session(session: SessionCreate):
+    return await db.create_session(session.user_email, session.title)
+
+@app.get("/sessions/{email}")
+async def list_sessions(email: str, limit: int = Query(100, ge=1, le=500), user_email: str = Depends(current_user)):
+    if normalize_email(email) != user_email:
+        raise HTTPException(status_code=403, detail="Not allowed to list another user's sessions")
+    return await db.list_sessions(email, limit=limit)
+
+# --- Métricas internas ---
+def require_admin(request: Request):
+    """Só com o token de admin; sem INTERNAL_METRICS_TOKEN configurado, os endpoints nem aparecem."""
+    if not INTERNAL_METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = request.headers.get("x-internal-token", "")
+    if not hmac.compare_digest(token.encode(), INTERNAL_METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid internal token")
+
+@app.get("/internal/metrics", include_in_schema=False, dependencies=[Depends(require_admin)])
+async def internal_metrics():
+    return {
+        "prompt_flow_pool": pf_client.stats(),
+        "history_writer": db.writer.stats(),
+        "rate_limit": limiter.stats(),
+        "coalescing": single_flight.stats(),
+    }
+
+@app.get("/internal/latency", include_in_schema=False, dependencies=[Depends(require_admin)])
+async def internal_latency():
+    # p50/p95/p99 das últimas TRACE_STATS_WINDOW amostras por etapa (backend e flow.<nó>)
+    return telemetry.latency()
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""
+Migrações de dados do Cosmos.
+
+Uso (a partir de backend/, com AZURE_COSMOS_ENDPOINT/AZURE_COSMOS_KEY definidos):
+    python migrations.py users --dry-run
+    python migrations.py users
+    python migrations.py history
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+from azure.cosmos import exceptions
+
+from database import db, normalize_email, user_id_for, next_seq
+
+
+async def migrate_user_ids(manager, dry_run=False):
+    """
+    Regrava usuários com id UUID aleatório no id determinístico (user_id_for).
+    Cria o documento novo primeiro e só então apaga o antigo; se o id novo já existe
+    (email cadastrado duas vezes com caixa diferente), mantém os dois e reporta o conflito.
+    """
+    stats = {"scanned": 0, "migrated": 0, "already_ok": 0, "conflicts": []}
+
+    # Scan completo (cross-partition) aceitável numa migração única
+    legacy_users = [user async for user in manager.users.read_all_items()]
+
+    for user in legacy_users:
+        stats["scanned"] += 1
+        target_id = user_id_for(user["email"])
+        if user["id"] == target_id:
+            stats["already_ok"] += 1
+            continue
+
+        new_doc = {k: v for k, v in user.items() if not k.startswith("_")}
+        new_doc["id"] = target_id
+        new_doc["email"] = normalize_email(user["email"])
+        new_doc["legacy_id"] = user["id"]
+
+        if dry_run:
+            stats["migrated"] += 1
+            continue
+
+        try:
+            await manager.users.create_item(body=new_doc)
+        except exceptions.CosmosResourceExistsError:
+            stats["conflicts"].append(user["email"])
+            continue
+
+        await manager.users.delete_item(item=user["id"], partition_key=user["email"])
+        stats["migrated"] += 1
+
+    return stats
+
+
+def seq_from_timestamp(timestamp):
+    # Mensagens antigas guardam str(datetime.utcnow()), ex: "2025-11-20 14:03:22.512345"
+    try:
+        dt = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return next_seq()
+    return int((dt - datetime(1970, 1, 1)).total_seconds() * 1_000_000)
+
+
+async def backfill_message_seq(manager, dry_run=False):
+    """Preenche `seq` (epoch em µs) nas mensagens gravadas antes da paginação por seq."""
+    stats = {"scanned": 0, "backfilled": 0}
+
+    legacy = [
+        msg async for msg in manager.history.query_items(
+            query="SELECT * FROM c WHERE NOT IS_DEFINED(c.seq)"
+        )
+        if "seq" not in msg
+    ]
+
+    for msg in legacy:
+        stats["scanned"] += 1
+        msg = {k: v for k, v in msg.items() if not k.startswith("_")}
+        msg["seq"] = seq_from_timestamp(msg.get("timestamp"))
+        if not dry_run:
+            await manager.history.upsert_item(body=msg)
+        stats["backfilled"] += 1
+
+    return stats
+
+
+async def run(args):
+    await db.connect()
+    try:
+        if args.command == "users":
+            stats = await migrate_user_ids(db, dry_run=args.dry_run)
+            print(f">>> [MIGRATION] users: {stats}")
+        elif args.command == "history":
+            stats = await backfill_message_seq(db, dry_run=args.dry_run)
+            print(f">>> [MIGRATION] history: {stats}")
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["users", "history"])
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(run(parser.parse_args()))
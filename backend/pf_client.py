@@ -0,0 +1,120 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+import httpx
+
+# Configuração do pool (Variáveis de Ambiente)
+PF_MAX_CONNECTIONS = int(os.getenv("PF_MAX_CONNECTIONS", "100"))
+PF_MAX_KEEPALIVE = int(os.getenv("PF_MAX_KEEPALIVE", "20"))
+PF_KEEPALIVE_EXPIRY = float(os.getenv("PF_KEEPALIVE_EXPIRY", "30"))
+PF_CONNECT_TIMEOUT = float(os.getenv("PF_CONNECT_TIMEOUT", "5"))
+PF_READ_TIMEOUT = float(os.getenv("PF_READ_TIMEOUT", "60"))
+PF_HTTP2 = os.getenv("PF_HTTP2", "true").lower() in ("1", "true", "yes")
+
+
+class PromptFlowClient:
+    """
+    Cliente HTTP compartilhado (vida útil da app) para o hop /chat -> Prompt Flow.
+    Reaproveita conexões TCP/TLS em vez de abrir um handshake novo por request.
+    """
+
+    def __init__(self):
+        self.client = None
+        self.max_connections = PF_MAX_CONNECTIONS
+        # O semáforo espelha o limite do pool para podermos medir o tempo de espera
+        self._slots = None
+
+        # Estatísticas
+        self.requests_total = 0
+        self.errors_total = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    async def start(self):
+        if self.client is not None:
+            return
+        self._slots = asyncio.Semaphore(self.max_connections)
+        self.client = httpx.AsyncClient(
+            http2=PF_HTTP2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=PF_MAX_KEEPALIVE,
+                keepalive_expiry=PF_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                connect=PF_CONNECT_TIMEOUT,
+                read=PF_READ_TIMEOUT,
+                write=PF_CONNECT_TIMEOUT,
+                pool=PF_READ_TIMEOUT,
+            ),
+        )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    @asynccontextmanager
+    async def _slot(self):
+        if self.client is None:
+            await self.start()
+
+        self.waiting += 1
+        t0 = time.perf_counter()
+        async with self._slots:
+            waited = time.perf_counter() - t0
+            self.waiting -= 1
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+
+            self.requests_total += 1
+            self.in_flight += 1
+            try:
+                yield
+            except Exception:
+                self.errors_total += 1
+                raise
+            finally:
+                self.in_flight -= 1
+
+    async def post(self, url, **kwargs):
+        async with self._slot():
+            return await self.client.post(url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, url, **kwargs):
+        """POST com corpo lido incrementalmente (ex: text/event-stream)."""
+        async with self._slot():
+            async with self.client.stream("POST", url, **kwargs) as resp:
+                yield resp
+
+    def _pool_connections(self):
+        # httpcore não expõe estatísticas públicas; lê o pool do transporte com cuidado
+        transport = getattr(self.client, "_transport", None)
+        pool = getattr(transport, "_pool", None)
+        return list(getattr(pool, "connections", []) or [])
+
+    def stats(self):
+        connections = self._pool_connections() if self.client is not None else []
+        idle = sum(1 for c in connections if c.is_idle())
+        return {
+            "http2": PF_HTTP2,
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": PF_MAX_KEEPALIVE,
+            "connections_open": len(connections),
+            "connections_active": len(connections) - idle,
+            "connections_idle": idle,
+            "requests_in_flight": self.in_flight,
+            "requests_waiting": self.waiting,
+            "requests_total": self.requests_total,
+            "errors_total": self.errors_total,
+            "pool_wait_ms_avg": round(1000 * self.wait_time_total / self.requests_total, 3) if self.requests_total else 0.0,
+            "pool_wait_ms_max": round(1000 * self.wait_time_max, 3),
+        }
+
+
+# Instância global (aberta/fechada nos hooks de startup/shutdown)
+pf_client = PromptFlowClient()
@@ -0,0 +1,105 @@
+"""
+Rate limiting do /chat e /chat/stream, aplicado ANTES da chamada ao Prompt Flow
+(uma requisição negada não gasta nenhuma chamada de LLM).
+
+Chaves: por usuário (sub do JWT; sem token válido = IP do cliente), por tier e
+total do tier. O tier vai no payload do Prompt Flow (user_tier).
+
+Algoritmos, backends (memory | sqlite | redis, RATE_LIMIT_BACKEND) e tabela de
+tiers vêm de multi-agents/rate_limiter.py, o mesmo módulo que o flow usa; aqui
+fica só a cola com o FastAPI. Na imagem, o Dockerfile copia o rate_limiter.py
+ao lado deste arquivo; rodando do repositório, ele é lido de ../multi-agents.
+Em produção, com várias réplicas, use redis.
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import sys
+
+from fastapi import HTTPException, Request
+
+from auth_utils import decode_access_token
+
+try:
+    import rate_limiter  # noqa: F401
+except ImportError:
+    # Fora da imagem: o módulo fica em multi-agents/ (no fim do path: os módulos do backend têm prioridade)
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "multi-agents"))
+    import rate_limiter  # noqa: F401
+
+from rate_limiter import (  # noqa: E402,F401  (reexportados para os benchmarks)
+    DAY_SECONDS,
+    MemoryBackend,
+    RateLimiter,
+    RedisBackend,
+    Rule,
+    SlidingWindow,
+    SQLiteBackend,
+    TokenBucket,
+    create_backend,
+    request_rules,
+    tier_limits,
+)
+
+logger = logging.getLogger(__name__)
+
+# Configuração (Variáveis de Ambiente)
+# RATE_LIMIT_BACKEND, RATE_LIMIT_DB, RATE_LIMIT_REDIS_URL e RATE_LIMIT_TIERS: ver rate_limiter.py
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_PREFIX = os.getenv("RATE_LIMIT_PREFIX", "backend")
+# Tier por usuário, em JSON: {"email": "premium"}; logado sem entrada = "default"
+RATE_LIMIT_USER_TIERS = json.loads(os.getenv("RATE_LIMIT_USER_TIERS", "{}"))
+
+
+# --- FastAPI ---
+
+def request_identity(request: Request):
+    """E-mail (sub) do JWT válido no header Authorization, ou None."""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    claims = decode_access_token(token.strip())
+    return (claims or {}).get("sub")
+
+
+def resolve_user(request: Request):
+    """
+    (chave do usuário, tier): logado pelo JWT assinado, anônimo pelo IP do
+    cliente. Nunca pelo corpo da requisição (user_email não é autenticado).
+    """
+    email = request_identity(request)
+    if email:
+        email = email.strip().lower()
+        return email, RATE_LIMIT_USER_TIERS.get(email, "default")
+    host = request.client.host if request.client else "unknown"
+    return f"ip:{host}", "anonymous"
+
+
+async def enforce_rate_limit(request: Request) -> str:
+    """Consome os limites da requisição ou levanta 429; devolve o tier do usuário."""
+    user_id, user_tier = resolve_user(request)
+    if not RATE_LIMIT_ENABLED:
+        return user_tier
+
+    rules = request_rules(user_id, user_tier)
+    if isinstance(limiter.backend, MemoryBackend):
+        result = limiter.acquire(rules)
+    else:
+        # SQLite/Redis bloqueiam: fora do event loop
+        result = await asyncio.to_thread(limiter.acquire, rules)
+
+    if not result["allowed"]:
+        retry_after = max(1, math.ceil(result["retry_after"]))
+        logger.warning(f"Rate limit: {user_id} ({user_tier}) denied by {result['denied_by']}, retry in {retry_after}s")
+        raise HTTPException(
+            status_code=429,
+            detail={"error": "rate_limited", "limit": result["denied_by"], "retry_after": retry_after},
+            headers={"Retry-After": str(retry_after)},
+        )
+    return user_tier
+
+
+# Instância global
+limiter = RateLimiter(prefix=RATE_LIMIT_PREFIX)
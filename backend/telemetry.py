@@ -0,0 +1,210 @@
+"""
+Tracing do backend (spans OpenTelemetry) e latência por etapa (p50/p95/p99).
+
+Cada /chat abre um span raiz (continua o `traceparent` do cliente, se vier) com
+filhos para rate_limit, Cosmos e a chamada ao Prompt Flow. O traceparent do
+span prompt_flow vai no payload do /score: os nós do flow (multi-agents/
+telemetry.py) geram spans no mesmo trace e devolvem a duração de cada etapa em
+`trace.stages`, que entram aqui como "flow.<etapa>".
+
+StageStats guarda as últimas TRACE_STATS_WINDOW durações de cada etapa (spans
+do backend + etapas do flow) para o GET /internal/latency.
+
+Exportador (TRACE_EXPORTER): console | jsonl (TRACE_FILE) | otlp (variáveis
+OTEL_EXPORTER_OTLP_*) | none. Mesmo formato de multi-agents/telemetry.py (o
+backend é uma imagem separada).
+"""
+import json
+import math
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from opentelemetry import trace
+from opentelemetry.context import Context
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor, SpanExporter, SpanExportResult
+)
+from opentelemetry.trace import SpanKind
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+
+# Configuração (Variáveis de Ambiente)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")  # console | jsonl | otlp | none
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "civic-backend")
+TRACE_STATS_WINDOW = int(os.getenv("TRACE_STATS_WINDOW", "1000"))
+
+_propagator = TraceContextTextMapPropagator()
+
+
+# --- Exportadores ---
+
+def span_to_dict(span) -> dict:
+    """Span no formato OTLP/JSON simplificado (uma linha por span)."""
+    context = span.get_span_context()
+    return {
+        "trace_id": format(context.trace_id, "032x"),
+        "span_id": format(context.span_id, "016x"),
+        "parent_span_id": format(span.parent.span_id, "016x") if span.parent else None,
+        "name": span.name,
+        "kind": span.kind.name,
+        "start_time_unix_nano": span.start_time,
+        "end_time_unix_nano": span.end_time,
+        "duration_ms": round((span.end_time - span.start_time) / 1e6, 3),
+        "status": span.status.status_code.name,
+        "attributes": dict(span.attributes or {}),
+        "service": span.resource.attributes.get("service.name"),
+    }
+
+
+class JsonlSpanExporter(SpanExporter):
+    def __init__(self, path=TRACE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        lines = "".join(json.dumps(span_to_dict(s), ensure_ascii=False) + "\n" for s in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+class MemorySpanExporter(SpanExporter):
+    """Guarda os spans (testes e benchmarks)."""
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(span_to_dict(s) for s in spans)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+def create_processor(name: str = TRACE_EXPORTER):
+    if name == "none":
+        return None
+    if name == "console":
+        return SimpleSpanProcessor(ConsoleSpanExporter())
+    if name == "jsonl":
+        return BatchSpanProcessor(JsonlSpanExporter())
+    if name == "memory":
+        return SimpleSpanProcessor(MemorySpanExporter())
+    if name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return BatchSpanProcessor(OTLPSpanExporter())
+    raise ValueError(f"Unknown TRACE_EXPORTER: {name}")
+
+
+# --- Percentis por etapa ---
+
+def percentile(values: list, q: float) -> float:
+    """Percentil por nearest-rank de uma lista ordenada."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, math.ceil(q / 100 * len(values)) - 1))]
+
+
+class StageStats(SpanProcessor):
+    """Janela móvel das durações de cada etapa (últimas `window` amostras)."""
+
+    def __init__(self, window: int = TRACE_STATS_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._stages = {}  # etapa -> deque de ms
+
+    def on_end(self, span):
+        self.record(span.name, (span.end_time - span.start_time) / 1e6)
+
+    def record(self, stage: str, duration_ms: float):
+        with self._lock:
+            samples = self._stages.get(stage)
+            if samples is None:
+                samples = self._stages[stage] = deque(maxlen=self.window)
+            samples.append(duration_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stages = {name: sorted(samples) for name, samples in self._stages.items()}
+        return {
+            name: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                "max_ms": round(values[-1], 2),
+            }
+            for name, values in sorted(stages.items())
+        }
+
+
+class BackendTelemetry:
+    def __init__(self, processor=None):
+        self.provider = TracerProvider(resource=Resource.create({"service.name": TRACE_SERVICE_NAME}))
+        self.stats = StageStats()
+        self.provider.add_span_processor(self.stats)
+        self.processor = processor if processor is not None else create_processor()
+        if self.processor is not None:
+            self.provider.add_span_processor(self.processor)
+        self.tracer = self.provider.get_tracer("civic-backend")
+
+    @staticmethod
+    def _context(parent=None, headers=None, new_trace=False):
+        if new_trace:
+            return Context()
+        if parent is not None:
+            return trace.set_span_in_context(parent)
+        if headers is not None:
+            return _propagator.extract(headers)
+        return None
+
+    @contextmanager
+    def span(self, name: str, kind=SpanKind.INTERNAL, parent=None, headers=None, new_trace=False, **attributes):
+        """
+        Span atual (filho do span corrente). parent: span explícito (streaming, onde
+        o contexto não atravessa os yields); headers: continua o traceparent do cliente;
+        new_trace: span raiz, ignorando o contexto herdado (tarefas em segundo plano).
+        """
+        with self.tracer.start_as_current_span(
+            name, context=self._context(parent, headers, new_trace), kind=kind, attributes=attributes,
+            record_exception=True, set_status_on_exception=True
+        ) as span:
+            yield span
+
+    def start_span(self, name: str, kind=SpanKind.INTERNAL, parent=None, headers=None, **attributes):
+        """Span sem contexto atual (quem chama encerra com span.end())."""
+        return self.tracer.start_span(name, context=self._context(parent, headers), kind=kind,
+                                      attributes=attributes)
+
+    @staticmethod
+    def traceparent(span=None) -> str:
+        """Header W3C traceparent do span (padrão: o span atual)."""
+        carrier = {}
+        _propagator.inject(carrier, context=trace.set_span_in_context(span) if span is not None else None)
+        return carrier.get("traceparent", "")
+
+    @staticmethod
+    def trace_id(span) -> str:
+        return format(span.get_span_context().trace_id, "032x")
+
+    def record_flow(self, flow_trace) -> None:
+        """Durações por etapa devolvidas pelo flow (saída `trace` do finalize_response)."""
+        if not isinstance(flow_trace, dict):
+            return
+        for stage, duration_ms in (flow_trace.get("stages") or {}).items():
+            self.stats.record(f"flow.{stage}", float(duration_ms))
+
+    def latency(self) -> dict:
+        return {"window": self.stats.window, "stages": self.stats.snapshot()}
+
+
+# Instância global
+telemetry = BackendTelemetry()
@@ -483,6 +483,12 @@ interface BackendMessage {
   content: string;
   role: string;
   timestamp: string;
+  seq?: number;
+}
+
+interface HistoryPage {
+  items: BackendMessage[];
+  continuation: string | null;
 }
 
 // Interface da Sessão para a Sidebar
@@ -499,9 +505,14 @@ export default function ChatInterface() {
   const [messages, setMessages] = useState<Message[]>([]);
   const [inputValue, setInputValue] = useState("");
   const [isLoading, setIsLoading] = useState(false);
+  const [streamStage, setStreamStage] = useState<string | null>(null);
   const [sidebarOpen, setSidebarOpen] = useState(true);
   const [language, setLanguage] = useState<"en" | "pt">("en");
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // Cache do histórico por sessão: só busca mensagens novas (seq > lastSeq)
+  const historyCache = useRef<
+    Record<string, { messages: Message[]; lastSeq: number }>
+  >({});
 
   const [userName, setUserName] = useState<string | null>(null);
   const [userEmail, setUserEmail] = useState<string | null>(null);
@@ -543,7 +554,11 @@ export default function ChatInterface() {
 
   const fetchSessions = async (email: string) => {
     try {
-      const res = await fetch(`${BACKEND_URL}/sessions/${email}`);
+      // Só o dono lista as próprias sessões: o backend confere o sub do JWT
+      const token = localStorage.getItem("token");
+      const res = await fetch(`${BACKEND_URL}/sessions/${email}`, {
+        headers: token ? { Authorization: `Bearer ${token}` } : {},
+      });
       if (res.ok) {
         const sessions = await res.json();
         setChatSessions(sessions);
@@ -558,21 +573,43 @@ export default function ChatInterface() {
     // Em mobile, fecha a sidebar ao selecionar
     if (window.innerWidth <= 768) setSidebarOpen(false);
 
+    const cached = historyCache.current[sessionId];
+    if (cached) setMessages(cached.messages);
+
     setIsLoading(true);
     try {
-      const res = await fetch(`${BACKEND_URL}/history/${sessionId}`);
-      if (!res.ok) throw new Error("Failed to load history");
+      const token = localStorage.getItem("token");
+      let lastSeq = cached?.lastSeq ?? 0;
+      let continuation: string | null = null;
+      const newMessages: Message[] = [];
+
+      // Percorre as páginas (continuation token) só com mensagens novas
+      do {
+        const params = new URLSearchParams({ limit: "100" });
+        if (cached) params.set("since", String(cached.lastSeq));
+        if (continuation) params.set("continuation", continuation);
 
-      const historyData = await res.json();
+        const res = await fetch(
+          `${BACKEND_URL}/history/${sessionId}?${params.toString()}`,
+          { headers: token ? { Authorization: `Bearer ${token}` } : {} }
+        );
+        if (!res.ok) throw new Error("Failed to load history");
 
-      const uiMessages: Message[] = (historyData as BackendMessage[]).map(
-        (item) => ({
-          id: item.id,
-          text: item.content,
-          isUser: item.role === "user",
-          timestamp: new Date(item.timestamp),
-        })
-      );
+        const page: HistoryPage = await res.json();
+        for (const item of page.items) {
+          newMessages.push({
+            id: item.id,
+            text: item.content,
+            isUser: item.role === "user",
+            timestamp: new Date(item.timestamp),
+          });
+          lastSeq = Math.max(lastSeq, item.seq ?? 0);
+        }
+        continuation = page.continuation;
+      } while (continuation);
+
+      const uiMessages = [...(cached?.messages ?? []), ...newMessages];
+      historyCache.current[sessionId] = { messages: uiMessages, lastSeq };
 
       setMessages(uiMessages);
     } catch (err) {
@@ -647,52 +684,99 @@ export default function ChatInterface() {
       updateState();
     }
 
+    const botMessageId = (Date.now() + 1).toString();
+
     try {
-      const response = await fetch(`${BACKEND_URL}/chat`, {
+      const token = localStorage.getItem("token");
+      const response = await fetch(`${BACKEND_URL}/chat/stream`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
+          Accept: "text/event-stream",
+          // Rate limit por usuário vem do JWT (sem token: limite anônimo por IP)
+          ...(token ? { Authorization: `Bearer ${token}` } : {}),
         },
         body: JSON.stringify({
           message: text,
           session_id: finalSessionId,
+          user_email: userEmail,
         }),
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error(`Erro na API: ${response.statusText}`);
       }
 
-      const data = await response.json();
+      // Lê o Server-Sent Events incrementalmente e atualiza a mensagem do bot
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let botText = "";
 
-      const aiResponseText =
-        data.final_response?.answer ||
-        data.answer ||
-        data.final_response ||
-        JSON.stringify(data);
-
-      const botMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        text:
-          typeof aiResponseText === "string"
-            ? aiResponseText
-            : JSON.stringify(aiResponseText),
-        isUser: false,
-        timestamp: new Date(),
+      const upsertBotMessage = (value: string) => {
+        setMessages((prev) => {
+          const botMessage: Message = {
+            id: botMessageId,
+            text: value,
+            isUser: false,
+            timestamp: new Date(),
+          };
+          const exists = prev.some((m) => m.id === botMessageId);
+          return exists
+            ? prev.map((m) => (m.id === botMessageId ? botMessage : m))
+            : [...prev, botMessage];
+        });
       };
 
-      setMessages((prev) => [...prev, botMessage]);
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const events = buffer.split("\n\n");
+        buffer = events.pop() || "";
+
+        for (const rawEvent of events) {
+          let eventName = "message";
+          let data = "";
+          for (const line of rawEvent.split("\n")) {
+            if (line.startsWith("event:")) eventName = line.slice(6).trim();
+            else if (line.startsWith("data:")) data += line.slice(5).trim();
+          }
+          if (!data) continue;
+          const payload = JSON.parse(data);
+
+          if (eventName === "progress" && payload.stage) {
+            setStreamStage(payload.stage);
+          } else if (eventName === "token") {
+            botText += payload.text;
+            setIsLoading(false);
+            upsertBotMessage(botText);
+          } else if (eventName === "done") {
+            botText = payload.answer || botText;
+            upsertBotMessage(botText);
+          }
+        }
+      }
+
+      if (!botText) {
+        throw new Error("Resposta vazia do servidor");
+      }
     } catch (error) {
       console.error("Erro ao chamar backend:", error);
       const errorMessage: Message = {
-        id: (Date.now() + 1).toString(),
+        id: botMessageId,
         text: translations[language].error,
         isUser: false,
         timestamp: new Date(),
       };
-      setMessages((prev) => [...prev, errorMessage]);
+      setMessages((prev) => [
+        ...prev.filter((m) => m.id !== botMessageId),
+        errorMessage,
+      ]);
     } finally {
       setIsLoading(false);
+      setStreamStage(null);
     }
   };
 
@@ -930,7 +1014,12 @@ export default function ChatInterface() {
               {isLoading && (
                 <div className={styles.loadingContainer}>
                   <Spinner size="tiny" />
-                  <span>{translations[language].aiThinking}</span>
+                  <span>
+                    {translations[language].aiThinking}
+                    {streamStage && streamStage !== "received"
+                      ? ` (${streamStage})`
+                      : ""}
+                  </span>
                 </div>
               )}
               <div ref={messagesEndRef} />
@@ -0,0 +1,110 @@
+"""
+JSON Schemas da saída de cada agente LLM (validados pelo parse_json.py).
+
+Os nós usam response_format json_object: a api-version do aoai_connection
+(2024-02-15-preview) não aceita json_schema. O JSON sai sintaticamente válido
+da API e o schema é conferido aqui.
+"""
+from jsonschema import Draft7Validator
+
+INTENTS = [
+    "candidate_position_query", "candidate_comparison",
+    "topic_exploration", "general_election_info", "out_of_scope"
+]
+
+_NULLABLE_STRING = {"type": ["string", "null"]}
+
+_SUMMARY_BODY = {
+    "type": "object",
+    "required": ["summary_bullets", "explanation"],
+    "properties": {
+        "summary_bullets": {"type": "array", "items": {"type": "string"}},
+        "explanation": {"type": "string"},
+        "complexity_level": {"type": "string"},
+        "not_found": {"type": "boolean"},
+        "documentation_url": _NULLABLE_STRING
+    }
+}
+
+SCHEMAS = {
+    "intent": {
+        "type": "object",
+        "required": ["intent", "entities", "original_query"],
+        "properties": {
+            "intent": {"enum": INTENTS},
+            "entities": {
+                "type": "object",
+                "required": ["candidate_name"],
+                "properties": {
+                    "candidate_name": {"type": "array", "items": {"type": "string"}},
+                    "policy_topic": _NULLABLE_STRING,
+                    "question_type": _NULLABLE_STRING
+                }
+            },
+            "original_query": {"type": "string"},
+            "confidence": {"type": "number", "minimum": 0, "maximum": 1}
+        }
+    },
+    "summary": {
+        "type": "object",
+        "required": ["summary"],
+        "properties": {
+            # Comparação: um resumo por candidato ({"Nome": {...}})
+            "summary": {"anyOf": [_SUMMARY_BODY, {"type": "object", "additionalProperties": _SUMMARY_BODY}]}
+        }
+    },
+    "verification": {
+        "type": "object",
+        "required": ["verification"],
+        "properties": {
+            # Comparação: uma verificação por candidato
+            "verification": {"type": "object"}
+        }
+    },
+    "comparison": {
+        "type": "object",
+        "required": ["comparison"],
+        "properties": {
+            "comparison": {
+                "type": "object",
+                "required": ["candidates", "neutral_summary", "key_differences"],
+                "properties": {
+                    "candidates": {"type": "object"},
+                    "neutral_summary": {"type": "string"},
+                    "key_differences": {"type": "array"}
+                }
+            }
+        }
+    },
+    "safety": {
+        "type": "object",
+        "required": ["final_response", "safety_check"],
+        "properties": {
+            "final_response": {
+                "type": "object",
+                "required": ["answer"],
+                "properties": {
+                    "answer": {"type": "string"},
+                    "summary_bullets": {"type": "array", "items": {"type": "string"}},
+                    "sources": {"type": "array"}
+                }
+            },
+            "safety_check": {
+                "type": "object",
+                "required": ["approved"],
+                "properties": {"approved": {"type": "boolean"}}
+            }
+        }
+    }
+}
+
+_validators = {name: Draft7Validator(schema) for name, schema in SCHEMAS.items()}
+
+
+def validate(value, schema_name: str) -> list:
+    """Erros de schema (lista vazia = válido), no formato "caminho: mensagem"."""
+    validator = _validators.get(schema_name)
+    if validator is None:
+        raise ValueError(f"Unknown schema: {schema_name}")
+    errors = sorted(validator.iter_errors(value), key=lambda e: list(e.absolute_path))
+    return [f"{'.'.join(str(p) for p in e.absolute_path) or '$'}: {e.message}" for e in errors]
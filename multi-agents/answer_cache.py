@@ -0,0 +1,161 @@
+import os
+import json
+import math
+import time
+import threading
+from collections import OrderedDict
+
+from text_utils import normalize_text
+
+# Configuração (Variáveis de Ambiente)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(6 * 3600)))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))
+# Arquivo "tocado" a cada re-ingestão do índice de busca (ver echo.py); muda -> cache invalidado
+ANSWER_CACHE_VERSION_FILE = os.getenv(
+    "ANSWER_CACHE_VERSION_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".index_version")
+)
+
+
+def entities_key(entities) -> str:
+    """Chave canônica das entidades resolvidas (candidatos + tema), independente de ordem."""
+    entities = entities or {}
+    names = entities.get("candidate_names") or entities.get("candidate_name") or []
+    if isinstance(names, str):
+        names = [names]
+    names = sorted(normalize_text(n) for n in names if n)
+    topic = normalize_text(entities.get("policy_topic") or "")
+    return f"{'+'.join(names)}|{topic}"
+
+
+def estimate_tokens(*objs) -> int:
+    """Estimativa grosseira (~4 caracteres por token) do texto que um objeto gera num prompt."""
+    total = 0
+    for obj in objs:
+        if obj is None:
+            continue
+        text = obj if isinstance(obj, str) else json.dumps(obj, ensure_ascii=False)
+        total += len(text) // 4
+    return total
+
+
+def _cosine(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def index_version() -> str:
+    try:
+        return str(os.stat(ANSWER_CACHE_VERSION_FILE).st_mtime_ns)
+    except OSError:
+        return "0"
+
+
+def bump_index_version():
+    """Chamado ao final de uma re-ingestão: invalida os caches de resposta de todos os workers."""
+    with open(ANSWER_CACHE_VERSION_FILE, "w") as f:
+        f.write(str(time.time()))
+
+
+class AnswerCache:
+    """
+    Cache de respostas finais do flow.
+    - Camada exata: query normalizada (antes do intent_agent, pula o flow inteiro).
+    - Camada semântica: mesma intenção + entidades e, opcionalmente, embedding da query
+      com similaridade >= threshold (pega paráfrases da mesma pergunta).
+    LRU com TTL; esvazia quando o índice de busca é re-ingerido.
+    Hit rate, tokens e custo economizados são contabilizados em simple_protection (simple_cost_track).
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+                 similarity_threshold=ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()  # query normalizada -> entrada
+        self._lock = threading.Lock()
+        self._version = index_version()
+
+    def _check_version(self):
+        current = index_version()
+        if current != self._version:
+            self._entries.clear()
+            self._version = current
+
+    def _live(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["created_at"] > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        return entry
+
+    def _hit(self, key, entry, tier):
+        self._entries.move_to_end(key)
+        return {"hit": True, "tier": tier, "final_response": entry["final_response"],
+                "tokens_saved": entry["tokens"], "cost_saved_usd": entry["cost_usd"]}
+
+    def get_exact(self, query: str) -> dict:
+        key = normalize_text(query)
+        with self._lock:
+            self._check_version()
+            entry = self._live(key)
+            if entry is not None:
+                return self._hit(key, entry, "exact")
+        return {"hit": False, "tier": None, "final_response": None, "tokens_saved": 0}
+
+    def get_semantic(self, query: str, intent: str, entities, query_vector=None) -> dict:
+        key = normalize_text(query)
+        bucket = (intent, entities_key(entities))
+        with self._lock:
+            self._check_version()
+            entry = self._live(key)
+            if entry is not None and entry["bucket"] == bucket:
+                return self._hit(key, entry, "intent")
+
+            if query_vector:
+                best_key, best_score = None, self.similarity_threshold
+                for other_key in list(self._entries):
+                    other = self._live(other_key)
+                    if other is None or other["bucket"] != bucket or not other["vector"]:
+                        continue
+                    score = _cosine(query_vector, other["vector"])
+                    if score >= best_score:
+                        best_key, best_score = other_key, score
+                if best_key is not None:
+                    return self._hit(best_key, self._entries[best_key], "embedding")
+
+        return {"hit": False, "tier": None, "final_response": None, "tokens_saved": 0}
+
+    def put(self, query: str, intent: str, entities, final_response, tokens: int = 0, query_vector=None,
+            cost_usd: float = 0.0):
+        """cost_usd: custo real (usage_tracker) da requisição que gerou a resposta = o que um hit economiza"""
+        key = normalize_text(query)
+        with self._lock:
+            self._check_version()
+            self._entries[key] = {
+                "bucket": (intent, entities_key(entities)),
+                "final_response": final_response,
+                "tokens": tokens,
+                "cost_usd": cost_usd,
+                "vector": query_vector,
+                "created_at": time.time(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Instância global (por worker do pf flow serve)
+answer_cache = AnswerCache()
@@ -0,0 +1,15 @@
+from promptflow import tool
+from answer_cache import answer_cache, ANSWER_CACHE_ENABLED
+from telemetry import telemetry
+
+
+@tool
+def answer_cache_lookup(user_query: str) -> dict:
+    """
+    Camada exata do cache de respostas (antes do intent_agent).
+    hit=True -> o restante do DAG é pulado via activate.
+    """
+    with telemetry.span():
+        if not ANSWER_CACHE_ENABLED or not user_query:
+            return {"hit": False, "tier": None, "final_response": None, "tokens_saved": 0}
+        return answer_cache.get_exact(user_query)
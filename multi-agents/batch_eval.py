@@ -0,0 +1,377 @@
+"""
+Avaliação em lote do flow sobre um dataset CSV (test_dataset.csv, dataset_refinamento.csv).
+
+Roda cada pergunta com concorrência limitada (--concurrency) contra:
+- o flow em processo (padrão): FlowExecutor com a aoai_connection montada das
+  variáveis AZURE_OPENAI_* (as mesmas do boot.py); --set no.input=valor troca
+  inputs de nós (deployment_name, retrieval_backend, ...) sem editar o DAG
+- --endpoint URL: o /score de um `pf flow serve` ou do App Service já publicado
+
+Métricas por linha e agregadas:
+- intent accuracy: evaluate_intent (eval_intent_accuracy.py) contra expected_intent
+- candidate accuracy: candidatos extraídos == expected_candidate (nomes normalizados)
+- answer coverage: fração dos pontos de expected_answer (separados por ";" ou
+  frases) cujos termos aparecem na resposta (recall >= COVERAGE_MIN_RECALL)
+- tokens e custo reais (saída `usage` do flow), latência total e por etapa
+  (saída `trace.stages`) em p50/p95/p99
+
+--output grava o relatório JSON; --baseline compara com um relatório salvo e
+sai com código 1 se qualidade, latência ou custo piorarem além das tolerâncias
+(EVAL_MAX_*), para barrar mudanças de prompt ou modelo.
+
+Uso:
+    python batch_eval.py dataset_refinamento.csv test_dataset.csv --concurrency 4 --output eval_baseline.json
+    python batch_eval.py dataset_refinamento.csv test_dataset.csv --set intent_agent.deployment_name=gpt-4o \\
+        --baseline eval_baseline.json
+"""
+import csv
+import json
+import math
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from eval_intent_accuracy import evaluate_intent
+from text_utils import normalize_text, tokenize
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Configuração (Variáveis de Ambiente)
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "4"))
+EVAL_TIMEOUT = float(os.getenv("EVAL_TIMEOUT", "120"))
+COVERAGE_MIN_RECALL = float(os.getenv("EVAL_COVERAGE_MIN_RECALL", "0.5"))
+
+# Tolerâncias do gate contra o baseline
+EVAL_MAX_QUALITY_DROP = float(os.getenv("EVAL_MAX_QUALITY_DROP", "0.0"))          # pontos (0-1) por métrica
+EVAL_MAX_LATENCY_INCREASE = float(os.getenv("EVAL_MAX_LATENCY_INCREASE", "0.2"))  # relativo, p50/p95 total
+EVAL_MAX_COST_INCREASE = float(os.getenv("EVAL_MAX_COST_INCREASE", "0.1"))        # relativo, custo por linha
+
+QUALITY_METRICS = ("intent_accuracy", "candidate_accuracy", "answer_coverage")
+
+
+# --- Dataset ---
+
+def load_dataset(path: str) -> list:
+    """
+    Linhas do CSV (user_query, expected_intent, expected_candidate, expected_answer opcional).
+    Colunas extras vão para a última coluna: no test_dataset.csv a lista de
+    candidatos não tem aspas ("Maria Silva, Joao Pereira").
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = [h.strip() for h in next(reader)]
+        rows = []
+        for values in reader:
+            if not values or not values[0].strip():
+                continue
+            if len(values) > len(header):
+                values = values[:len(header) - 1] + [",".join(values[len(header) - 1:])]
+            row = dict(zip(header, (v.strip() for v in values)))
+            rows.append({
+                "user_query": row["user_query"],
+                "expected_intent": row.get("expected_intent") or "",
+                "expected_candidates": [c.strip() for c in (row.get("expected_candidate") or "").split(",") if c.strip()],
+                "expected_answer": row.get("expected_answer") or "",
+                "dataset": os.path.basename(path)
+            })
+    return rows
+
+
+# --- Métricas por linha ---
+
+def candidate_match(predicted: list, expected: list) -> float:
+    """1.0 se os conjuntos de candidatos coincidem (sem acentos/caixa), senão 0.0."""
+    return 1.0 if {normalize_text(c) for c in predicted or []} == {normalize_text(c) for c in expected} else 0.0
+
+
+def answer_points(expected_answer: str) -> list:
+    """Pontos esperados: separados por ";" ou fim de frase."""
+    parts = re.split(r";|\n|(?<=\.)\s+", expected_answer or "")
+    return [p.strip(" .") for p in parts if tokenize(p)]
+
+
+def answer_text(final_response) -> str:
+    if isinstance(final_response, dict):
+        bullets = final_response.get("summary_bullets") or []
+        return " ".join([str(final_response.get("answer") or "")] + [str(b) for b in bullets])
+    return str(final_response or "")
+
+
+def answer_coverage(final_response, expected_answer: str):
+    """Fração dos pontos esperados presentes na resposta; None sem expected_answer."""
+    points = answer_points(expected_answer)
+    if not points:
+        return None
+    answer_terms = set(tokenize(answer_text(final_response)))
+    covered = 0
+    for point in points:
+        terms = set(tokenize(point))
+        if len(terms & answer_terms) / len(terms) >= COVERAGE_MIN_RECALL:
+            covered += 1
+    return covered / len(points)
+
+
+# --- Execução ---
+
+class LocalRunner:
+    """Flow em processo (FlowExecutor). exec_line é chamado de várias threads."""
+
+    def __init__(self, executor):
+        self.executor = executor
+
+    def run(self, inputs: dict) -> dict:
+        result = self.executor.exec_line(inputs)
+        if result.run_info.error:
+            raise RuntimeError(result.run_info.error.get("message", "flow error"))
+        return result.output
+
+
+class EndpointRunner:
+    """/score de um flow publicado (mesmo payload do backend)."""
+
+    def __init__(self, url: str, api_key: str = None):
+        self.url = url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=64)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.headers = {"Content-Type": "application/json"}
+        if api_key:
+            self.headers["Authorization"] = f"Bearer {api_key}"
+
+    def run(self, inputs: dict) -> dict:
+        r = self.session.post(self.url, json=inputs, headers=self.headers, timeout=EVAL_TIMEOUT)
+        r.raise_for_status()
+        return r.json()
+
+
+def create_local_executor(node_override: dict = None, connections: dict = None, flow_file: str = "flow.dag.yaml"):
+    """FlowExecutor do flow com a aoai_connection das variáveis de ambiente (ou `connections`)."""
+    from promptflow.executor import FlowExecutor
+
+    # Antes de carregar os nós: uma avaliação grande passaria do MAX_REQUESTS_PER_DAY do protection_check
+    os.environ.setdefault("PROTECTION_ENABLED", "false")
+    if connections is None:
+        api_key = os.environ.get("AZURE_OPENAI_API_KEY")
+        api_base = os.environ.get("AZURE_OPENAI_ENDPOINT")
+        if not api_key or not api_base:
+            raise ValueError("Missing AZURE_OPENAI_API_KEY / AZURE_OPENAI_ENDPOINT (or use --endpoint).")
+        connections = {"aoai_connection": {"type": "AzureOpenAIConnection", "value": {
+            "api_key": api_key, "api_base": api_base, "api_type": "azure",
+            "api_version": os.environ.get("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
+        }}}
+    return FlowExecutor.create(
+        os.path.join(HERE, flow_file), connections, working_dir=HERE, node_override=node_override or {}
+    )
+
+
+def evaluate_line(runner, row: dict, index: int) -> dict:
+    inputs = {"user_query": row["user_query"], "session_id": f"eval-{index}", "user_tier": "default"}
+    start = time.perf_counter()
+    error = None
+    try:
+        output = runner.run(inputs) or {}
+    except Exception as e:
+        output, error = {}, str(e)
+    latency_ms = (time.perf_counter() - start) * 1000
+
+    prediction = output.get("prediction") or {}
+    usage = output.get("usage") or {}
+    intent = evaluate_intent(prediction.get("intent"), row["expected_intent"])
+    return {
+        "index": index,
+        "dataset": row["dataset"],
+        "user_query": row["user_query"],
+        "expected_intent": intent["expected"],
+        "predicted_intent": intent["actual"],
+        "intent_correct": intent["intent_accuracy"],
+        "expected_candidates": row["expected_candidates"],
+        "predicted_candidates": prediction.get("candidates") or [],
+        "candidate_correct": candidate_match(prediction.get("candidates"), row["expected_candidates"]),
+        "answer_coverage": answer_coverage(output.get("final_response"), row["expected_answer"]),
+        "route": output.get("route"),
+        "latency_ms": round(latency_ms, 1),
+        "total_tokens": usage.get("total_tokens", 0),
+        "cost_usd": usage.get("cost_usd", 0.0),
+        "llm_calls": usage.get("llm_calls", 0),
+        "stages": (output.get("trace") or {}).get("stages") or {},
+        "error": error
+    }
+
+
+def run_eval(runner, rows: list, concurrency: int = EVAL_CONCURRENCY) -> dict:
+    """Roda o dataset com no máximo `concurrency` linhas em paralelo; devolve o relatório."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        records = list(pool.map(lambda item: evaluate_line(runner, item[1], item[0]), enumerate(rows)))
+    return summarize(records, time.perf_counter() - start, concurrency)
+
+
+# --- Relatório ---
+
+def percentiles(values: list) -> dict:
+    """p50/p95/p99 por nearest-rank."""
+    values = sorted(values)
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    rank = lambda q: values[min(len(values) - 1, max(0, math.ceil(q / 100 * len(values)) - 1))]  # noqa: E731
+    return {"p50": round(rank(50), 1), "p95": round(rank(95), 1), "p99": round(rank(99), 1)}
+
+
+def _mean(values: list):
+    return round(sum(values) / len(values), 4) if values else None
+
+
+def summarize(records: list, wall_seconds: float, concurrency: int) -> dict:
+    ok = [r for r in records if not r["error"]]
+    coverage = [r["answer_coverage"] for r in ok if r["answer_coverage"] is not None]
+    stages = {}
+    for r in ok:
+        for stage, ms in r["stages"].items():
+            stages.setdefault(stage, []).append(ms)
+    total_tokens = sum(r["total_tokens"] for r in ok)
+    cost = sum(r["cost_usd"] for r in ok)
+    return {
+        "lines": len(records),
+        "errors": len(records) - len(ok),
+        "concurrency": concurrency,
+        "wall_seconds": round(wall_seconds, 2),
+        "throughput_lps": round(len(records) / wall_seconds, 2) if wall_seconds else 0.0,
+        "quality": {
+            # Linhas com erro contam como erradas
+            "intent_accuracy": _mean([r["intent_correct"] for r in records]),
+            "candidate_accuracy": _mean([r["candidate_correct"] if not r["error"] else 0.0 for r in records]),
+            "answer_coverage": _mean(coverage),
+            "answer_lines": len(coverage)
+        },
+        "usage": {
+            "total_tokens": total_tokens,
+            "cost_usd": round(cost, 6),
+            "tokens_per_line": round(total_tokens / len(ok), 1) if ok else 0.0,
+            "cost_per_line": round(cost / len(ok), 6) if ok else 0.0,
+            "llm_calls": sum(r["llm_calls"] for r in ok)
+        },
+        "latency_ms": {
+            "total": percentiles([r["latency_ms"] for r in ok]),
+            "stages": {stage: percentiles(values) for stage, values in sorted(stages.items())}
+        },
+        "routes": dict(Counter(r["route"] or "error" for r in records)),
+        "records": records
+    }
+
+
+def compare(report: dict, baseline: dict) -> list:
+    """[(métrica, baseline, atual, regrediu)] para erros, qualidade, latência total e custo."""
+    rows = [("errors", baseline["errors"], report["errors"], report["errors"] > baseline["errors"])]
+    for metric in QUALITY_METRICS:
+        before, after = baseline["quality"].get(metric), report["quality"].get(metric)
+        if before is None or after is None:
+            continue
+        rows.append((metric, before, after, after < before - EVAL_MAX_QUALITY_DROP - 1e-9))
+    for q in ("p50", "p95"):
+        before, after = baseline["latency_ms"]["total"][q], report["latency_ms"]["total"][q]
+        rows.append((f"latency_{q}_ms", before, after, after > before * (1 + EVAL_MAX_LATENCY_INCREASE)))
+    before, after = baseline["usage"]["cost_per_line"], report["usage"]["cost_per_line"]
+    rows.append(("cost_per_line", before, after, after > before * (1 + EVAL_MAX_COST_INCREASE) + 1e-12))
+    before, after = baseline["usage"]["tokens_per_line"], report["usage"]["tokens_per_line"]
+    rows.append(("tokens_per_line", before, after, after > before * (1 + EVAL_MAX_COST_INCREASE)))
+    return rows
+
+
+def changed_lines(report: dict, baseline: dict) -> list:
+    """Perguntas cuja intenção ou candidatos mudaram de certo para errado."""
+    before = {r["user_query"]: r for r in baseline.get("records", [])}
+    changed = []
+    for r in report["records"]:
+        old = before.get(r["user_query"])
+        if old and (old["intent_correct"] > r["intent_correct"] or old["candidate_correct"] > r["candidate_correct"]):
+            changed.append((r["user_query"], old["predicted_intent"], r["predicted_intent"]))
+    return changed
+
+
+def print_report(report: dict):
+    q, u = report["quality"], report["usage"]
+    print(f"📊 {report['lines']} linhas, {report['errors']} erros, concorrência {report['concurrency']}, "
+          f"{report['wall_seconds']}s ({report['throughput_lps']} linhas/s)")
+    coverage = f"{q['answer_coverage']:.1%} ({q['answer_lines']} linhas)" if q["answer_coverage"] is not None else "-"
+    print(f"   intent accuracy    {q['intent_accuracy']:.1%}")
+    print(f"   candidate accuracy {q['candidate_accuracy']:.1%}")
+    print(f"   answer coverage    {coverage}")
+    print(f"   tokens {u['total_tokens']} ({u['tokens_per_line']}/linha), custo ${u['cost_usd']:.6f} "
+          f"(${u['cost_per_line']:.6f}/linha), {u['llm_calls']} chamadas LLM")
+    print(f"   rotas {report['routes']}")
+    total = report["latency_ms"]["total"]
+    print(f"   {'latência (ms)':28} {'p50':>8} {'p95':>8} {'p99':>8}")
+    print(f"   {'total':28} {total['p50']:8.1f} {total['p95']:8.1f} {total['p99']:8.1f}")
+    for stage, p in sorted(report["latency_ms"]["stages"].items(), key=lambda item: -item[1]["p95"]):
+        print(f"   {stage:28} {p['p50']:8.1f} {p['p95']:8.1f} {p['p99']:8.1f}")
+    for r in report["records"]:
+        if r["error"]:
+            print(f"   ❌ {r['user_query'][:60]}: {r['error'][:120]}")
+
+
+def print_diff(report: dict, baseline: dict) -> bool:
+    """Imprime a comparação com o baseline; True se houve regressão."""
+    rows = compare(report, baseline)
+    print("\n🔍 Comparação com o baseline")
+    for metric, before, after, regressed in rows:
+        print(f"   {metric:20} {before:>12} -> {after:<12} {'❌ regressão' if regressed else '✅'}")
+    for query, old, new in changed_lines(report, baseline):
+        print(f"   ⚠️ {query[:60]}: {old} -> {new}")
+    return any(regressed for *_, regressed in rows)
+
+
+def parse_overrides(values: list) -> dict:
+    """--set no.input=valor -> node_override do FlowExecutor."""
+    overrides = {}
+    for value in values or []:
+        key, sep, raw = value.partition("=")
+        if not sep or "." not in key:
+            raise ValueError(f"Invalid --set (expected node.input=value): {value}")
+        overrides[key] = raw
+    return overrides
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Avaliação em lote do flow (qualidade, tokens, custo, latência).")
+    parser.add_argument("datasets", nargs="+", help="CSV(s) com user_query, expected_intent, expected_candidate[, expected_answer]")
+    parser.add_argument("--endpoint", help="URL do /score de um flow publicado (padrão: flow em processo)")
+    parser.add_argument("--api-key", default=os.getenv("PF_ENDPOINT_KEY"), help="Bearer do endpoint")
+    parser.add_argument("--concurrency", type=int, default=EVAL_CONCURRENCY)
+    parser.add_argument("--limit", type=int, help="Só as primeiras N linhas")
+    parser.add_argument("--set", action="append", dest="overrides", metavar="NODE.INPUT=VALUE",
+                        help="Troca um input de nó (flow em processo), ex.: intent_agent.deployment_name=gpt-4o")
+    parser.add_argument("--output", help="Grava o relatório JSON (use como baseline depois)")
+    parser.add_argument("--baseline", help="Relatório salvo para comparar; código 1 se houver regressão")
+    args = parser.parse_args()
+
+    rows = [row for path in args.datasets for row in load_dataset(path)][:args.limit]
+    if args.endpoint:
+        runner = EndpointRunner(args.endpoint, args.api_key)
+    else:
+        # O cache de respostas mascararia o flow em perguntas repetidas
+        os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+        runner = LocalRunner(create_local_executor(parse_overrides(args.overrides)))
+
+    report = run_eval(runner, rows, args.concurrency)
+    report["config"] = {"datasets": args.datasets, "endpoint": args.endpoint, "overrides": args.overrides or []}
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Relatório salvo em {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if print_diff(report, baseline):
+            sys.exit(1)
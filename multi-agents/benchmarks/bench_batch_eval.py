@@ -0,0 +1,89 @@
+"""
+Avaliação em lote (batch_eval.py) sobre o DAG real com o LLM stubado (flow_harness).
+
+- antes: uma pergunta por vez (como o evaluate_intent era usado), só intent accuracy
+- depois: dataset_refinamento.csv + test_dataset.csv com concorrência 1, 4 e 8:
+  qualidade (intenção, candidatos, cobertura da resposta), tokens/custo e
+  latência por etapa no mesmo relatório
+- gate: baseline salvo e uma "mudança de prompt" simulada (uma intenção errada,
+  resposta incompleta e policy_summarizer 3x mais lento) -> regressões detectadas
+
+O stub devolve a intenção e a resposta esperadas do dataset, então qualidade
+100% é o teto; a latência por nó do LLM é fixa (LATENCY_MS).
+
+Uso (a partir de multi-agents/):
+    python -m benchmarks.bench_batch_eval
+"""
+import io
+import os
+import time
+from contextlib import redirect_stdout
+
+# test_dataset.csv usa os candidatos de exemplo (Maria Silva, João Pereira)
+os.environ.setdefault("CANDIDATE_INCLUDE_MOCK", "true")
+
+from batch_eval import (  # noqa: E402
+    LocalRunner, compare, create_local_executor, load_dataset, print_diff, print_report, run_eval
+)
+from benchmarks.flow_harness import StubOpenAI, build_sample_index  # noqa: E402
+from eval_intent_accuracy import evaluate_intent  # noqa: E402
+
+DATASETS = ["dataset_refinamento.csv", "test_dataset.csv"]
+LATENCY_MS = {"intent_agent": 40, "policy_summarizer": 60, "fact_checker": 50,
+              "candidate_comparator": 50, "safety_neutrality_checker": 30, "embeddings": 10}
+
+
+def runner_for(stub):
+    return LocalRunner(create_local_executor({"rag_retriever.retrieval_backend": "local"}, stub.connections))
+
+
+def quiet_eval(runner, rows, concurrency):
+    with redirect_stdout(io.StringIO()):
+        return run_eval(runner, rows, concurrency)
+
+
+def main():
+    rows = [row for path in DATASETS for row in load_dataset(path)]
+    intents = {r["user_query"]: r["expected_intent"] for r in rows}
+    answers = {r["user_query"]: r["expected_answer"] for r in rows}
+    build_sample_index()
+    stub = StubOpenAI(intents=intents, answers=answers, latency_ms=LATENCY_MS)
+    runner = runner_for(stub)
+    print(f"{len(rows)} perguntas ({', '.join(DATASETS)})\n")
+
+    # Antes: uma linha por vez, só a intenção
+    start = time.perf_counter()
+    hits = 0
+    with redirect_stdout(io.StringIO()):
+        for i, row in enumerate(rows):
+            output = runner.run({"user_query": row["user_query"], "session_id": f"seq-{i}", "user_tier": "default"})
+            hits += evaluate_intent(output["prediction"]["intent"], row["expected_intent"])["intent_accuracy"]
+    sequential = time.perf_counter() - start
+    print(f"antes  (sequencial, só intenção): {sequential:5.2f}s  intent accuracy {hits / len(rows):.1%}")
+
+    for concurrency in (1, 4, 8):
+        report = quiet_eval(runner, rows, concurrency)
+        print(f"batch_eval concorrência {concurrency}:        {report['wall_seconds']:5.2f}s  "
+              f"({sequential / report['wall_seconds']:.1f}x)  p95 total {report['latency_ms']['total']['p95']} ms")
+
+    print()
+    baseline = quiet_eval(runner, rows, 4)
+    print_report(baseline)
+
+    # "Mudança de prompt": uma intenção errada, resposta incompleta, summarizer mais lento
+    changed = rows[3]["user_query"]
+    bad_stub = StubOpenAI(
+        intents={**intents, changed: "candidate_position_query"},
+        answers={**answers, rows[0]["user_query"]: answers[rows[0]["user_query"]].split(";")[0]},
+        latency_ms={**LATENCY_MS, "policy_summarizer": LATENCY_MS["policy_summarizer"] * 3}
+    )
+    candidate = quiet_eval(runner_for(bad_stub), rows, 4)
+    regressed = print_diff(candidate, baseline)
+    print(f"\ngate: {'falha (código 1)' if regressed else 'passa'}; "
+          f"{sum(r for *_, r in compare(candidate, baseline))} métricas regrediram")
+    same = quiet_eval(runner, rows, 4)
+    print(f"mesma configuração do baseline: {'falha' if any(r for *_, r in compare(same, baseline)) else 'passa'}")
+
+
+if __name__ == "__main__":
+    main()
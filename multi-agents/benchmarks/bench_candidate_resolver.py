@@ -0,0 +1,127 @@
+"""
+Acurácia e latência do candidate_resolver.
+
+Acurácia: coluna expected_candidate de test_dataset.csv e dataset_refinamento.csv,
+os exemplos do antigo prompt do intent_classifier, perguntas com prenome/sobrenome
+de outra pessoa ou palavra comum (falsos matches) e todos os apelidos de candidates.json.
+Latência: resolve() sobre as perguntas dos datasets.
+Também compara o tamanho do prompt do intent_agent com e sem a tabela de apelidos.
+
+Uso (a partir de multi-agents/):
+    python -m benchmarks.bench_candidate_resolver --iterations 20000
+    python -m benchmarks.bench_candidate_resolver --old-prompt /caminho/intent_classifier_antigo.jinja2
+"""
+import argparse
+import csv
+import json
+import os
+import statistics
+import time
+
+from candidate_resolver import CandidateResolver, CANDIDATES_FILE
+from text_utils import count_tokens
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASETS = ["test_dataset.csv", "dataset_refinamento.csv"]
+
+# Exemplos do prompt antigo (regras de nome que o LLM fazia)
+PROMPT_CASES = [
+    ("Carol Sponja quer saber sobre educação", ["Ana Carolina Sponza Braga"]),
+    ("Ciro vai fazer o que na saúde?", ["Cyro Garcia"]),
+    ("Qual candidato tem melhores ideias para transporte?", []),
+    ("Quem é melhor, Paes ou Tarcisio, na economia?", ["Eduardo da Costa Paes", "Tarcísio Motta de Carvalho"]),
+    ("Qual o resultado do jogo do Flamengo?", []),
+    ("O que o Ciro Gomes acha da segurança?", []),
+    ("Sponza Carol e a saúde", ["Ana Carolina Sponza Braga"]),
+    ("propostas do Tarcizio Mota", ["Tarcísio Motta de Carvalho"]),
+]
+
+# Prenome, sobrenome ou partido que não são o candidato (palavra comum, outra pessoa)
+FALSE_MATCH_CASES = [
+    ("Me ensine uma receita de pães caseiros", []),
+    ("Quem é o Eduardo Bolsonaro?", []),
+    ("O Eduardo Bolsonaro apoia qual candidato?", []),
+    ("Minha amiga Carol Silva quer saber de receitas", []),
+    ("quem é o eduardo bolsonaro", []),
+    ("O Marcelo Freixo já foi deputado?", []),
+    ("Qual a proposta do Eduardo para a saúde?", ["Eduardo da Costa Paes"]),
+    ("o candidato eduardo fala o que da saude", ["Eduardo da Costa Paes"]),
+    ("O que o PSOL propõe para a educação?", ["Tarcísio Motta de Carvalho"]),
+]
+
+
+def load_dataset(filename):
+    cases = []
+    with open(os.path.join(HERE, filename), encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        column = header.index("expected_candidate")
+        for row in reader:
+            if not row:
+                continue
+            # test_dataset.csv tem nomes separados por vírgula sem aspas (viram colunas extras)
+            expected = ",".join(row[column:])
+            cases.append((row[0], [n.strip() for n in expected.split(",") if n.strip()]))
+    return cases
+
+
+def alias_cases(path=CANDIDATES_FILE):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return [(alias, [c["name"]]) for c in data["candidates"]
+            for alias in c.get("aliases", []) + c.get("party_aliases", [])]
+
+
+def accuracy(resolver, cases):
+    misses = []
+    for query, expected in cases:
+        got = resolver.resolve(query)["candidate_names"]
+        if got != expected:
+            misses.append((query, expected, got))
+    return 1 - len(misses) / len(cases), misses
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--old-prompt", help="prompt antigo (com a tabela) para comparar tokens")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    resolver = CandidateResolver(include_mock=True)
+    print(f"índice: {len(resolver.aliases)} apelidos, {len(resolver.trigrams)} trigramas, montado em {1000 * (time.perf_counter() - t0):.2f}ms\n")
+
+    suites = [(name, load_dataset(name)) for name in DATASETS]
+    suites += [("exemplos do prompt", PROMPT_CASES), ("falsos matches", FALSE_MATCH_CASES),
+               ("apelidos (candidates.json)", alias_cases())]
+    for name, cases in suites:
+        score, misses = accuracy(resolver, cases)
+        print(f"{name:<28} {score:6.1%}  ({len(cases) - len(misses)}/{len(cases)})")
+        for query, expected, got in misses:
+            print(f"    ✗ {query!r}: esperado {expected}, obtido {got}")
+
+    queries = [q for _, cases in suites[:3] for q, _ in cases]
+    latencies = []
+    for i in range(args.iterations):
+        q = queries[i % len(queries)]
+        t = time.perf_counter()
+        resolver.resolve(q)
+        latencies.append(time.perf_counter() - t)
+    ordered = sorted(latencies)
+    print(
+        f"\nlatência resolve(): p50={1e6 * statistics.median(latencies):.1f}µs "
+        f"p95={1e6 * ordered[int(0.95 * (len(ordered) - 1))]:.1f}µs "
+        f"p99={1e6 * ordered[int(0.99 * (len(ordered) - 1))]:.1f}µs"
+    )
+
+    with open(os.path.join(HERE, "intent_classifier.jinja2"), encoding="utf-8") as f:
+        new_prompt = count_tokens(f.read())
+    line = f"prompt do intent_agent: {new_prompt} tokens (template, sem a lista renderizada)"
+    if args.old_prompt:
+        with open(args.old_prompt, encoding="utf-8") as f:
+            line += f" vs {count_tokens(f.read())} tokens antes"
+    print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Tempos por nó e caminho crítico das perguntas candidate_comparison, com o
+candidate_comparator em paralelo com o fact_checker (flow.dag.yaml atual) e em
+série (variante gerada com a antiga dependência do comparator na verification).
+
+Roda o DAG inteiro via benchmarks/flow_harness.py, com latência simulada por nó LLM
+(padrão: valores típicos do gpt-4o-mini para o tamanho de saída de cada agente).
+
+Uso (a partir de multi-agents/):
+    python -m benchmarks.bench_comparator_parallel --runs 5
+"""
+import argparse
+import os
+import statistics
+
+import yaml
+
+from benchmarks.flow_harness import (
+    HERE, StubOpenAI, build_sample_index, create_executor, critical_path, node_dependencies, run_line
+)
+
+SERIAL_FLOW = ".bench_serial.dag.yaml"
+
+QUERIES = [
+    "Compare Maria e João na saúde",
+    "Compare a visão do PSTU e do PCO sobre o transporte público.",
+    "Quem é melhor, Paes ou Tarcisio, na economia?",
+]
+
+NODE_LATENCY_MS = {
+    "intent_agent": 600,
+    "policy_summarizer": 1800,
+    "fact_checker": 1500,
+    "candidate_comparator": 1600,
+    "safety_neutrality_checker": 1700,
+    "embeddings": 80,
+}
+
+
+def write_serial_flow():
+    """flow.dag.yaml com o comparator (e o orchestrator) esperando a verification, como antes."""
+    with open(os.path.join(HERE, "flow.dag.yaml"), encoding="utf-8") as f:
+        flow = yaml.safe_load(f)
+    for node in flow["nodes"]:
+        if node["name"] in ("flow_orchestrator", "candidate_comparator"):
+            node["inputs"]["verification"] = "${fact_checker_parser.output.verification}"
+    with open(os.path.join(HERE, SERIAL_FLOW), "w", encoding="utf-8") as f:
+        yaml.safe_dump(flow, f, sort_keys=False, allow_unicode=True)
+
+
+def run(executor, deps, runs):
+    walls, paths, timings = [], [], {}
+    for _ in range(runs):
+        for query in QUERIES:
+            _, nodes = run_line(executor, query)
+            duration, path = critical_path(nodes, deps)
+            walls.append(duration)
+            paths.append(path)
+            timings = timings or nodes
+    return walls, paths[0], timings
+
+
+def print_timeline(nodes):
+    start = min(s for _, s, _ in nodes.values() if s)
+    for name, (status, s, e) in sorted(nodes.items(), key=lambda kv: kv[1][1] or start):
+        if status != "Completed":
+            continue
+        begin = (s - start).total_seconds() * 1000
+        end = (e - start).total_seconds() * 1000
+        print(f"  {name:28} {begin:7.0f} -> {end:7.0f} ms  ({end - begin:6.0f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3, help="repetições de cada pergunta")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplica as latências simuladas")
+    args = parser.parse_args()
+
+    latency = {node: ms * args.scale for node, ms in NODE_LATENCY_MS.items()}
+    stub = StubOpenAI(intents={q: "candidate_comparison" for q in QUERIES}, latency_ms=latency)
+    build_sample_index()
+
+    write_serial_flow()
+    try:
+        serial = run(create_executor(stub, flow_file=SERIAL_FLOW), node_dependencies(SERIAL_FLOW), args.runs)
+    finally:
+        os.remove(os.path.join(HERE, SERIAL_FLOW))
+    parallel = run(create_executor(stub), node_dependencies(), args.runs)
+
+    for label, (walls, path, nodes) in (("série (antes)", serial), ("paralelo", parallel)):
+        print(f"\n{label}: caminho crítico p50={statistics.median(walls):.0f} ms "
+              f"(min {min(walls):.0f}, max {max(walls):.0f}, n={len(walls)})")
+        print("  " + " -> ".join(n for n in path if nodes.get(n, ("",))[0] == "Completed"))
+        print_timeline(nodes)
+
+    before, after = statistics.median(serial[0]), statistics.median(parallel[0])
+    print(f"\ncandidate_comparison: {before:.0f} -> {after:.0f} ms ({100 * (before - after) / before:.0f}% menor)")
+
+
+if __name__ == "__main__":
+    main()
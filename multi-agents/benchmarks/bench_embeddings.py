@@ -0,0 +1,161 @@
+"""
+Microbenchmark do caminho de embedding do real_rag_retriever com HTTP stubado
+(servidor local que imita o endpoint de embeddings do Azure OpenAI).
+
+Compara:
+- legado: requests.post por chamada (conexão nova a cada pergunta)
+- pool: requests.Session compartilhada (keep-alive), sem cache
+- pool + cache: idem, com o cache de embeddings (perguntas repetidas/quase iguais)
+e o custo de construir um SearchClient por chamada vs. reaproveitar.
+
+Uso (a partir de multi-agents/):
+    python -m benchmarks.bench_embeddings --requests 300 --latency-ms 20 --handshake-ms 30
+"""
+import argparse
+import json
+import random
+import socket
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import real_rag_retriever
+from embedding_cache import EmbeddingCache
+from real_rag_retriever import embed_query, get_search_client
+
+# Variações de caixa/acentos/pontuação das mesmas perguntas (como chegam dos usuários)
+QUESTIONS = [
+    "Qual a proposta do Eduardo Paes para saúde?",
+    "qual a proposta do eduardo paes para saude",
+    "Qual a proposta do Eduardo Paes para saúde??",
+    "O que o Ramagem propõe para segurança pública?",
+    "o que o ramagem propoe para seguranca publica",
+    "Compare Tarcísio Motta e Eduardo Paes em educação",
+    "Quais as propostas de mobilidade do Marcelo Queiroz?",
+    "quais as propostas de mobilidade do marcelo queiroz?",
+]
+DIMENSIONS = 1536
+
+
+def make_handler(latency_ms, handshake_ms):
+    class EmbeddingsHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        disable_nagle_algorithm = True  # sem isso o delayed ACK domina a conexão reaproveitada
+
+        def setup(self):
+            # Custo de conexão nova (o stub não tem TLS; simula o handshake)
+            time.sleep(handshake_ms / 1000)
+            super().setup()
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(latency_ms / 1000)
+            rnd = random.Random(body["input"][0])
+            payload = json.dumps({
+                "data": [{"embedding": [rnd.random() for _ in range(DIMENSIONS)], "index": 0}]
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return EmbeddingsHandler
+
+
+def run_stub_server(latency_ms, handshake_ms):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency_ms, handshake_ms))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{port}"
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def report(label, latencies):
+    total = sum(latencies)
+    print(
+        f"{label:<22} n={len(latencies):<5} total={total:7.2f}s "
+        f"p50={1000 * statistics.median(latencies):8.3f}ms "
+        f"p95={1000 * percentile(latencies, 95):8.3f}ms"
+    )
+
+
+def legacy_embed(text, config):
+    # Comportamento antigo: requests.post solto, sem sessão nem cache
+    url = f"{config['api_base'].rstrip('/')}/openai/deployments/{config['deployment']}/embeddings?api-version={config['api_version']}"
+    r = requests.post(url, headers={"api-key": config["api_key"]}, json={"input": [text]}, timeout=30)
+    r.raise_for_status()
+    return r.json()["data"][0]["embedding"]
+
+
+def timed(fn, queries):
+    latencies = []
+    for q in queries:
+        t0 = time.perf_counter()
+        vector = fn(q)
+        latencies.append(time.perf_counter() - t0)
+        assert vector, "embedding vazio"
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="latência simulada do endpoint")
+    parser.add_argument("--handshake-ms", type=float, default=30.0, help="custo simulado de conexão nova (TCP+TLS)")
+    args = parser.parse_args()
+
+    server, base = run_stub_server(args.latency_ms, args.handshake_ms)
+    config = {"api_key": "bench", "api_base": base, "api_version": "2024-02-15-preview", "deployment": "text-embedding-3-small"}
+    queries = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.requests)]
+
+    print(
+        f"{args.requests} embeddings, latência {args.latency_ms}ms, handshake {args.handshake_ms}ms, "
+        f"{len(QUESTIONS)} variações de pergunta\n"
+    )
+
+    report("legado (post solto)", timed(lambda q: legacy_embed(q, config), queries))
+
+    real_rag_retriever.EMBEDDING_CACHE_ENABLED = False
+    report("sessão em pool", timed(lambda q: embed_query(q, config), queries))
+
+    real_rag_retriever.EMBEDDING_CACHE_ENABLED = True
+    real_rag_retriever.embedding_cache = cache = EmbeddingCache(db_path="")
+    report("pool + cache", timed(lambda q: embed_query(q, config), queries))
+    stats = cache.stats()
+    print(f"{'':<22} cache: {stats['entries']} entradas, hit rate {stats['hit_rate']:.1%}")
+
+    # Construção do SearchClient (sem rede): por chamada vs. reaproveitado
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents import SearchClient
+
+    n = min(args.requests, 200)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        SearchClient(endpoint="https://bench.search.windows.net", index_name="bench", credential=AzureKeyCredential("k"))
+    fresh = (time.perf_counter() - t0) / n
+    t0 = time.perf_counter()
+    for _ in range(n):
+        get_search_client("https://bench.search.windows.net", "bench", "k")
+    pooled = (time.perf_counter() - t0) / n
+    print(f"\nSearchClient: novo {1000 * fresh:.3f}ms/chamada, reaproveitado {1000 * pooled:.4f}ms/chamada")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Chamadas LLM por pergunta com e sem o fast path (pre_classifier + intent_router).
+
+Roda o flow.dag.yaml inteiro (benchmarks/flow_harness.py: Azure OpenAI stubado,
+intent_agent devolvendo a intenção esperada do dataset) sobre test_dataset.csv e
+dataset_refinamento.csv, e confere o pré-classificador local em perguntas extras
+(fora do tema e dentro do tema) para medir falsos positivos.
+
+Uso (a partir de multi-agents/):
+    python -m benchmarks.bench_fast_path
+"""
+import argparse
+import csv
+import os
+import statistics
+import time
+from collections import defaultdict
+
+from benchmarks.flow_harness import HERE, StubOpenAI, build_sample_index, create_executor, run_line
+import query_router
+from query_router import pre_classify
+from candidate_resolver import resolver
+
+DATASETS = ["test_dataset.csv", "dataset_refinamento.csv"]
+
+# Perguntas extras para o pré-classificador (intenção esperada pelo prompt do intent_agent)
+PROBES = [
+    ("Qual o resultado do jogo do Flamengo?", "out_of_scope"),
+    ("Qual a previsão do tempo para amanhã no Rio?", "out_of_scope"),
+    ("Me indica um filme de comédia", "out_of_scope"),
+    ("Qual o seu signo?", "out_of_scope"),
+    ("Oi, bom dia!", "out_of_scope"),
+    ("Obrigado!", "out_of_scope"),
+    ("O que o Ciro Gomes acha da segurança?", "out_of_scope"),
+    ("Qual candidato apoia o esporte nas escolas?", "topic_exploration"),
+    ("O Paes vai reformar o estádio do Maracanã para o futebol?", "candidate_position_query"),
+    ("Qual a proposta para a Receita municipal e impostos?", "topic_exploration"),
+    ("O que fazem contra alagamentos da chuva?", "topic_exploration"),
+    ("Quem vai cuidar das enchentes no Flamengo e em Botafogo?", "topic_exploration"),
+    ("Quem tem proposta de tarifa zero no ônibus?", "topic_exploration"),
+    ("Quando é o primeiro turno da eleição?", "general_election_info"),
+]
+
+
+def load_dataset(filename):
+    with open(os.path.join(HERE, filename), encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        column = header.index("expected_intent")
+        return [(row[0], row[column]) for row in reader if row]
+
+
+def run_mode(executor, stub, cases):
+    calls, latencies, routes = [], [], defaultdict(int)
+    for query, _ in cases:
+        stub.reset()
+        start = time.perf_counter()
+        output, _ = run_line(executor, query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        chat = stub.reset()
+        chat.pop("embeddings", None)
+        calls.append(sum(chat.values()))
+        answer = ((output or {}).get("final_response") or {}).get("answer", "")
+        routes["resposta pronta" if answer in {r["answer"] for r in query_router.CANNED_RESPONSES.values()} else "fluxo completo"] += 1
+    return calls, latencies, routes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=0, help="latência simulada por chamada ao stub")
+    args = parser.parse_args()
+
+    cases = [case for name in DATASETS for case in load_dataset(name)]
+    stub = StubOpenAI(intents=dict(cases + PROBES), latency_ms=args.latency_ms)
+    build_sample_index()
+
+    # Antes: sem pré-classificador e com o intent_router sempre mandando para o retrieval
+    query_router.FAST_PATH_ENABLED = False
+    baseline_executor = create_executor(stub, {"intent_router.intent": "baseline"})
+    baseline = run_mode(baseline_executor, stub, cases)
+    baseline_probes = run_mode(baseline_executor, stub, PROBES)
+    query_router.FAST_PATH_ENABLED = True
+    executor = create_executor(stub)
+    fast = run_mode(executor, stub, cases)
+    fast_probes = run_mode(executor, stub, PROBES)
+
+    for title, before, after in (
+        (f"{len(cases)} perguntas ({', '.join(DATASETS)})", baseline, fast),
+        (f"{len(PROBES)} perguntas extras (PROBES)", baseline_probes, fast_probes),
+    ):
+        print(f"\n{title}")
+        print(f"{'':24} {'LLM/pergunta':>12} {'total':>6} {'p50 ms':>8}   rotas")
+        for label, (calls, latencies, routes) in (("antes", before), ("fast path", after)):
+            print(f"{label:24} {statistics.mean(calls):12.2f} {sum(calls):6d} "
+                  f"{statistics.median(latencies):8.1f}   {dict(routes)}")
+
+    print("\nPor intenção esperada (antes -> fast path):")
+    by_intent = defaultdict(lambda: [[], []])
+    for (query, intent), before, after in zip(cases, baseline[0], fast[0]):
+        by_intent[intent][0].append(before)
+        by_intent[intent][1].append(after)
+    for intent, (before, after) in sorted(by_intent.items()):
+        print(f"  {intent:26} {statistics.mean(before):.2f} -> {statistics.mean(after):.2f}  (n={len(before)})")
+
+    print("\nPré-classificador local (sem LLM):")
+    false_positives = 0
+    for query, expected in cases + PROBES:
+        route = pre_classify(query, resolver.resolve(query)["candidate_names"])["route"]
+        if route != "llm" and expected != "out_of_scope":
+            false_positives += 1
+        if (query, expected) in PROBES or route != "llm":
+            print(f"  {route:13} {expected:26} {query}")
+    caught = sum(1 for q, e in cases + PROBES
+                 if e == "out_of_scope" and pre_classify(q, resolver.resolve(q)["candidate_names"])["route"] != "llm")
+    total_oos = sum(1 for _, e in cases + PROBES if e == "out_of_scope")
+    print(f"  fora do tema pegos sem LLM: {caught}/{total_oos} | falsos positivos: {false_positives}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark da ingestão (echo.py) sobre um diretório local de PDFs no lugar do blob.
+
+Compara o loop antigo (download + extração em série, tudo numa lista) com o
+pipeline concorrente, e mede a re-execução incremental (manifest) sem mudanças
+e com um PDF alterado. Sem embeddings nem upload: o destino só conta registros
+(e o tempo até o primeiro chunk, que chega com a primeira extração).
+
+Uso (a partir de multi-agents/):
+    python -m benchmarks.bench_ingest --pdfs 40 --pages 30
+    python -m benchmarks.bench_ingest --source-dir ./pdfs
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from echo import DirectorySource, extract_text_from_pdf, run_ingestion
+
+PARAGRAPH = (
+    "Proposta para a cidade: ampliar clinicas da familia, reformar escolas, "
+    "integrar BRT e metro, iluminar ruas e urbanizar comunidades."
+)
+
+
+def make_pdf(pages, seed):
+    """PDF mínimo (texto Helvetica) com `pages` páginas."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for p in range(pages):
+        lines = [f"PAGINA {p + 1} - documento {seed}"] + [PARAGRAPH] * 25
+        text = " T* ".join(f"({line}) Tj" for line in lines)
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text} ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {content_id} 0 R /Resources << /Font << /F1 3 0 R >> >> >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+class CountingSink:
+    def __init__(self):
+        self.records = 0
+        self.deleted = 0
+        self.first_record_s = None
+
+    def write(self, records):
+        t0 = time.perf_counter()
+        for _ in records:
+            if self.first_record_s is None:
+                # Streaming: o primeiro chunk chega com a primeira extração, não no fim
+                self.first_record_s = time.perf_counter() - t0
+            self.records += 1
+
+    def delete(self, ids):
+        self.deleted += len(ids)
+
+
+def legacy(source):
+    # Loop antigo do entrypoint: um PDF por vez, todas as páginas numa lista
+    results = []
+    for name, _ in source.list():
+        for p in extract_text_from_pdf(source.read(name)):
+            results.append({"candidate": name.split("-")[0], "page": p["page"], "content": p["text"]})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source-dir", help="diretório com PDFs reais (senão gera sintéticos)")
+    parser.add_argument("--pdfs", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--download-workers", type=int, default=8)
+    parser.add_argument("--extract-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-in-flight", type=int, default=0, help="janela de arquivos (0 = downloads + extrações)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source_dir = args.source_dir
+        if not source_dir:
+            source_dir = os.path.join(tmp, "pdfs")
+            os.makedirs(source_dir)
+            for i in range(args.pdfs):
+                with open(os.path.join(source_dir, f"candidato{i % 5}-plano{i}.pdf"), "wb") as f:
+                    f.write(make_pdf(args.pages, i))
+        source = DirectorySource(source_dir)
+        manifest = os.path.join(tmp, "manifest.json")
+        workers = {"download_workers": args.download_workers, "extract_workers": args.extract_workers,
+                   "max_in_flight": args.max_in_flight}
+        print(f"{sum(1 for _ in source.list())} PDFs em {source_dir} | {os.cpu_count()} CPUs\n")
+
+        t0 = time.perf_counter()
+        pages = len(legacy(source))
+        print(f"{'legado (serial)':<24} {time.perf_counter() - t0:7.2f}s  {pages} páginas")
+
+        for label in ("pipeline (1ª execução)", "pipeline (sem mudanças)"):
+            sink = CountingSink()
+            t0 = time.perf_counter()
+            stats = run_ingestion(source, sink, manifest_path=manifest, **workers)
+            first = f"  1º chunk em {sink.first_record_s:.2f}s" if sink.first_record_s is not None else ""
+            print(f"{label:<24} {time.perf_counter() - t0:7.2f}s  processados={stats['processed']} pulados={stats['skipped']} chunks={sink.records}{first}")
+
+        # Um PDF alterado
+        first = next(name for name, _ in source.list())
+        with open(os.path.join(source_dir, first), "ab") as f:
+            f.write(b"\n% alterado\n")
+        sink = CountingSink()
+        t0 = time.perf_counter()
+        stats = run_ingestion(source, sink, manifest_path=manifest, **workers)
+        print(f"{'pipeline (1 alterado)':<24} {time.perf_counter() - t0:7.2f}s  processados={stats['processed']} pulados={stats['skipped']} chunks={sink.records}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Corretude e throughput do parse_json (json_extractor) contra o parser antigo
+(cadeia de re.sub/str.replace + json.loads), sobre o corpus de saídas malformadas
+em benchmarks/malformed_outputs.jsonl.
+
+Também mede o modo stream: em que ponto do stream cada campo de topo fica
+disponível quando a saída chega em tokens de ~4 caracteres.
+
+Uso (a partir de multi-agents/):
+    python -m benchmarks.bench_json_extractor --iterations 200
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+from json_extractor import StreamingJSONExtractor, extract_json
+from parse_json import parse_json_output
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "malformed_outputs.jsonl")
+
+
+def legacy_parse(llm_output):
+    """parse_json_output antes do json_extractor (só o caminho de parse)."""
+    text = re.sub(r"```[a-zA-Z0-9]*", "", llm_output).strip()
+    text = text.replace("None", "null")
+    text = text.replace("True", "true").replace("False", "false")
+    text = re.sub(r"'([^']+)':", r'"\1":', text)
+    text = re.sub(r": '([^']+)'", r': "\1"', text)
+    text = text.replace("}\n{", "}, {")
+    try:
+        return json.loads(text)
+    except Exception as e:
+        return {"error": str(e), "raw_output": llm_output, "cleaned_text_attempt": text}
+
+
+def load_corpus():
+    with open(CORPUS, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def lookup(value, path):
+    for part in path.split("."):
+        if isinstance(value, list):
+            if not part.isdigit() or int(part) >= len(value):
+                return KeyError
+            value = value[int(part)]
+        elif isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return KeyError
+    return value
+
+
+def check(parsed, expect):
+    """Campos esperados que saíram diferentes."""
+    return [path for path, expected in expect.items() if lookup(parsed, path) != expected]
+
+
+def throughput(fn, texts, iterations):
+    size = sum(len(t.encode("utf-8")) for t in texts) * iterations
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for t in texts:
+            fn(t)
+    elapsed = time.perf_counter() - start
+    return size / elapsed / 1e6, elapsed / (iterations * len(texts)) * 1e6
+
+
+def stream_positions(text, token_chars=4):
+    """Fração do stream consumida quando cada campo de topo ficou completo."""
+    positions = {}
+    consumed = [0]
+
+    def on_value(path, value):
+        if len(path) == 1 and path[0] not in positions:
+            positions[path[0]] = consumed[0] / len(text)
+
+    extractor = StreamingJSONExtractor(on_value=on_value)
+    for i in range(0, len(text), token_chars):
+        consumed[0] = min(len(text), i + token_chars)
+        extractor.feed(text[i:i + token_chars])
+    extractor.close()
+    return positions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    print(f"corpus: {len(corpus)} saídas ({CORPUS})\n")
+    print(f"{'caso':34} {'antigo':>8} {'novo':>8}  ajustes")
+    ok_legacy = ok_new = 0
+    for case in corpus:
+        legacy = legacy_parse(case["raw"])
+        new = parse_json_output(case["raw"])
+        legacy_ok = "error" not in legacy and not check(legacy, case["expect"])
+        new_ok = not check(new, case["expect"])
+        ok_legacy += legacy_ok
+        ok_new += new_ok
+        _, repairs = extract_json(case["raw"])
+        print(f"{case['name']:34} {'ok' if legacy_ok else 'FALHA':>8} {'ok' if new_ok else 'FALHA':>8}  {', '.join(repairs)}")
+        if not new_ok:
+            print(f"    campos errados: {check(new, case['expect'])}")
+    print(f"\ncorretos: antigo {ok_legacy}/{len(corpus)} | novo {ok_new}/{len(corpus)}")
+
+    failed_legacy = [legacy_parse(c["raw"]) for c in corpus]
+    payload = sum(len(json.dumps(p, ensure_ascii=False)) for p in failed_legacy if "error" in p)
+    print(f"texto bruto/limpo copiado na saída do parser antigo (falhas): {payload / 1024:.1f} KB")
+
+    texts = [c["raw"] for c in corpus]
+    valid = [c["raw"] for c in corpus if c["name"] == "valid_json"] * 10
+    print(f"\nthroughput ({args.iterations} iterações):")
+    for label, fn, data in (
+        ("antigo, corpus", legacy_parse, texts),
+        ("novo, corpus", extract_json, texts),
+        ("json.loads, JSON válido", json.loads, valid),
+        ("novo, JSON válido", extract_json, valid),
+        ("novo sem caminho rápido", lambda t: StreamingJSONExtractor().feed(t), valid),
+    ):
+        mb_s, us = throughput(fn, data, args.iterations)
+        print(f"  {label:26} {mb_s:7.1f} MB/s  {us:8.1f} µs/saída")
+
+    print("\nstream (tokens de 4 caracteres): fração do stream lida quando o campo fica completo")
+    for case in corpus:
+        if case["name"] in ("valid_json", "summarizer_invalid_escape_real", "safety_literals_inside_text"):
+            positions = stream_positions(case["raw"])
+            fields = ", ".join(f"{k}={v:.0%}" for k, v in positions.items())
+            print(f"  {case['name']:34} {fields}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark do índice local: latência de busca exata, IVF, BM25 e híbrida,
+e recall@k do IVF em relação à busca exata. Corpus sintético (sem rede).
+
+Uso (a partir de multi-agents/):
+    python -m benchmarks.bench_local_index --chunks 5000 --dim 1536
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from local_index import LocalIndex, build_index
+
+CANDIDATES = ["Eduardo Paes", "Alexandre Ramagem", "Tarcísio Motta", "Marcelo Queiroz", "Rodrigo Amorim"]
+TOPICS = {
+    "saúde": "hospitais clínicas da família atendimento médicos UPA vacinação",
+    "educação": "escolas professores creches ensino integral alfabetização",
+    "segurança": "guarda municipal policiamento câmeras iluminação violência",
+    "mobilidade": "BRT ônibus metrô ciclovias trânsito tarifa",
+    "habitação": "moradia favelas urbanização aluguel social regularização",
+}
+
+
+def synthetic_corpus(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    # Um "centro" por (candidato, tema): chunks do mesmo assunto ficam próximos
+    centers = {
+        (c, t): rng.standard_normal(dim).astype(np.float32)
+        for c in CANDIDATES for t in TOPICS
+    }
+    keys = list(centers)
+    records = []
+    for i in range(n):
+        candidate, topic = keys[i % len(keys)]
+        vector = centers[(candidate, topic)] + 0.8 * rng.standard_normal(dim).astype(np.float32)
+        words = TOPICS[topic].split()
+        random.Random(i).shuffle(words)
+        records.append({
+            "id": str(i),
+            "content": f"{candidate} propõe para {topic}: {' '.join(words)}. Trecho {i}.",
+            "title": f"{candidate.split()[0]}-plano.pdf",
+            "url": None,
+            "candidate": candidate,
+            "page_number": 1 + i % 40,
+            "contentVector": vector.tolist(),
+        })
+    return records, centers
+
+
+def timed(fn, queries):
+    latencies = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def report(label, latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * (len(ordered) - 1)))]
+    print(f"{label:<18} p50={1000 * statistics.median(latencies):8.3f}ms p95={1000 * p95:8.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    records, centers = synthetic_corpus(args.chunks, args.dim)
+    rng = np.random.default_rng(1)
+    keys = list(centers)
+    queries = []
+    for i in range(args.queries):
+        candidate, topic = keys[i % len(keys)]
+        vector = centers[(candidate, topic)] + 0.8 * rng.standard_normal(args.dim).astype(np.float32)
+        queries.append((f"Qual a proposta de {candidate} para {topic}?", vector))
+
+    with tempfile.TemporaryDirectory() as path:
+        t0 = time.perf_counter()
+        build_index(records, path)
+        build_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        index = LocalIndex(path)
+        load_s = time.perf_counter() - t0
+        print(f"{len(index)} chunks x {args.dim} dims | build {build_s:.2f}s | load {1000 * load_s:.1f}ms\n")
+
+        k = args.k
+        report("exata", timed(lambda q: index.search_vector(q[1], k, approximate=False), queries))
+        report(f"IVF nprobe={args.nprobe}", timed(lambda q: index.search_vector(q[1], k, approximate=True, nprobe=args.nprobe), queries))
+        report("BM25", timed(lambda q: index.search_bm25(q[0], k), queries))
+        report("híbrida (exata)", timed(lambda q: index.search(q[0], q[1], k, approximate=False), queries))
+
+        recall = []
+        for _, vector in queries:
+            exact = set(index.search_vector(vector, k, approximate=False)[0].tolist())
+            approx = set(index.search_vector(vector, k, approximate=True, nprobe=args.nprobe)[0].tolist())
+            recall.append(len(exact & approx) / k)
+        print(f"\nrecall@{k} do IVF vs. exata: {statistics.mean(recall):.3f}")
+
+
+if __name__ == "__main__":
+    main()
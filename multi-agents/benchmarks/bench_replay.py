@@ -0,0 +1,154 @@
+"""
+Record/replay (llm_replay.py) sobre o DAG real, com retrieval_backend=azure.
+
+- record: o flow fala com o ReplayServer em modo record, que repassa para um
+  "Azure" (o StubOpenAI do flow_harness, com latência por nó, fazendo também o
+  papel do Azure AI Search) e grava as fixtures por nó
+- replay sem latência, com o upstream desligado: zero misses, saídas idênticas
+  à gravação em todas as rodadas (determinismo) e o overhead puro do flow:
+  parsers, roteamento, formatação do retrieval, finalize, e o cliente HTTP/SDK
+- replay com a latência gravada: tempo de linha próximo ao da gravação
+
+--record-only grava o fixture store (--store) e sai; o benchmark do backend
+(backend/benchmarks/bench_replay.py) usa isso para servir o /score em replay.
+
+Uso (a partir de multi-agents/):
+    python -m benchmarks.bench_replay [--rounds 5]
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+from benchmarks.flow_harness import StubOpenAI, build_sample_index, create_executor, run_line
+from batch_eval import load_dataset
+from llm_replay import FixtureStore, ReplayServer
+
+DATASETS = ["dataset_refinamento.csv", "test_dataset.csv"]
+# Latência do "Azure" durante a gravação
+UPSTREAM_LATENCY_MS = {"intent_agent": 120, "policy_summarizer": 250, "fact_checker": 200,
+                       "candidate_comparator": 200, "safety_neutrality_checker": 150,
+                       "embeddings": 40, "search": 60}
+
+PARSERS = ("intent_agent_parser", "policy_summarizer_parser", "fact_checker_parser",
+           "candidate_comparator_parser", "safety_parser")
+ROUTING = ("protection_check", "answer_cache_lookup", "resolve_candidates", "pre_classifier", "intent_router",
+           "semantic_cache_lookup", "flow_orchestrator")
+CLIENT = ("intent_agent", "policy_summarizer", "fact_checker", "candidate_comparator",
+          "safety_neutrality_checker", "embedding", "search")
+
+
+def point_flow_at(server):
+    """O rag_retriever lê o Azure AI Search das variáveis de ambiente a cada chamada."""
+    os.environ["AZURE_SEARCH_ENDPOINT"] = server.url
+    os.environ["AZURE_SEARCH_KEY"] = "replay"
+
+
+def run_all(executor, queries):
+    outputs, walls = {}, []
+    with redirect_stdout(io.StringIO()):
+        for i, query in enumerate(queries):
+            start = time.perf_counter()
+            output, _ = run_line(executor, query, session_id=f"replay-{i}")
+            walls.append((time.perf_counter() - start) * 1000)
+            outputs[query] = output
+    return outputs, walls
+
+
+def comparable(output):
+    """Saída sem o que muda a cada execução (trace_id, durações, latências)."""
+    usage = {k: v for k, v in (output.get("usage") or {}).items() if k != "nodes"}
+    return json.dumps([output.get("final_response"), output.get("prediction"), output.get("route"), usage],
+                      sort_keys=True, ensure_ascii=False)
+
+
+def breakdown(outputs, walls):
+    """
+    ms por linha (média) em cada categoria, a partir de trace.stages. O resto da
+    linha (agendamento dos nós e run tracking do Prompt Flow, finalize_response)
+    é aproximado: os ramos paralelos do DAG se sobrepõem.
+    """
+    totals = {"parsers": 0.0, "roteamento": 0.0, "formatação do retrieval": 0.0, "context_budgeter": 0.0,
+              "cliente LLM/embedding/busca": 0.0}
+    for output in outputs.values():
+        stages = output["trace"]["stages"]
+        totals["parsers"] += sum(stages.get(n, 0) for n in PARSERS)
+        totals["roteamento"] += sum(stages.get(n, 0) for n in ROUTING)
+        totals["formatação do retrieval"] += max(
+            0.0, stages.get("rag_retriever", 0) - stages.get("embedding", 0) - stages.get("search", 0))
+        totals["context_budgeter"] += stages.get("context_budgeter", 0)
+        totals["cliente LLM/embedding/busca"] += sum(stages.get(n, 0) for n in CLIENT)
+    totals = {name: ms / len(outputs) for name, ms in totals.items()}
+    totals["Prompt Flow (resto, aprox.)"] = max(0.0, statistics.mean(walls) - sum(totals.values()))
+    return totals
+
+
+def record(store_path, queries):
+    intents = {r["user_query"]: r["expected_intent"] for r in load_dataset_rows()}
+    upstream = StubOpenAI(intents=intents, latency_ms=UPSTREAM_LATENCY_MS)
+    recorder = ReplayServer(FixtureStore(store_path), "record", openai_upstream=upstream.url,
+                            search_upstream=upstream.url)
+    point_flow_at(recorder)
+    executor = create_executor(recorder, {"rag_retriever.retrieval_backend": "azure"})
+    outputs, walls = run_all(executor, queries)
+    recorder.close()
+    upstream.server.shutdown()
+    return recorder, outputs, walls
+
+
+def load_dataset_rows():
+    return [row for path in DATASETS for row in load_dataset(path)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--store", help="Diretório do fixture store (padrão: temporário)")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--record-only", action="store_true")
+    args = parser.parse_args()
+
+    store_path = args.store or tempfile.mkdtemp(prefix="replay_fixtures_")
+    queries = [row["user_query"] for row in load_dataset_rows()]
+    build_sample_index()
+
+    recorder, recorded, record_walls = record(store_path, queries)
+    print(f"record: {len(queries)} perguntas, {sum(recorder.recorded.values())} respostas gravadas em {store_path}")
+    print(f"  por nó: {dict(sorted(recorder.store.stats().items()))}")
+    print(f"  linha p50 {statistics.median(record_walls):.1f} ms (upstream com latência)")
+    if args.record_only:
+        return
+
+    # Replay com o upstream desligado: qualquer miss seria uma chamada de rede
+    replay = ReplayServer(FixtureStore(store_path), "replay", latency="none")
+    point_flow_at(replay)
+    executor = create_executor(replay, {"rag_retriever.retrieval_backend": "azure"})
+    walls, identical, outputs, round_walls = [], 0, {}, []
+    for _ in range(args.rounds):
+        outputs, round_walls = run_all(executor, queries)
+        walls.extend(round_walls)
+        identical += sum(comparable(outputs[q]) == comparable(recorded[q]) for q in queries)
+    stats = replay.stats()
+    print(f"\nreplay sem latência: {args.rounds} rodadas x {len(queries)} perguntas, "
+          f"{sum(stats['hits'].values())} hits, {sum(stats['misses'].values())} misses")
+    print(f"  saídas idênticas à gravação: {identical}/{args.rounds * len(queries)}")
+    print(f"  linha p50 {statistics.median(walls):.1f} ms, p95 {sorted(walls)[int(0.95 * (len(walls) - 1))]:.1f} ms "
+          f"(gravação: {statistics.median(record_walls):.1f} ms)")
+    print("  overhead do flow por linha (média, última rodada):")
+    for name, ms in breakdown(outputs, round_walls).items():
+        print(f"    {name:30} {ms:7.2f} ms")
+    replay.close()
+
+    slow = ReplayServer(FixtureStore(store_path), "replay", latency="recorded")
+    point_flow_at(slow)
+    _, slow_walls = run_all(create_executor(slow, {"rag_retriever.retrieval_backend": "azure"}), queries)
+    print(f"\nreplay com a latência gravada: linha p50 {statistics.median(slow_walls):.1f} ms "
+          f"(gravação: {statistics.median(record_walls):.1f} ms)")
+    slow.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Taxa de falha de parse e tokens desperdiçados, antes e depois do
+response_format json_object + validação de schema (agent_schemas.py).
+
+Sobre benchmarks/malformed_outputs.jsonl (cada saída tem o schema do agente que a gerou):
+- antes: response_format text + parser antigo (regex + json.loads)
+- text + json_extractor: o parser tolerante sem schema (user-017)
+- json_object + schema: a API só devolve JSON sintaticamente válido, então cada
+  saída não truncada é re-serializada com o conteúdo que o modelo quis dizer
+  (estimativa); truncamento por max_tokens e erros de schema continuam possíveis.
+  A medição real sai dos contadores do simple_protection (parse_failure_rate_today,
+  parse_tokens_wasted_today no simple_cost_track).
+
+Também roda o DAG (flow_harness) e confere o response_format que cada nó LLM pede.
+
+Uso (a partir de multi-agents/):
+    python -m benchmarks.bench_schema_parsing
+"""
+import io
+import json
+from contextlib import redirect_stdout
+
+from agent_schemas import validate
+from benchmarks.bench_json_extractor import legacy_parse, load_corpus
+from benchmarks.flow_harness import StubOpenAI, build_sample_index, create_executor, run_line
+from json_extractor import extract_json
+from parse_json import parse_json_output
+from text_utils import count_tokens
+
+
+def as_json_object(raw):
+    """O que o modo json_object devolveria para a mesma saída (truncada continua truncada)."""
+    value, repairs = extract_json(raw)
+    if "truncated" in repairs or value is None:
+        return raw
+    return json.dumps(value, ensure_ascii=False)
+
+
+def unusable(parsed, schema_name):
+    """Saída que os nós seguintes não conseguem usar: erro de parse ou fora do schema."""
+    return not isinstance(parsed, dict) or "error" in parsed or bool(validate(parsed, schema_name))
+
+
+def run(label, corpus, failed):
+    failures, wasted = [], 0
+    for case in corpus:
+        if failed(case):
+            failures.append(case["name"])
+            wasted += count_tokens(case["raw"])
+    rate = len(failures) / len(corpus)
+    print(f"{label:28} falhas {len(failures):2d}/{len(corpus)} ({rate:5.1%})  tokens desperdiçados {wasted:6d}")
+    return failures
+
+
+def main():
+    corpus = load_corpus()
+    print(f"{len(corpus)} saídas de agentes (benchmarks/malformed_outputs.jsonl)")
+    print("falha = erro de parse ou saída fora do schema do agente\n")
+
+    run("antes (text + regex)", corpus,
+        lambda c: unusable(legacy_parse(c["raw"]), c["schema"]))
+    run("text + json_extractor", corpus,
+        lambda c: "truncated" in extract_json(c["raw"])[1] or unusable(extract_json(c["raw"])[0], c["schema"]))
+    with redirect_stdout(io.StringIO()):
+        after = [c for c in corpus if "error" in parse_json_output(as_json_object(c["raw"]), c["schema"])]
+    run("json_object + schema", corpus, lambda c: c in after)
+
+    print("\nfalhas restantes (json_object + schema):")
+    for case in after:
+        with redirect_stdout(io.StringIO()):
+            result = parse_json_output(as_json_object(case["raw"]), case["schema"])
+        print(f"  {case['name']:34} {result['error']:18} {result.get('schema_errors', [])[:1]}")
+
+    stub = StubOpenAI(intents={"Compare Maria e João na saúde": "candidate_comparison"})
+    build_sample_index()
+    output, nodes = run_line(create_executor(stub), "Compare Maria e João na saúde")
+    print("\nresponse_format pedido por nó (DAG via flow_harness):")
+    for node, fmt in sorted(stub.response_formats.items()):
+        print(f"  {node:28} {fmt}")
+    errors = {n: s for n, (s, _, _) in nodes.items() if s != "Completed" and s != "Bypassed"}
+    print(f"  resposta final: {output['final_response']} | nós com erro: {errors or 'nenhum'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Tracing dos nós do flow: um trace por requisição, continuando o traceparent do backend.
+
+Roda o DAG (flow_harness, LLM stubado com latência por nó) com TRACE_EXPORTER=memory:
+- com traceparent: todos os spans (nós Python, nós LLM, embedding, busca) no
+  trace do backend; árvore de spans e `trace.stages` da saída do flow
+- sem traceparent (chamada direta ao flow): ainda um único trace por requisição
+- custo: spans por linha x µs por span, comparado à duração da linha
+
+Uso (a partir de multi-agents/):
+    python -m benchmarks.bench_tracing
+"""
+import io
+import os
+import statistics
+import time
+from contextlib import redirect_stdout
+
+# Antes de importar os módulos do flow
+os.environ.setdefault("TRACE_EXPORTER", "memory")
+
+from benchmarks.flow_harness import StubOpenAI, build_sample_index, create_executor, run_line  # noqa: E402
+from telemetry import FlowTelemetry, telemetry  # noqa: E402
+
+TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+QUERY = "Compare Maria e João na saúde"
+LATENCY_MS = {"intent_agent": 40, "policy_summarizer": 60, "fact_checker": 50,
+              "candidate_comparator": 50, "safety_neutrality_checker": 30, "embeddings": 10}
+
+
+def print_tree(spans, trace_id):
+    spans = sorted((s for s in spans if s["trace_id"] == trace_id), key=lambda s: s["start_time_unix_nano"])
+    ids = {s["span_id"] for s in spans}
+    children = {}
+    for s in spans:
+        parent = s["parent_span_id"] if s["parent_span_id"] in ids else None
+        children.setdefault(parent, []).append(s)
+
+    def show(parent, depth):
+        for s in children.get(parent, []):
+            tokens = s["attributes"].get("gen_ai.usage.input_tokens")
+            extra = f"  {tokens} tokens de prompt" if tokens is not None else ""
+            print(f"  {'  ' * depth}{s['name']:{34 - 2 * depth}} {s['kind']:8} {s['duration_ms']:7.1f} ms{extra}")
+            show(s["span_id"], depth + 1)
+
+    show(None, 0)
+
+
+def span_cost(n=20000):
+    """µs por span de nó fora do Prompt Flow (sem contexto de requisição)."""
+    bench = FlowTelemetry(processor=None)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with bench.span("node"):
+            pass
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main():
+    stub = StubOpenAI(intents={QUERY: "candidate_comparison"}, latency_ms=LATENCY_MS)
+    build_sample_index()
+    executor = create_executor(stub)
+    exported = telemetry.processor.span_exporter.spans
+
+    with redirect_stdout(io.StringIO()):
+        output, _ = run_line(executor, QUERY, traceparent=TRACEPARENT)
+    trace_id = TRACEPARENT.split("-")[1]
+    traces = {s["trace_id"] for s in exported}
+    print(f"com traceparent: {len(exported)} spans, trace_ids {sorted(traces)}")
+    print(f"  trace_id na saída do flow: {output['trace']['trace_id']}")
+    print(f"  pai dos spans de topo: {TRACEPARENT.split('-')[2]} (span prompt_flow do backend)\n")
+    print_tree(exported, trace_id)
+
+    print("\ntrace.stages (vai para o /internal/latency do backend como flow.<etapa>):")
+    for stage, ms in sorted(output["trace"]["stages"].items(), key=lambda item: -item[1])[:8]:
+        print(f"  {stage:28} {ms:7.1f} ms")
+
+    exported.clear()
+    with redirect_stdout(io.StringIO()):
+        output, _ = run_line(executor, QUERY)
+    traces = {s["trace_id"] for s in exported}
+    print(f"\nsem traceparent: {len(exported)} spans em {len(traces)} trace(s) "
+          f"(trace_id da saída {'confere' if traces == {output['trace']['trace_id']} else 'DIFERENTE'})")
+
+    durations = []
+    for _ in range(5):
+        exported.clear()
+        t0 = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            run_line(executor, QUERY, traceparent=TRACEPARENT)
+        durations.append((time.perf_counter() - t0) * 1000)
+    per_span = span_cost()
+    print(f"\nlinha do DAG: mediana {statistics.median(durations):.1f} ms; "
+          f"{len(exported)} spans x {per_span:.1f} µs = {len(exported) * per_span / 1000:.2f} ms de tracing")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Tokens e custo reais por nó (usage_tracker) contra a estimativa antiga do
+simple_cost_track (finalize_response passava total_tokens=0; com tokens, o
+custo saía de um avg_cost_per_1k fixo de 0.006).
+
+Roda o flow.dag.yaml (flow_harness: Azure OpenAI stubado que devolve `usage`
+com tokens aproximados pelo text_utils) sobre os datasets, com latência
+simulada por nó, e mostra:
+- qual agente domina custo e latência (agregado do dia)
+- a estimativa antiga vs. o custo pela tabela de preços (prices.json)
+- que o orçamento do SimpleProtection recebeu o custo real
+- agregados por sessão e o custo de registrar uma chamada
+
+Uso (a partir de multi-agents/):
+    python -m benchmarks.bench_usage_accounting
+"""
+import argparse
+import time
+
+from benchmarks.bench_fast_path import DATASETS, load_dataset
+from benchmarks.flow_harness import StubOpenAI, build_sample_index, create_executor, run_line
+import simple_protection
+from usage_tracker import usage_tracker
+
+# Latência simulada por chamada (ms), na ordem de grandeza do gpt-4o-mini com max_tokens do DAG
+LATENCY_MS = {
+    "intent_agent": 400, "policy_summarizer": 1500, "fact_checker": 1200,
+    "candidate_comparator": 1400, "safety_neutrality_checker": 900, "embeddings": 80,
+}
+SESSIONS = 5
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-scale", type=float, default=0.05,
+                        help="fração de LATENCY_MS aplicada no stub (1 = latência real)")
+    parser.add_argument("--limit", type=int, default=0, help="máx. de perguntas (0 = todas)")
+    args = parser.parse_args()
+
+    cases = [case for name in DATASETS for case in load_dataset(name)]
+    if args.limit:
+        cases = cases[:args.limit]
+    latency = {node: ms * args.latency_scale for node, ms in LATENCY_MS.items()}
+    stub = StubOpenAI(intents=dict(cases), latency_ms=latency)
+    build_sample_index()
+    executor = create_executor(stub, {"semantic_cache_lookup.use_embeddings": True})
+
+    cost_before = simple_protection._protection.total_cost_today
+    for i, (query, _) in enumerate(cases):
+        run_line(executor, query, session_id=f"session_{i % SESSIONS}")
+    records = usage_tracker.sink.records
+
+    total_tokens = sum(r["total_tokens"] for r in records)
+    actual = sum(r["cost_usd"] for r in records)
+    print(f"{len(cases)} perguntas, {len(records)} registros no sink, "
+          f"{sum(r['llm_calls'] for r in records)} chamadas LLM/embedding, {total_tokens} tokens\n")
+
+    print("custo do dia:")
+    print(f"  antes (finalize_response: total_tokens=0)      ${0.0:10.6f}")
+    print(f"  antes com tokens reais × 0.006/1k fixo          ${total_tokens / 1000 * 0.006:10.6f}")
+    print(f"  tabela de preços por deployment (prices.json)   ${actual:10.6f}")
+    budget = simple_protection._protection.total_cost_today - cost_before
+    print(f"  lançado no orçamento do SimpleProtection        ${budget:10.6f}")
+
+    stats = usage_tracker.stats()
+    print("\npor nó (agregado do dia, ordenado por custo):")
+    print(f"  {'nó':28} {'chamadas':>8} {'tokens':>8} {'custo US$':>11} {'% custo':>8} {'ms/chamada':>11}")
+    for node, n in stats["nodes"].items():
+        share = n["cost_usd"] / stats["totals"]["cost_usd"] if stats["totals"]["cost_usd"] else 0
+        print(f"  {node:28} {n['calls']:8d} {n['total_tokens']:8d} {n['cost_usd']:11.6f} "
+              f"{share:8.1%} {n['latency_ms_avg']:11.1f}")
+
+    print("\npor rota:")
+    routes = {}
+    for r in records:
+        route = routes.setdefault(r["route"], [0, 0, 0.0])
+        route[0] += 1
+        route[1] += r["total_tokens"]
+        route[2] += r["cost_usd"]
+    for route, (n, tokens, cost) in sorted(routes.items(), key=lambda item: -item[1][2]):
+        print(f"  {str(route):26} {n:4d} req  {tokens / n:8.0f} tokens/req  ${cost / n:.6f}/req")
+
+    print("\npor sessão:")
+    for i in range(SESSIONS):
+        session = usage_tracker.session_usage(f"session_{i}")
+        print(f"  session_{i}  {session['requests']:3d} req  {session['total_tokens']:6d} tokens  ${session['cost_usd']:.6f}")
+
+    print("\nexemplo de registro (sink):")
+    example = max(records, key=lambda r: r["llm_calls"])
+    print(f"  { {k: v for k, v in example.items() if k != 'nodes'} }")
+    for node, n in example["nodes"].items():
+        print(f"    {node:28} {n}")
+
+    n = 20000
+    start = time.perf_counter()
+    for _ in range(n):
+        usage_tracker.record_usage("gpt-4o-mini", 500, 120, 10.0, request_id="overhead", node="bench")
+    elapsed = time.perf_counter() - start
+    usage_tracker.close_request(request_id="overhead")
+    print(f"\ncusto de record_usage(): {elapsed / n * 1e6:.1f} µs/chamada")
+
+
+if __name__ == "__main__":
+    main()
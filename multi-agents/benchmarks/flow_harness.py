@@ -0,0 +1,265 @@
+"""
+Executa o flow.dag.yaml de verdade (FlowExecutor do Prompt Flow) contra um
+Azure OpenAI stubado e um índice local pequeno, sem rede nem credenciais.
+
+O stub identifica o nó pelo system prompt (llm_replay.node_for_messages), conta
+as chamadas de chat, de embeddings e de busca (Azure AI Search sobre o índice
+local) e devolve JSON plausível para cada agente. O intent_agent devolve a
+intenção esperada do dataset (intents={pergunta: intenção}), para medir o
+roteamento e não a qualidade do classificador.
+
+Usado pelos benchmarks que precisam do DAG inteiro (bench_fast_path, ...).
+"""
+import json
+import os
+import random
+import re
+import socket
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIMENSIONS = 16
+
+# Antes de importar os módulos do flow: o benchmark não deve bater no cache nem no índice real
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "memory")
+os.environ.setdefault("PROTECTION_ENABLED", "false")
+os.environ.setdefault("USAGE_SINK", "memory")
+os.environ.setdefault("APPLICATIONINSIGHTS_STATSBEAT_DISABLED_ALL", "true")
+os.environ.setdefault("PF_DISABLE_TRACING", "true")
+if "LOCAL_INDEX_DIR" not in os.environ:
+    os.environ["LOCAL_INDEX_DIR"] = tempfile.mkdtemp(prefix="bench_local_index_")
+
+from llm_replay import message_text as _text, node_for_messages as _node_for  # noqa: E402
+from text_utils import count_tokens  # noqa: E402
+
+
+def _user_query(messages):
+    # Os prompts têm "user:" na mesma linha do texto, então o Prompt Flow nem sempre separa
+    # a mensagem do usuário: procura a última "Query:" em todas as mensagens (o safety só
+    # tem o "original_query" no JSON do prompt)
+    text = "\n".join(_text(m) for m in messages) + "\n"
+    matches = re.findall(r"Query:\s*(.+?)\n", text) or re.findall(r'"original_query":\s*"(.+?)"', text)
+    return matches[-1].strip() if matches else ""
+
+
+def _reply(node, query, intents, answers):
+    if node == "intent_agent":
+        from candidate_resolver import resolver
+
+        intent = intents.get(query, "topic_exploration")
+        return {
+            "intent": intent,
+            # Como o modelo: os candidatos que o resolve_candidates já encontrou na pergunta
+            "entities": {"candidate_name": resolver.resolve(query)["candidate_names"], "policy_topic": None,
+                         "question_type": "general"},
+            "original_query": query,
+            "confidence": 0.9
+        }
+    if node == "policy_summarizer":
+        return {"summary": {"summary_bullets": ["Proposta A"], "explanation": "Resumo.",
+                            "complexity_level": "simples", "not_found": False}}
+    if node == "fact_checker":
+        return {"verification": {"verified": True, "claims": [], "confidence": 0.9}}
+    if node == "candidate_comparator":
+        return {"comparison": {"topic": None, "candidates": {}, "neutral_summary": "Comparação.",
+                               "key_differences": []}}
+    return {"final_response": {"answer": answers.get(query, "Resposta neutra."), "summary_bullets": [], "sources": []},
+            "safety_check": {"approved": True}}
+
+
+class StubOpenAI:
+    """Servidor local que imita chat/completions e embeddings do Azure OpenAI e a busca do Azure AI Search."""
+
+    def __init__(self, intents=None, latency_ms=0, answers=None):
+        """
+        latency_ms: número (todas as chamadas) ou {nó: ms} (nós ausentes: 0).
+        answers: {pergunta: texto da resposta final} (padrão: "Resposta neutra.").
+        """
+        self.intents = intents or {}
+        self.answers = answers or {}
+        self.latency_ms = latency_ms
+        self.calls = Counter()
+        self.response_formats = {}   # nó -> response_format pedido na última chamada
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])) or b"{}")
+                if self.path.split("?")[0].endswith("/embeddings"):
+                    stub.wait("embeddings")
+                    stub.count("embeddings")
+                    texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+                    payload = {"data": [
+                        {"embedding": embed(t), "index": i} for i, t in enumerate(texts)
+                    ], "model": "text-embedding-3-small", "usage": {
+                        "prompt_tokens": sum(count_tokens(t) for t in texts),
+                        "total_tokens": sum(count_tokens(t) for t in texts)
+                    }}
+                elif self.path.startswith("/indexes"):
+                    # Azure AI Search (retrieval_backend=azure com AZURE_SEARCH_ENDPOINT no stub)
+                    stub.wait("search")
+                    stub.count("search")
+                    payload = {"value": search(body)}
+                else:
+                    node = _node_for(body.get("messages", []))
+                    stub.wait(node)
+                    stub.count(node)
+                    stub.response_formats[node] = (body.get("response_format") or {}).get("type", "text")
+                    content = json.dumps(_reply(node, _user_query(body.get("messages", [])), stub.intents, stub.answers),
+                                         ensure_ascii=False)
+                    payload = {
+                        "id": "stub", "object": "chat.completion", "created": int(time.time()),
+                        "model": "gpt-4o-mini",
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": content}}],
+                        "usage": usage(body.get("messages", []), content)
+                    }
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def wait(self, node):
+        latency = self.latency_ms.get(node, 0) if isinstance(self.latency_ms, dict) else self.latency_ms
+        time.sleep(latency / 1000)
+
+    def count(self, node):
+        with self._lock:
+            self.calls[node] += 1
+
+    def reset(self):
+        with self._lock:
+            calls, self.calls = self.calls, Counter()
+        return calls
+
+    @property
+    def connections(self):
+        return {"aoai_connection": {"type": "AzureOpenAIConnection", "value": {
+            "api_key": "stub", "api_base": self.url, "api_type": "azure",
+            "api_version": "2024-02-15-preview"
+        }}}
+
+
+def usage(messages, content):
+    """Usage no formato da API (tokens aproximados pelo text_utils)."""
+    prompt = sum(count_tokens(_text(m)) + 4 for m in messages)
+    completion = count_tokens(content)
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+def search(body):
+    """Documentos do docs/search do Azure AI Search, a partir do índice local."""
+    from real_rag_retriever import local_search
+
+    vector = (body.get("vectorQueries") or [{}])[0].get("vector")
+    docs = local_search(body.get("search") or "", vector, body.get("top") or 3)
+    return [{k: v for k, v in doc.items() if k != "contentVector"} for doc in docs]
+
+
+def embed(text):
+    rnd = random.Random(text)
+    return [rnd.uniform(-1, 1) for _ in range(DIMENSIONS)]
+
+
+def build_sample_index(path=None):
+    """Índice local com um trecho por candidato/tema (o suficiente para o retriever devolver chunks)."""
+    from local_index import build_index
+    from candidate_resolver import resolver
+
+    topics = ["saúde", "educação", "transporte", "segurança", "economia"]
+    records = []
+    for name in resolver.names:
+        for topic in topics:
+            content = f"{name} propõe ampliar investimentos em {topic} nos bairros da cidade."
+            records.append({
+                "id": f"{len(records)}", "content": content, "title": f"Programa {name}",
+                "candidate": name, "section": topic, "contentVector": embed(content)
+            })
+    build_index(records, path or os.environ["LOCAL_INDEX_DIR"])
+    return len(records)
+
+
+def create_executor(stub, node_override=None, flow_file="flow.dag.yaml"):
+    """FlowExecutor do flow (relativo a multi-agents/), com o rag_retriever no índice local."""
+    from promptflow.executor import FlowExecutor
+
+    override = {"rag_retriever.retrieval_backend": "local"}
+    override.update(node_override or {})
+    return FlowExecutor.create(
+        os.path.join(HERE, flow_file), stub.connections, working_dir=HERE, node_override=override
+    )
+
+
+def node_dependencies(flow_file="flow.dag.yaml"):
+    """{nó: nós de que depende} a partir das referências ${nó.output...} (inputs e activate)."""
+    import yaml
+
+    with open(os.path.join(HERE, flow_file), encoding="utf-8") as f:
+        flow = yaml.safe_load(f)
+    deps = {}
+    for node in flow["nodes"]:
+        refs = json.dumps({"inputs": node.get("inputs", {}), "activate": node.get("activate", {})}, default=str)
+        deps[node["name"]] = sorted(set(re.findall(r"\$\{(\w+)\.output", refs)) - {"inputs"})
+    return deps
+
+
+def critical_path(nodes, deps):
+    """
+    Caminho mais longo (em tempo de execução) do DAG para uma linha executada.
+    nodes: saída de run_line; nós pulados (Bypassed) contam como 0 ms.
+    Retorna (duração em ms, [nós do caminho]).
+    """
+    finish, previous = {}, {}
+
+    def visit(name):
+        if name in finish:
+            return finish[name]
+        status, start, end = nodes.get(name, ("Bypassed", None, None))
+        own = (end - start).total_seconds() * 1000 if status == "Completed" and start and end else 0.0
+        best, best_dep = 0.0, None
+        for dep in deps.get(name, []):
+            if visit(dep) > best:
+                best, best_dep = finish[dep], dep
+        finish[name], previous[name] = best + own, best_dep
+        return finish[name]
+
+    last = max(deps, key=visit)
+    path = []
+    while last:
+        path.append(last)
+        last = previous[last]
+    return finish[path[0]], path[::-1]
+
+
+def run_line(executor, user_query, session_id="bench", traceparent=""):
+    """Executa uma pergunta; devolve (saída, {nó: (status, início, fim)})."""
+    result = executor.exec_line({"user_query": user_query, "session_id": session_id, "user_tier": "default",
+                                 "traceparent": traceparent})
+    nodes = {
+        name: (info.status.value, info.start_time, info.end_time)
+        for name, info in result.node_run_infos.items()
+    }
+    return result.output, nodes
@@ -0,0 +1,79 @@
+"""
+Endpoint /score (como o `pf flow serve`) executando o DAG real em replay.
+
+O flow fala com um ReplayServer (llm_replay.py) servindo o fixture store
+gravado pelo bench_replay: sem rede, sem credenciais e com respostas
+determinísticas. Usado pelo backend/benchmarks/bench_replay.py para medir o
+backend de ponta a ponta com o flow de verdade atrás dele.
+
+Uso (a partir de multi-agents/):
+    python -m benchmarks.flow_server --store DIR [--port 8080] [--latency none|recorded|ms]
+"""
+import argparse
+import io
+import json
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.bench_replay import point_flow_at
+from benchmarks.flow_harness import build_sample_index, create_executor
+from llm_replay import FixtureStore, ReplayServer
+
+FLOW_INPUTS = ("user_query", "session_id", "user_tier", "traceparent")
+
+
+def create_server(executor, host="127.0.0.1", port=8080):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            if self.path.split("?")[0] != "/score":
+                return self.reply(404, {"error": "not found"})
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            inputs = {name: payload.get(name, "") for name in FLOW_INPUTS}
+            # O backend manda o traceparent também no header
+            inputs["traceparent"] = inputs["traceparent"] or self.headers.get("traceparent", "")
+            with redirect_stdout(io.StringIO()):
+                result = executor.exec_line(inputs)
+            if result.run_info.error:
+                return self.reply(500, {"error": result.run_info.error})
+            self.reply(200, result.output)
+
+        def reply(self, status, payload):
+            data = json.dumps(payload, ensure_ascii=False, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--store", required=True, help="Fixture store gravado (bench_replay --record-only)")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", default="none", help="none | recorded | ms fixos por chamada")
+    args = parser.parse_args()
+
+    replay = ReplayServer(FixtureStore(args.store), "replay", latency=args.latency)
+    point_flow_at(replay)
+    build_sample_index()
+    executor = create_executor(replay, {"rag_retriever.retrieval_backend": "azure"})
+    server = create_server(executor, port=args.port)
+    print(f"✅ /score em replay: http://127.0.0.1:{args.port}/score ({len(replay.store)} fixtures)", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        replay.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Resolução determinística de nomes de candidatos (sem LLM).
+
+Carrega candidatos e apelidos de candidates.json e monta, uma vez por processo:
+- um dicionário de apelidos normalizados (match exato por n-gramas da pergunta)
+- um índice de trigramas dos apelidos de uma palavra, para erros de digitação
+  (confirmados por distância de edição)
+
+Apelidos fracos (uma palavra só: prenome ou sobrenome; siglas e nomes de
+partido, party_aliases) e matches por erro de digitação só valem se nenhum
+outro sobrenome vier logo depois ("Eduardo Bolsonaro" não é o Eduardo Paes).
+Com a pergunta toda em minúsculas não dá para reconhecer o sobrenome: uma
+palavra qualquer depois do apelido só é aceita se a pergunta falar de cargo,
+eleição ou campanha (CONTEXT_WORDS). Uma palavra escrita com acento que o
+candidato não tem (pães -> paes) nunca casa com um apelido fraco.
+
+Uso:
+    python candidate_resolver.py "Carol Sponja quer saber sobre educação"
+"""
+import os
+import re
+import json
+from collections import defaultdict
+
+from text_utils import normalize_text, strip_accents, STOPWORDS
+
+# Configuração (Variáveis de Ambiente)
+CANDIDATES_FILE = os.getenv(
+    "CANDIDATES_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "candidates.json")
+)
+# Candidatos fictícios do mock_rag_retriever / test_dataset.csv
+CANDIDATE_INCLUDE_MOCK = os.getenv("CANDIDATE_INCLUDE_MOCK", "false").lower() in ("1", "true", "yes")
+
+FUZZY_MIN_LENGTH = 5
+FUZZY_MIN_SIMILARITY = 0.8
+MAX_ALIAS_WORDS = 5
+_PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+
+# Cargo, eleição ou campanha na pergunta (sem maiúsculas para reconhecer sobrenomes)
+CONTEXT_WORDS = frozenset("""
+prefeito prefeita prefeitura candidato candidata candidatos candidatas candidatura eleicao eleicoes
+eleitoral eleito eleita campanha partido partidos turno voto votar vereador vereadora governo
+proposta propostas propoe plano debate
+""".split())
+# Partículas entre prenome e sobrenome ("Eduardo da Silva")
+NAME_PARTICLES = frozenset({"da", "das", "de", "do", "dos", "e"})
+
+
+def _trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Distância de Levenshtein."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def similarity(a: str, b: str) -> float:
+    if not a or not b:
+        return 0.0
+    return 1 - edit_distance(a, b) / max(len(a), len(b))
+
+
+class CandidateResolver:
+    def __init__(self, path=CANDIDATES_FILE, include_mock=CANDIDATE_INCLUDE_MOCK):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        self.candidates = [c for c in data["candidates"] if include_mock or not c.get("mock")]
+
+        self.aliases = defaultdict(set)      # apelido normalizado -> nomes canônicos
+        self.weak = set()                    # apelidos de uma palavra e de partido
+        self.spellings = defaultdict(set)    # nome -> palavras do nome e dos apelidos, com acento
+        self.name_words = defaultdict(set)   # nome -> palavras normalizadas do nome e dos apelidos
+        self.exclusions = {}                 # nome -> palavras que anulam o match (ex: "gomes")
+        self.trigrams = defaultdict(set)     # trigrama -> apelidos de uma palavra
+        self.canonical = {}                  # nome normalizado -> nome canônico
+        self._fuzzy_memo = {}                # palavra -> (apelido, score); o vocabulário das perguntas se repete
+        for c in self.candidates:
+            name = c["name"]
+            self.canonical[normalize_text(name)] = name
+            self.exclusions[name] = {normalize_text(w) for w in c.get("exclude_if", [])}
+            party = c.get("party_aliases", [])
+            for raw in [name] + c.get("aliases", []) + party:
+                alias = normalize_text(raw)
+                if not alias:
+                    continue
+                self.aliases[alias].add(name)
+                self.spellings[name].update(raw.lower().split())
+                self.name_words[name].update(alias.split())
+                if " " not in alias or raw in party:
+                    self.weak.add(alias)
+                if " " not in alias and len(alias) >= FUZZY_MIN_LENGTH and raw not in party:
+                    for trigram in _trigrams(alias):
+                        self.trigrams[trigram].add(alias)
+
+    @property
+    def names(self):
+        return [c["name"] for c in self.candidates]
+
+    def _fuzzy(self, token):
+        cached = self._fuzzy_memo.get(token)
+        if cached is not None:
+            return cached
+        if len(self._fuzzy_memo) >= 50000:
+            self._fuzzy_memo.clear()
+        self._fuzzy_memo[token] = result = self._fuzzy_lookup(token)
+        return result
+
+    def _fuzzy_lookup(self, token):
+        counts = defaultdict(int)
+        for trigram in _trigrams(token):
+            for alias in self.trigrams.get(trigram, ()):
+                counts[alias] += 1
+        best, best_score = None, FUZZY_MIN_SIMILARITY
+        for alias, shared in counts.items():
+            # Poucos trigramas em comum: nem calcula a distância de edição
+            if shared < len(token) // 2:
+                continue
+            score = similarity(token, alias)
+            if score >= best_score:
+                best, best_score = alias, score
+        return best, best_score
+
+    @staticmethod
+    def _words(text: str) -> list:
+        """[(palavra normalizada, palavra original)], na ordem de normalize_text(text).split()."""
+        return [
+            (token, original)
+            for original in _PUNCTUATION.sub(" ", str(text or "")).split()
+            for token in normalize_text(original).split()
+        ]
+
+    def _alias_at(self, tokens, start) -> bool:
+        return any(" ".join(tokens[start:start + n]) in self.aliases for n in range(1, MAX_ALIAS_WORDS + 1))
+
+    def _weak_match_ok(self, words, tokens, start, end, names, context, cased) -> bool:
+        """Apelido fraco (ou fuzzy) em words[start:end]: aceita ou descarta o match."""
+        # Acento que o candidato não tem: palavra comum, não o sobrenome (pães != Paes)
+        for _, original in words[start:end]:
+            original = original.lower()
+            if strip_accents(original) != original and not any(original in self.spellings[n] for n in names):
+                return False
+
+        j = end
+        while j < len(words) and words[j][0] in NAME_PARTICLES:
+            j += 1
+        if j >= len(words) or tokens[j] in STOPWORDS or self._alias_at(tokens, j):
+            return True
+        # Resto do nome do mesmo candidato ("Tarcizio Mota")
+        if any(tokens[j] in self.name_words[n] for n in names):
+            return True
+        if cased:
+            # Palavra com maiúscula logo depois: sobrenome de outra pessoa ("Eduardo Bolsonaro")
+            return not words[j][1][:1].isupper()
+        # Sem maiúsculas não dá para distinguir sobrenome de outra palavra: só com cargo/eleição
+        return context
+
+    def resolve(self, text: str) -> dict:
+        """
+        Candidatos citados na pergunta, em ordem de aparição.
+        method: "exact" (nome completo), "alias" (tabela de apelidos) ou "fuzzy" (erro de digitação).
+        """
+        words = self._words(text)
+        tokens = [token for token, _ in words]
+        token_set = set(tokens)
+        context = bool(CONTEXT_WORDS & token_set)
+        # Só minúsculas ou só maiúsculas: a caixa não indica sobrenome
+        cased = str(text).lower() != str(text) != str(text).upper()
+        matches = []
+
+        i = 0
+        while i < len(tokens):
+            for n in range(min(MAX_ALIAS_WORDS, len(tokens) - i), 0, -1):
+                phrase = " ".join(tokens[i:i + n])
+                names = self.aliases.get(phrase)
+                if names:
+                    if phrase not in self.weak or self._weak_match_ok(words, tokens, i, i + n, names, context, cased):
+                        method = "exact" if phrase in self.canonical else "alias"
+                        matches.append((i, phrase, names, 1.0 if method == "exact" else 0.9, method))
+                    i += n
+                    break
+            else:
+                token = tokens[i]
+                if len(token) >= FUZZY_MIN_LENGTH and token not in STOPWORDS:
+                    alias, score = self._fuzzy(token)
+                    if alias and self._weak_match_ok(words, tokens, i, i + 1, self.aliases[alias], context, cased):
+                        matches.append((i, token, self.aliases[alias], round(0.9 * score, 3), "fuzzy"))
+                i += 1
+
+        resolved = {}
+        ambiguous = False
+        for position, phrase, names, score, method in matches:
+            names = [n for n in sorted(names) if not (self.exclusions.get(n, set()) & token_set)]
+            if len(names) > 1:
+                ambiguous = True
+            for name in names:
+                if name not in resolved or resolved[name]["score"] < score:
+                    resolved[name] = {"name": name, "matched": phrase, "score": score, "method": method, "position": position}
+
+        ordered = sorted(resolved.values(), key=lambda m: m["position"])
+        return {
+            "candidate_names": [m["name"] for m in ordered],
+            "matches": [{k: v for k, v in m.items() if k != "position"} for m in ordered],
+            "ambiguous": ambiguous,
+        }
+
+
+# Instância global: índice montado uma vez por processo
+resolver = CandidateResolver()
+
+
+if __name__ == "__main__":
+    import sys
+    print(json.dumps(resolver.resolve(" ".join(sys.argv[1:])), indent=2, ensure_ascii=False))
@@ -0,0 +1,171 @@
+"""
+Chunker estrutural para os planos de governo.
+
+Os documentos têm um cabeçalho "Campo: valor" (dados do TSE) seguido das páginas
+do programa separadas por "==== PÁGINA N ====". O chunker:
+- tira o cabeçalho do texto e devolve os campos como metadados (candidate etc.)
+- corta nas páginas e nos títulos de seção (linhas em caixa alta / numeradas)
+- empacota frases em chunks de até CHUNK_MAX_TOKENS com CHUNK_OVERLAP_TOKENS de sobreposição
+
+Uso:
+    python chunker.py report docs.jsonl     # tokens médios por chunk antes/depois
+"""
+import os
+import re
+
+from text_utils import count_tokens
+
+# Configuração (Variáveis de Ambiente)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "350"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", "8"))
+
+_PAGE_SEPARATOR = re.compile(r"=*\s*P[ÁA]GINA\s+(\d+)\s*=+", re.IGNORECASE)
+_RULE = re.compile(r"^=+$", re.MULTILINE)
+_HEADER_FIELD = re.compile(r"^([^\W\d][^:\n]{1,40}):\s*(.+)$", re.MULTILINE)
+_NUMBERED_HEADING = re.compile(r"^\d+(\.\d+)*[.)]?\s+\S")
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+")
+_SOFT_HYPHEN = "\xad"
+
+
+def split_document(text: str):
+    """Separa o cabeçalho das páginas. Retorna (cabeçalho, [(número da página, texto)])."""
+    parts = _PAGE_SEPARATOR.split(text)
+    header = _RULE.sub("", parts[0]).strip()
+    if len(parts) == 1:
+        return "", [(None, header)]
+    pages = [(int(parts[i]), _RULE.sub("", parts[i + 1]).strip()) for i in range(1, len(parts) - 1, 2)]
+    return header, pages
+
+
+def parse_header(header: str) -> dict:
+    """Campos "Campo: valor" do cabeçalho do TSE."""
+    return {key.strip(): value.strip() for key, value in _HEADER_FIELD.findall(header)}
+
+
+def is_heading(line: str) -> bool:
+    line = line.strip()
+    if not (3 <= len(line) <= 90) or line[-1] in ".,;:":
+        return False
+    letters = [c for c in line if c.isalpha()]
+    if len(letters) < 3:
+        return False
+    if sum(c.isupper() for c in letters) / len(letters) >= 0.8:
+        return True
+    return bool(_NUMBERED_HEADING.match(line)) and len(line) <= 80
+
+
+def iter_sections(text: str, section=None):
+    """(seção, texto corrido) de uma página; a seção corrente continua da página anterior."""
+    body, heading = [], []
+    for line in text.replace(_SOFT_HYPHEN, "").splitlines():
+        if not line.strip():
+            continue
+        if is_heading(line):
+            if body:
+                yield section, " ".join(body)
+                body = []
+            heading.append(line.strip())
+            continue
+        if heading:
+            # Títulos quebrados em várias linhas viram um só
+            section = " ".join(heading)
+            heading = []
+        body.append(line.strip())
+    if heading:
+        section = " ".join(heading)
+    if body:
+        yield section, " ".join(body)
+
+
+def _split_long(sentence: str, max_tokens: int):
+    words = sentence.split()
+    step = max(1, len(words) * max_tokens // max(count_tokens(sentence), 1))
+    for i in range(0, len(words), step):
+        yield " ".join(words[i:i + step])
+
+
+def pack_sentences(text: str, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """Agrupa frases em blocos de até max_tokens, repetindo ~overlap_tokens do bloco anterior."""
+    units = []
+    for sentence in _SENTENCE_END.split(text):
+        tokens = count_tokens(sentence)
+        if tokens > max_tokens:
+            units.extend((part, count_tokens(part)) for part in _split_long(sentence, max_tokens))
+        elif sentence:
+            units.append((sentence, tokens))
+
+    current, size = [], 0
+    for sentence, tokens in units:
+        if current and size + tokens > max_tokens:
+            yield " ".join(s for s, _ in current)
+            # Sobreposição: últimas frases do bloco anterior
+            overlap, overlap_size = [], 0
+            for s, t in reversed(current):
+                if overlap_size + t > overlap_tokens:
+                    break
+                overlap.insert(0, (s, t))
+                overlap_size += t
+            current, size = overlap, overlap_size
+        current.append((sentence, tokens))
+        size += tokens
+    if current:
+        yield " ".join(s for s, _ in current)
+
+
+def chunk_pages(pages, candidate=None, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Chunks de uma lista de páginas [(número, texto)].
+    Cada chunk: content, page_number, section, candidate, chunk_index.
+    """
+    chunks = []
+    section = None
+    for page_number, text in pages:
+        for section, body in iter_sections(text, section):
+            for content in pack_sentences(body, max_tokens, overlap_tokens):
+                if count_tokens(content) < CHUNK_MIN_TOKENS:
+                    continue
+                chunks.append({
+                    "content": content,
+                    "page_number": page_number,
+                    "section": section,
+                    "candidate": candidate,
+                    "chunk_index": len(chunks),
+                })
+    return chunks
+
+
+def chunk_document(text: str, title=None, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """Documento inteiro (cabeçalho + páginas). O cabeçalho vira metadado, não texto repetido."""
+    header, pages = split_document(text)
+    fields = parse_header(header)
+    candidate = fields.get("Nome Completo") or title
+    return chunk_pages(pages, candidate, max_tokens, overlap_tokens), fields
+
+
+def report(documents, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """Tokens médios por chunk: documento inteiro (como está no índice) vs. chunker."""
+    before = [count_tokens(d.get("content") or "") for d in documents]
+    after = []
+    for d in documents:
+        chunks, _ = chunk_document(d.get("content") or "", d.get("title"), max_tokens, overlap_tokens)
+        after.extend(count_tokens(c["content"]) for c in chunks)
+    return {
+        "documents": len(documents),
+        "chunks": len(after),
+        "avg_tokens_before": round(sum(before) / len(before), 1) if before else 0,
+        "avg_tokens_after": round(sum(after) / len(after), 1) if after else 0,
+        "max_tokens_after": max(after, default=0),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+
+    if len(sys.argv) != 3 or sys.argv[1] != "report":
+        print(__doc__)
+        sys.exit(1)
+    with open(sys.argv[2], encoding="utf-8") as f:
+        docs = [json.loads(line) for line in f if line.strip()] if sys.argv[2].endswith(".jsonl") else json.load(f)
+    print(json.dumps(report(docs), indent=2, ensure_ascii=False))
@@ -0,0 +1,159 @@
+from promptflow import tool
+import json
+import logging
+import re
+
+from text_utils import count_tokens, tokenize
+from telemetry import traced_node
+
+logger = logging.getLogger(__name__)
+
+# Dois chunks com Jaccard de shingles acima disso são considerados o mesmo trecho
+NEAR_DUPLICATE_THRESHOLD = 0.8
+SHINGLE_SIZE = 3
+
+# Campos dos chunks que os prompts usam (relevance_score, campos vazios etc. ficam de fora);
+# url/title: o policy_summarizer monta o documentation_url a partir deles
+PROMPT_FIELDS = ("content", "source", "title", "url", "page_number", "candidate", "section")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+|\n+")
+
+
+def _shingles(text):
+    terms = tokenize(text)
+    if len(terms) < SHINGLE_SIZE:
+        return {" ".join(terms)}
+    return {" ".join(terms[i:i + SHINGLE_SIZE]) for i in range(len(terms) - SHINGLE_SIZE + 1)}
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def chunk_tokens(chunk) -> int:
+    """Tokens que o chunk ocupa renderizado no prompt."""
+    return count_tokens(json.dumps(chunk, ensure_ascii=False))
+
+
+def dedupe(chunks):
+    """Remove chunks quase idênticos (ex: sobreposição do chunker, mesmo trecho em dois índices)."""
+    kept, kept_shingles = [], []
+    for chunk in chunks:
+        shingles = _shingles(chunk.get("content", ""))
+        if any(_jaccard(shingles, other) >= NEAR_DUPLICATE_THRESHOLD for other in kept_shingles):
+            continue
+        kept.append(chunk)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def rank(chunks, query):
+    """Ordena por relevância da busca, desempatando pela sobreposição de termos com a pergunta."""
+    query_terms = set(tokenize(query))
+    max_score = max((float(c.get("relevance_score") or 0) for c in chunks), default=0) or 1.0
+
+    def score(chunk):
+        terms = set(tokenize(chunk.get("content", "")))
+        overlap = len(query_terms & terms) / len(query_terms) if query_terms else 0.0
+        return 0.7 * float(chunk.get("relevance_score") or 0) / max_score + 0.3 * overlap
+
+    return sorted(chunks, key=score, reverse=True)
+
+
+def extract_relevant(content, query, max_tokens):
+    """Frases do chunk mais ligadas à pergunta, na ordem original, até max_tokens."""
+    query_terms = set(tokenize(query))
+    sentences = [s for s in _SENTENCE_END.split(content) if s.strip()]
+    scored = sorted(
+        range(len(sentences)),
+        key=lambda i: (-len(query_terms & set(tokenize(sentences[i]))), i)
+    )
+    chosen, used = set(), 0
+    for i in scored:
+        tokens = count_tokens(sentences[i])
+        if used + tokens > max_tokens:
+            continue
+        chosen.add(i)
+        used += tokens
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+
+def fit_to_budget(chunks, query, budget):
+    """
+    1ª passada: chunks inteiros que cabem, em ordem de relevância.
+    2ª passada: dos que não couberam, só as frases relevantes, no orçamento que sobrou.
+    """
+    selected, skipped, used = {}, [], 0
+    for i, chunk in enumerate(chunks):
+        tokens = chunk_tokens(chunk)
+        if used + tokens <= budget:
+            selected[i] = chunk
+            used += tokens
+        else:
+            skipped.append(i)
+
+    for i in skipped:
+        chunk = chunks[i]
+        room = budget - used - chunk_tokens({**chunk, "content": ""})
+        while room >= 30:
+            trimmed = {**chunk, "content": extract_relevant(chunk.get("content", ""), query, room)}
+            tokens = chunk_tokens(trimmed)
+            if used + tokens <= budget:
+                if trimmed["content"]:
+                    selected[i] = trimmed
+                    used += tokens
+                break
+            # Escape de aspas/quebras no JSON passou do orçamento: tenta com menos espaço
+            room -= used + tokens - budget
+    return [selected[i] for i in sorted(selected)], used
+
+
+@tool
+@traced_node
+def context_budgeter(
+    retrieved_chunks: list,
+    original_query: str,
+    summarizer_budget: int = 1500,
+    fact_checker_budget: int = 1500,
+    comparator_budget: int = 1200
+) -> dict:
+    """
+    Limita o contexto enviado a cada nó LLM: dedupe de chunks quase iguais,
+    ranking por relevância e extração das frases relevantes para caber no orçamento.
+    """
+    chunks = [
+        {k: c[k] for k in PROMPT_FIELDS if c.get(k) not in (None, "", "N/A")}
+        for c in rank(retrieved_chunks or [], original_query or "")
+    ]
+    original_tokens = sum(chunk_tokens(c) for c in (retrieved_chunks or []))
+    unique = dedupe(chunks)
+
+    summarizer_chunks, summarizer_tokens = fit_to_budget(unique, original_query or "", summarizer_budget)
+    fact_checker_chunks, fact_checker_tokens = fit_to_budget(unique, original_query or "", fact_checker_budget)
+    comparator_chunks, comparator_tokens = fit_to_budget(unique, original_query or "", comparator_budget)
+
+    # Sem o budgeter, os chunks iam inteiros para o summarizer e o fact_checker
+    before = 2 * original_tokens
+    after = summarizer_tokens + fact_checker_tokens
+    stats = {
+        "chunks_in": len(retrieved_chunks or []),
+        "chunks_after_dedupe": len(unique),
+        "tokens_before": before,
+        "tokens_after": after,
+        "tokens_saved": max(0, before - after),
+        "summarizer_tokens": summarizer_tokens,
+        "fact_checker_tokens": fact_checker_tokens,
+        "comparator_tokens": comparator_tokens,
+    }
+    if before:
+        logger.info(f"Context budget: {before} -> {after} tokens ({100 * (before - after) / before:.0f}% saved, "
+                    f"{len(retrieved_chunks or [])} -> {len(unique)} chunks)")
+
+    return {
+        "summarizer_chunks": summarizer_chunks,
+        "fact_checker_chunks": fact_checker_chunks,
+        "comparator_chunks": comparator_chunks,
+        "stats": stats
+    }
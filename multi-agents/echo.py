@@ -1,32 +1,378 @@
+"""
+Ingestão dos PDFs dos planos de governo (blob `pdfs` -> índice de busca).
+
+Pipeline em streaming:
+- downloads concorrentes (threads) e extração de texto em um pool de processos,
+  com uma janela limitada de arquivos em andamento (INGEST_MAX_IN_FLIGHT)
+- registros produzidos por generator assim que cada extração termina (sem
+  acumular todas as páginas em memória)
+- manifest com ETag + hash do conteúdo: PDFs inalterados são pulados
+- chunks estruturais (chunker.py) com candidato, página e seção em campos próprios
+- embeddings e escrita em lotes no Azure AI Search ou no índice local
+
+Uso:
+    python echo.py                          # blob storage -> INGEST_TARGET
+    python echo.py --source-dir ./pdfs      # diretório local no lugar do blob
+    python echo.py --target local --full    # reprocessa tudo, grava no índice local
+"""
 import os
-from azure.storage.blob import BlobServiceClient
+import io
+import json
+import time
+import hashlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, ProcessPoolExecutor, wait
+
 import pypdf
 
+from answer_cache import bump_index_version
+from chunker import chunk_pages
+
+# Configuração (Variáveis de Ambiente)
+INGEST_TARGET = os.getenv("INGEST_TARGET", "search")  # search | local
+INGEST_DOWNLOAD_WORKERS = int(os.getenv("INGEST_DOWNLOAD_WORKERS", "8"))
+INGEST_EXTRACT_WORKERS = int(os.getenv("INGEST_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+# Arquivos entre download e extração ao mesmo tempo (0 = downloads + extrações)
+INGEST_MAX_IN_FLIGHT = int(os.getenv("INGEST_MAX_IN_FLIGHT", "0"))
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "16"))
+INGEST_UPLOAD_BATCH = int(os.getenv("INGEST_UPLOAD_BATCH", "500"))  # máx. 1000 docs por lote no AI Search
+INGEST_MANIFEST = os.getenv(
+    "INGEST_MANIFEST",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ingest_manifest.json")
+)
+# Campos enviados ao índice do Azure AI Search (os demais ficam só no índice local)
+INGEST_SEARCH_FIELDS = os.getenv(
+    "INGEST_SEARCH_FIELDS", "id,content,title,filepath,url,contentVector,candidate,section,page_number"
+).split(",")
+
+# Campos do chunker no índice: o SearchIndexSink cria os que faltarem (adicionar campo não exige reindexar)
+STRUCTURAL_FIELDS = {"candidate": "Edm.String", "section": "Edm.String", "page_number": "Edm.Int32"}
+
+
 def extract_text_from_pdf(pdf_bytes):
-    reader = pypdf.PdfReader(pdf_bytes)
+    reader = pypdf.PdfReader(io.BytesIO(pdf_bytes) if isinstance(pdf_bytes, bytes) else pdf_bytes)
     text_pages = []
     for i, page in enumerate(reader.pages):
         text = page.extract_text() or ""
         text_pages.append({"page": i+1, "text": text})
     return text_pages
 
-def entrypoint():
-    conn_str = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
-    if not conn_str:
-        raise ValueError("Missing environment variable AZURE_STORAGE_CONNECTION_STRING required to access blob storage")
-
-    blob_service = BlobServiceClient.from_connection_string(conn_str)
-    container = blob_service.get_container_client("pdfs")
-
-    results = []
-    for blob in container.list_blobs():
-        pdf = container.download_blob(blob.name).readall()
-        pages = extract_text_from_pdf(pdf)
-        for p in pages:
-            results.append({
-                "candidate": blob.name.split("-")[0],
-                "page": p["page"],
-                "content": p["text"]
-            })
-
-    return results
+
+def candidate_from_name(name):
+    return os.path.basename(name).split("-")[0]
+
+
+def chunk_id(name, page, index=0):
+    # Chave do AI Search: só letras, dígitos, _ - =
+    return hashlib.sha1(f"{name}|{page}|{index}".encode("utf-8")).hexdigest()
+
+
+def chunk_pdf(name, pages):
+    """Chunks estruturais (páginas, seções, limite de tokens) de um PDF extraído."""
+    chunks = chunk_pages([(p["page"], p["text"]) for p in pages], candidate_from_name(name))
+    for chunk in chunks:
+        yield {
+            "id": chunk_id(name, chunk["page_number"], chunk["chunk_index"]),
+            "content": chunk["content"],
+            "title": os.path.basename(name),
+            "filepath": name,
+            "url": None,
+            "candidate": chunk["candidate"],
+            "page_number": chunk["page_number"],
+            "section": chunk["section"],
+        }
+
+
+# --- FONTES ---
+class BlobSource:
+    """Container `pdfs` do Blob Storage."""
+
+    def __init__(self, conn_str, container="pdfs"):
+        from azure.storage.blob import BlobServiceClient
+        self.container = BlobServiceClient.from_connection_string(conn_str).get_container_client(container)
+
+    def list(self):
+        for blob in self.container.list_blobs():
+            yield blob.name, blob.etag
+
+    def read(self, name):
+        return self.container.download_blob(name, max_concurrency=2).readall()
+
+
+class DirectorySource:
+    """Diretório local de PDFs no lugar do blob (testes e benchmark)."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def list(self):
+        for root, _, files in os.walk(self.path):
+            for f in sorted(files):
+                if f.lower().endswith(".pdf"):
+                    full = os.path.join(root, f)
+                    st = os.stat(full)
+                    yield os.path.relpath(full, self.path), f"{st.st_mtime_ns}-{st.st_size}"
+
+    def read(self, name):
+        with open(os.path.join(self.path, name), "rb") as f:
+            return f.read()
+
+
+# --- MANIFEST ---
+def load_manifest(path=INGEST_MANIFEST):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, path=INGEST_MANIFEST):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+# --- PIPELINE ---
+class IngestStats:
+    def __init__(self):
+        self.listed = 0
+        self.skipped = 0
+        self.processed = 0
+        self.removed = 0
+        self.pages = 0
+        self.chunks = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+
+    def as_dict(self):
+        return {
+            "listed": self.listed,
+            "skipped": self.skipped,
+            "processed": self.processed,
+            "removed": self.removed,
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "mb_downloaded": round(self.bytes / 1e6, 2),
+            "seconds": round(time.perf_counter() - self.started, 2),
+        }
+
+
+def iter_records(source, manifest, stats, full=False,
+                 download_workers=INGEST_DOWNLOAD_WORKERS, extract_workers=INGEST_EXTRACT_WORKERS,
+                 max_in_flight=INGEST_MAX_IN_FLIGHT):
+    """
+    Gera os chunks dos PDFs novos ou alterados, à medida que cada extração termina.
+    No máximo `max_in_flight` arquivos ficam ao mesmo tempo entre download e
+    extração (bytes e páginas em memória limitados, não o storage inteiro); um
+    novo download só começa quando um arquivo sai da janela.
+    Atualiza `manifest` (em memória) com ETag, hash e ids dos chunks de cada arquivo.
+    """
+    listed = dict(source.list())
+    stats.listed = len(listed)
+    changed = [name for name, etag in listed.items() if full or manifest.get(name, {}).get("etag") != etag]
+    stats.skipped = len(listed) - len(changed)
+    max_in_flight = max(1, max_in_flight or download_workers + extract_workers)
+
+    def download(name):
+        data = source.read(name)
+        return name, data, hashlib.sha256(data).hexdigest()
+
+    with ThreadPoolExecutor(max_workers=download_workers) as downloads, \
+            ProcessPoolExecutor(max_workers=extract_workers) as extractors:
+        pending = iter(changed)
+        in_flight = {}  # future -> None (download) ou (nome, hash) (extração)
+
+        def fill():
+            for name in pending:
+                in_flight[downloads.submit(download, name)] = None
+                if len(in_flight) >= max_in_flight:
+                    return
+
+        fill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                extraction = in_flight.pop(future)
+                if extraction is None:
+                    name, data, digest = future.result()
+                    stats.bytes += len(data)
+                    previous = manifest.get(name)
+                    if not full and previous and previous.get("sha256") == digest:
+                        # ETag mudou mas o conteúdo é o mesmo (ex: re-upload)
+                        previous["etag"] = listed[name]
+                        stats.skipped += 1
+                        continue
+                    # Continua na janela até a extração terminar
+                    in_flight[extractors.submit(extract_text_from_pdf, data)] = (name, digest)
+                    continue
+
+                name, digest = extraction
+                pages = future.result()
+                stats.processed += 1
+                stats.pages += len(pages)
+                ids = []
+                old_ids = (manifest.get(name) or {}).get("chunks", [])
+                for record in chunk_pdf(name, pages):
+                    ids.append(record["id"])
+                    stats.chunks += 1
+                    yield record
+                manifest[name] = {
+                    "etag": listed[name],
+                    "sha256": digest,
+                    "chunks": ids,
+                    "stale_chunks": sorted(set(old_ids) - set(ids)),
+                }
+            fill()
+
+    # Arquivos removidos do storage
+    for name in [n for n in manifest if n not in listed]:
+        manifest[name] = {"removed": True, "stale_chunks": manifest[name].get("chunks", [])}
+        stats.removed += 1
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_records(records, config, batch_size=INGEST_EMBED_BATCH):
+    """Adiciona contentVector aos registros, uma chamada de embeddings por lote."""
+    from real_rag_retriever import embed_batch
+
+    for batch in batched(records, batch_size):
+        vectors = embed_batch([r["content"] for r in batch], config)
+        for record, vector in zip(batch, vectors):
+            record["contentVector"] = vector
+            yield record
+
+
+# --- DESTINOS ---
+class SearchIndexSink:
+    """Upload em lotes para o Azure AI Search (merge_or_upload: reprocessar é idempotente)."""
+
+    def __init__(self, index_name=None):
+        from azure.search.documents import SearchClient
+        from azure.core.credentials import AzureKeyCredential
+
+        self.index_name = index_name or os.environ.get("AZURE_SEARCH_INDEX", "json-vetorizado")
+        self.credential = AzureKeyCredential(os.environ["AZURE_SEARCH_KEY"])
+        self.client = SearchClient(
+            endpoint=os.environ["AZURE_SEARCH_ENDPOINT"],
+            index_name=self.index_name,
+            credential=self.credential,
+        )
+        self.ensure_fields()
+
+    def ensure_fields(self):
+        """Adiciona ao índice os campos estruturais de INGEST_SEARCH_FIELDS que ele ainda não tem."""
+        from azure.search.documents.indexes import SearchIndexClient
+        from azure.search.documents.indexes.models import SearchableField, SimpleField
+
+        index_client = SearchIndexClient(endpoint=os.environ["AZURE_SEARCH_ENDPOINT"], credential=self.credential)
+        index = index_client.get_index(self.index_name)
+        existing = {field.name for field in index.fields}
+        missing = [name for name in STRUCTURAL_FIELDS if name in INGEST_SEARCH_FIELDS and name not in existing]
+        for name in missing:
+            if name == "section":
+                # Títulos de seção também entram na busca textual
+                index.fields.append(SearchableField(name=name, type=STRUCTURAL_FIELDS[name], filterable=True))
+            else:
+                index.fields.append(SimpleField(name=name, type=STRUCTURAL_FIELDS[name],
+                                                filterable=True, facetable=True, sortable=name == "page_number"))
+        if missing:
+            index_client.create_or_update_index(index)
+            print(f"✅ Campos adicionados ao índice {self.index_name}: {', '.join(missing)}")
+
+    def write(self, records, batch_size=INGEST_UPLOAD_BATCH):
+        for batch in batched(records, batch_size):
+            self.client.merge_or_upload_documents(
+                documents=[{k: r[k] for k in INGEST_SEARCH_FIELDS if k in r} for r in batch]
+            )
+
+    def delete(self, ids):
+        for batch in batched(ids, INGEST_UPLOAD_BATCH):
+            self.client.delete_documents(documents=[{"id": i} for i in batch])
+
+
+class LocalIndexSink:
+    """Índice local (local_index.py): junta os chunks novos aos existentes e regrava no fim."""
+
+    def __init__(self, path=None, replace=False):
+        from local_index import LOCAL_INDEX_DIR
+        self.path = path or LOCAL_INDEX_DIR
+        self.replace = replace
+        self.records = []
+        self.deleted = set()
+
+    def write(self, records, batch_size=INGEST_UPLOAD_BATCH):
+        for batch in batched(records, batch_size):
+            self.records.extend(batch)
+
+    def delete(self, ids):
+        self.deleted.update(ids)
+
+    def close(self):
+        from local_index import build_index, iter_index_records
+
+        fresh = {r["id"] for r in self.records}
+        kept = [] if self.replace else [
+            r for r in iter_index_records(self.path)
+            if r["id"] not in fresh and r["id"] not in self.deleted
+        ]
+        if kept or self.records:
+            build_index(kept + self.records, self.path)
+
+
+def run_ingestion(source, sink, embed_config=None, full=False, manifest_path=INGEST_MANIFEST, **workers):
+    manifest = {} if full else load_manifest(manifest_path)
+    stats = IngestStats()
+
+    records = iter_records(source, manifest, stats, full=full, **workers)
+    if embed_config is not None:
+        records = embed_records(records, embed_config)
+    sink.write(records)
+
+    stale = [i for entry in manifest.values() for i in entry.pop("stale_chunks", [])]
+    if stale:
+        sink.delete(stale)
+    if hasattr(sink, "close"):
+        sink.close()
+
+    # Só grava o manifest depois que o destino aceitou tudo
+    save_manifest({name: entry for name, entry in manifest.items() if not entry.get("removed")}, manifest_path)
+    if stats.processed or stats.removed:
+        # Documentos novos: respostas em cache deixam de valer
+        bump_index_version()
+    return stats.as_dict()
+
+
+def entrypoint(source_dir=None, target=INGEST_TARGET, full=False):
+    if source_dir:
+        source = DirectorySource(source_dir)
+    else:
+        conn_str = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
+        if not conn_str:
+            raise ValueError("Missing environment variable AZURE_STORAGE_CONNECTION_STRING required to access blob storage")
+        source = BlobSource(conn_str)
+
+    from real_rag_retriever import resolve_openai_config
+    sink = LocalIndexSink(replace=full) if target == "local" else SearchIndexSink()
+    return run_ingestion(source, sink, embed_config=resolve_openai_config(None), full=full)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingestão incremental dos PDFs.")
+    parser.add_argument("--source-dir", help="diretório local de PDFs em vez do blob storage")
+    parser.add_argument("--target", choices=["search", "local"], default=INGEST_TARGET)
+    parser.add_argument("--full", action="store_true", help="ignora o manifest e reprocessa tudo")
+    args = parser.parse_args()
+
+    print(json.dumps(entrypoint(args.source_dir, args.target, args.full), indent=2))
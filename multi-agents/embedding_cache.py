@@ -0,0 +1,111 @@
+import os
+import array
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from text_utils import normalize_text
+
+# Configuração (Variáveis de Ambiente)
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "5000"))
+# Caminho do SQLite para persistir entre restarts/workers; vazio = só memória
+EMBEDDING_CACHE_DB = os.getenv("EMBEDDING_CACHE_DB", "")
+
+
+class EmbeddingCache:
+    """
+    Cache de embeddings de queries: LRU em memória + SQLite opcional em disco.
+    Chave = (deployment, query normalizada), então perguntas que só diferem em
+    caixa, acentos ou pontuação reaproveitam o mesmo vetor.
+    """
+
+    def __init__(self, max_entries=EMBEDDING_CACHE_MAX_ENTRIES, db_path=EMBEDDING_CACHE_DB):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "deployment TEXT NOT NULL, query TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (deployment, query))"
+            )
+            self._db.commit()
+
+        # Métricas
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str, deployment: str):
+        return (deployment, normalize_text(text))
+
+    def get(self, text: str, deployment: str):
+        key = self.key(text, deployment)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector FROM embeddings WHERE deployment=? AND query=?", key
+                ).fetchone()
+                if row:
+                    vector = array.array("f", row[0]).tolist()
+                    self._remember(key, vector)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, text: str, deployment: str, vector):
+        if not vector:
+            return
+        key = self.key(text, deployment)
+        with self._lock:
+            self._remember(key, list(vector))
+            if self._db is not None:
+                # float32 no disco: metade do espaço, precisão suficiente para similaridade
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (deployment, query, vector) VALUES (?, ?, ?)",
+                    (*key, array.array("f", vector).tobytes())
+                )
+                self._db.commit()
+
+    def _remember(self, key, vector):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Instância global (por worker do pf flow serve)
+embedding_cache = EmbeddingCache()
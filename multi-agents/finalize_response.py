@@ -0,0 +1,113 @@
+from promptflow import tool
+from answer_cache import answer_cache, estimate_tokens, ANSWER_CACHE_ENABLED
+from simple_protection import simple_cost_track
+from usage_tracker import usage_tracker
+from telemetry import telemetry, traced_node
+
+
+@tool
+@traced_node
+def finalize_response(
+    user_query: str,
+    protection: dict = None,
+    exact_cache: dict = None,
+    semantic_cache: dict = None,
+    flow_output: dict = None,
+    intent: str = None,
+    entities: dict = None,
+    retrieved_chunks: list = None,
+    fast_path: dict = None,
+    routing: dict = None,
+    session_id: str = None
+) -> dict:
+    """
+    Junta o resultado final: recusa do protection_check (limite atingido),
+    resposta do cache (se houve hit), resposta pronta
+    (pre_classifier / intent_router) ou do safety_parser.
+    Em um miss bem-sucedido, grava a resposta no cache.
+    Fecha a contabilidade de tokens/custo da requisição (usage_tracker) e o
+    trace: "trace" traz o trace_id e a duração de cada etapa para o backend.
+    """
+    def track(route, **cache):
+        usage = usage_tracker.close_request(session_id, route)
+        accounting = simple_cost_track(usage["total_tokens"], cost_usd=usage["cost_usd"], **cache)
+        return accounting, {k: usage[k] for k in ("llm_calls", "total_tokens", "cost_usd", "nodes")}
+
+    # Intenção e candidatos previstos (avaliação em lote: batch_eval.py)
+    prediction = {"intent": intent, "candidates": (entities or {}).get("candidate_name") or []}
+
+    # protection_check negou: nenhum outro nó rodou, não há custo a registrar
+    if protection and not protection.get("allowed", True):
+        usage = usage_tracker.close_request(session_id, "rate_limited")
+        return {
+            "final_response": {
+                "answer": "Limite de uso atingido. Tente novamente mais tarde.",
+                "reason": protection.get("reason"),
+                "retry_after": protection.get("retry_after")
+            },
+            "cache": {"hit": False, "tier": None},
+            "route": "rate_limited",
+            "prediction": prediction,
+            "usage": {k: usage[k] for k in ("llm_calls", "total_tokens", "cost_usd", "nodes")},
+            "trace": telemetry.end_request()
+        }
+
+    for cached in (exact_cache, semantic_cache):
+        if cached and cached.get("hit"):
+            accounting, usage = track("cache", cache_hit=True, saved_tokens=cached.get("tokens_saved", 0),
+                                    saved_cost_usd=cached.get("cost_saved_usd", 0.0))
+            return {
+                "final_response": cached["final_response"],
+                "cache": {"hit": True, "tier": cached.get("tier"), **accounting},
+                "route": "cache",
+                "prediction": prediction,
+                "usage": usage,
+                "trace": telemetry.end_request()
+            }
+
+    # Fast path: pre_classifier (sem LLM) ou intent_router (só o intent_agent)
+    for routed in (fast_path, routing):
+        if routed and routed.get("final_response"):
+            route = routed.get("route") or routed.get("intent")
+            accounting, usage = track(route, cache_hit=False)
+            return {
+                "final_response": routed["final_response"],
+                "cache": {"hit": False, "tier": None, **accounting},
+                "route": route,
+                # pre_classifier responde sem intent_agent: a rota é a intenção
+                "prediction": {**prediction, "intent": intent or route},
+                "usage": usage,
+                "trace": telemetry.end_request()
+            }
+
+    flow_output = flow_output or {}
+    final_response = flow_output.get("final_response")
+    accounting, usage = track("full", cache_hit=False)
+
+    # Só guarda respostas válidas (sem erro de parse e com texto)
+    if (
+        ANSWER_CACHE_ENABLED
+        and isinstance(final_response, dict)
+        and final_response.get("answer")
+        and "error" not in flow_output
+    ):
+        answer_cache.put(
+            user_query,
+            intent,
+            entities,
+            final_response,
+            # Tokens que uma repetição desta pergunta economiza (chunks e resposta nos prompts)
+            tokens=estimate_tokens(retrieved_chunks, retrieved_chunks, final_response, final_response),
+            query_vector=(semantic_cache or {}).get("query_vector"),
+            # Custo desta requisição pela tabela de preços por deployment (usage_tracker)
+            cost_usd=usage["cost_usd"]
+        )
+
+    return {
+        "final_response": final_response,
+        "cache": {"hit": False, "tier": None, **accounting},
+        "route": "full",
+        "prediction": prediction,
+        "usage": usage,
+        "trace": telemetry.end_request()
+    }
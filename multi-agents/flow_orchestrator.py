@@ -1,9 +1,13 @@
 from promptflow import tool
+from telemetry import traced_node
 
 @tool
-def route_to_agent_5(intent: str, summary: dict, verification: dict) -> dict:
+@traced_node
+def route_to_agent_5(intent: str, summary: dict, verification: dict = None) -> dict:
     """
-    Decide se precisa do Agente 5 (Comparison) ou pula direto para Agente 6
+    Decide se precisa do Agente 5 (Comparison) ou pula direto para Agente 6.
+    Não espera o fact_checker: o comparador roda em paralelo com ele
+    (a partir do summary + chunks) e o safety junta os dois resultados.
     """
     
     if intent == "candidate_comparison":
@@ -0,0 +1,26 @@
+from promptflow import tool
+from query_router import CANNED_RESPONSES
+from telemetry import traced_node
+
+@tool
+@traced_node
+def route_by_intent(intent: str) -> dict:
+    """
+    Decide se a pergunta precisa de retrieval + agentes seguintes
+    ou se já pode ser respondida (out_of_scope etc.), no mesmo padrão do route_to_agent_5
+    """
+
+    if intent in CANNED_RESPONSES:
+        # Pula retrieval, summarizer, fact checker, comparator e safety
+        return {
+            "needs_retrieval": False,
+            "intent": intent,
+            "final_response": CANNED_RESPONSES[intent]
+        }
+    else:
+        # Segue o fluxo completo
+        return {
+            "needs_retrieval": True,
+            "intent": intent,
+            "final_response": None  # Null porque vem do safety_parser
+        }
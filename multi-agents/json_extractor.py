@@ -0,0 +1,350 @@
+"""
+Extrator de JSON tolerante, em uma passada e incremental (para saída de LLM).
+
+Aceita, sem regex globais sobre o texto inteiro:
+- texto/cercas de markdown antes e depois do objeto (```json ... ```)
+- literais Python (None/True/False) e strings com aspas simples, só em posição de valor
+  (o conteúdo das strings nunca é alterado)
+- vírgulas sobrando ou faltando, chaves sem aspas
+- escapes inválidos (\\xad, \\q) e quebras de linha cruas dentro de strings
+- saída truncada (max_tokens): fecha a string e os containers abertos
+
+Uso em stream:
+    extractor = StreamingJSONExtractor(on_value=lambda path, value: ...)
+    for token in stream:
+        extractor.feed(token)       # on_value é chamado a cada valor completo (ex: ("intent",))
+    value = extractor.close()
+
+Uso direto:
+    value, repairs = extract_json(llm_output)
+"""
+import json
+import re
+
+# Estados
+START, VALUE, KEY, COLON, AFTER_VALUE, STRING, DONE = range(7)
+
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+_STRING_RUN = {'"': re.compile(r'[^"\\]*'), "'": re.compile(r"[^'\\]*")}
+_BAREWORD = re.compile(r"[^\s,:\[\]{}\"']+")
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_HEX = re.compile(r"[0-9a-fA-F]+")
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "'": "'"}
+_LITERALS = {
+    "true": True, "false": False, "null": None,
+    "True": True, "False": False, "None": None,
+    "NaN": None, "undefined": None,
+}
+
+
+class StreamingJSONExtractor:
+    def __init__(self, on_value=None):
+        self.on_value = on_value
+        self.repairs = []          # ajustes feitos (sem repetição), na ordem em que aconteceram
+        self.truncated = False
+        self.root = None
+        self._buffer = ""
+        self._pos = 0
+        self._state = START
+        self._stack = []           # [container, chave pendente (dict) ou None]
+        self._string = None        # [partes, aspas, é_chave] da string em andamento
+        self._after_string = None  # estado para onde voltar ao fechar a string
+        self._after_comma = False  # vírgula seguida de "}" ou "]" = vírgula sobrando
+
+    # --- API ---
+
+    def feed(self, text: str):
+        """Consome mais texto; valores completos são entregues ao on_value."""
+        if not text or self._state == DONE:
+            if text and text.strip():
+                self._repair("trailing_content")
+            return
+        # Descarta o que já foi consumido (mantém memória proporcional ao token pendente)
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        self._run(final=False)
+
+    def close(self):
+        """Fim do stream: fecha string/containers abertos e devolve o valor."""
+        self._run(final=True)
+        if self._state == DONE and self._buffer[self._pos:].strip():
+            self._repair("surrounding_text")
+        if self._state == STRING:
+            self._repair("truncated")
+            self._finish_string()
+        if self._stack:
+            self._repair("truncated")
+            # Chave sem valor no fim fica de fora
+            self._stack = []
+        self._state = DONE
+        return self.root
+
+    def snapshot(self):
+        """Valor parcial até aqui (containers abertos aparecem com o que já chegou)."""
+        return self.root
+
+    # --- Máquina de estados ---
+
+    def _repair(self, name):
+        if name == "truncated":
+            self.truncated = True
+        if name not in self.repairs:
+            self.repairs.append(name)
+
+    def _run(self, final):
+        buf = self._buffer
+        n = len(buf)
+        while self._pos < n and self._state != DONE:
+            if self._state == STRING:
+                if not self._read_string(final):
+                    return
+                continue
+
+            self._pos = _WHITESPACE.match(buf, self._pos).end()
+            if self._pos >= n:
+                return
+            c = buf[self._pos]
+            state = self._state
+
+            if state == START:
+                start = self._find_start(final)
+                if start is None:
+                    return  # "[" no fim do buffer: o próximo token decide
+                if start < 0:
+                    self._pos = n
+                    return
+                if buf[self._pos:start].strip():
+                    self._repair("surrounding_text")
+                self._pos = start
+                self._state = VALUE
+                continue
+
+            if c in "}]":
+                self._close_container(c)
+                self._pos += 1
+                continue
+
+            if c == ",":
+                if state == AFTER_VALUE:
+                    self._state = KEY if isinstance(self._stack[-1][0], dict) else VALUE
+                    self._after_comma = True
+                else:
+                    self._repair("extra_comma")
+                self._pos += 1
+                continue
+
+            if c == ":":
+                if state == COLON:
+                    self._state = VALUE
+                else:
+                    self._repair("extra_colon")
+                self._pos += 1
+                continue
+
+            if state == AFTER_VALUE:
+                # Valor novo sem vírgula antes ("}\n{" entre itens, "a": 1 "b": 2)
+                self._repair("missing_comma")
+                self._state = KEY if isinstance(self._stack[-1][0], dict) else VALUE
+                continue
+
+            if state == COLON:
+                self._repair("missing_colon")
+                self._state = VALUE
+                continue
+
+            if c in "\"'":
+                if c == "'":
+                    self._repair("single_quotes")
+                self._string = [[], c, state == KEY]
+                self._after_string = state
+                self._state = STRING
+                self._pos += 1
+                continue
+
+            if state == VALUE and c in "{[":
+                self._open_container({} if c == "{" else [])
+                self._pos += 1
+                continue
+
+            if state == KEY and c in "{[":
+                self._repair("unexpected_token")
+                self._pos += 1
+                continue
+
+            m = _BAREWORD.match(buf, self._pos)
+            if m.end() >= n and not final:
+                return  # pode continuar no próximo token
+            word = m.group()
+            self._pos = m.end()
+            if state == KEY:
+                self._repair("unquoted_key")
+                self._set_key(word)
+            else:
+                self._emit(self._bareword(word))
+
+    def _find_start(self, final):
+        """
+        Início do JSON: o primeiro "{"; um "[" antes dele só vale se abrir uma lista
+        de objetos/strings (evita pegar "[1]" ou "[nota]" do texto em volta).
+        """
+        buf = self._buffer
+        brace = buf.find("{", self._pos)
+        bracket = buf.find("[", self._pos)
+        while 0 <= bracket and (brace < 0 or bracket < brace):
+            after = _WHITESPACE.match(buf, bracket + 1).end()
+            if after < len(buf) and buf[after] in "{[\"]":
+                return bracket
+            if after >= len(buf) and not final:
+                self._pos = bracket
+                return None
+            bracket = buf.find("[", bracket + 1)
+        return brace
+
+    def _read_string(self, final):
+        buf = self._buffer
+        n = len(buf)
+        parts, quote, _ = self._string
+        run = _STRING_RUN[quote]
+        while self._pos < n:
+            m = run.match(buf, self._pos)
+            if m.end() > self._pos:
+                parts.append(m.group())
+                self._pos = m.end()
+            if self._pos >= n:
+                return False
+            c = buf[self._pos]
+            if c == quote:
+                self._pos += 1
+                self._finish_string()
+                return True
+            # Barra invertida
+            if self._pos + 1 >= n:
+                if final:
+                    self._pos = n
+                return False
+            e = buf[self._pos + 1]
+            if e in _ESCAPES:
+                parts.append(_ESCAPES[e])
+                self._pos += 2
+            elif e in "ux":
+                width = 4 if e == "u" else 2
+                digits = buf[self._pos + 2:self._pos + 2 + width]
+                if len(digits) < width and not final and self._pos + 2 + width > n:
+                    return False
+                hex_match = _HEX.match(digits)
+                if hex_match and hex_match.end() == width:
+                    if e == "x":
+                        self._repair("invalid_escape")
+                    code = int(digits, 16)
+                    previous = parts[-1] if parts and len(parts[-1]) == 1 else ""
+                    if 0xDC00 <= code <= 0xDFFF and previous and 0xD800 <= ord(previous) <= 0xDBFF:
+                        # Par de surrogates (\ud83d\ude00) vira um caractere só, como no json.loads
+                        parts[-1] = chr(0x10000 + ((ord(previous) - 0xD800) << 10) + (code - 0xDC00))
+                    else:
+                        parts.append(chr(code))
+                    self._pos += 2 + width
+                else:
+                    self._repair("invalid_escape")
+                    parts.append("\\" + e)
+                    self._pos += 2
+            else:
+                # Escape desconhecido (C:\programas): mantém a barra e o caractere
+                self._repair("invalid_escape")
+                parts.append("\\" + e)
+                self._pos += 2
+        return False
+
+    def _finish_string(self):
+        parts, _, is_key = self._string
+        value = "".join(parts)
+        self._string = None
+        if is_key:
+            self._set_key(value)
+        else:
+            self._state = self._after_string
+            self._emit(value)
+
+    def _bareword(self, word):
+        if word in _LITERALS:
+            if word not in ("true", "false", "null"):
+                self._repair("python_literal")
+            return _LITERALS[word]
+        m = _NUMBER.fullmatch(word)
+        if m:
+            return float(word) if any(ch in word for ch in ".eE") else int(word)
+        self._repair("unquoted_string")
+        return word
+
+    def _set_key(self, key):
+        self._after_comma = False
+        self._stack[-1][1] = key
+        self._state = COLON
+
+    def _path(self):
+        path = []
+        for container, key in self._stack:
+            path.append(key if isinstance(container, dict) else len(container) - 1)
+        return tuple(path)
+
+    def _attach(self, value):
+        self._after_comma = False
+        if not self._stack:
+            self.root = value
+            return
+        container, key = self._stack[-1]
+        if isinstance(container, dict):
+            container[key] = value
+        else:
+            container.append(value)
+
+    def _emit(self, value):
+        self._attach(value)
+        if self.on_value:
+            self.on_value(self._path(), value)
+        self._after_value()
+
+    def _after_value(self):
+        if not self._stack:
+            self._state = DONE
+            return
+        if isinstance(self._stack[-1][0], dict):
+            self._stack[-1][1] = None
+        self._state = AFTER_VALUE
+
+    def _open_container(self, container):
+        self._attach(container)
+        self._stack.append([container, None])
+        self._state = KEY if isinstance(container, dict) else VALUE
+
+    def _close_container(self, c):
+        if not self._stack:
+            self._repair("unexpected_token")
+            return
+        if self._after_comma:
+            self._repair("trailing_comma")
+        if self._state == COLON or (self._state == VALUE and self._stack[-1][1] is not None):
+            self._repair("missing_value")
+        expected = "}" if isinstance(self._stack[-1][0], dict) else "]"
+        if c != expected:
+            self._repair("mismatched_bracket")
+        container, _ = self._stack.pop()
+        self._after_comma = False
+        if self.on_value:
+            self.on_value(self._path(), container)
+        self._after_value()
+
+
+def extract_json(text: str):
+    """Valor (ou None) e lista de ajustes feitos no texto."""
+    stripped = (text or "").strip()
+    if stripped[:1] in ("{", "["):
+        # Caminho rápido: JSON já válido sai pelo parser em C (~10x mais rápido)
+        try:
+            return json.loads(stripped), []
+        except ValueError:
+            pass
+    extractor = StreamingJSONExtractor()
+    extractor.feed(text or "")
+    value = extractor.close()
+    return value, extractor.repairs
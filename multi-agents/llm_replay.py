@@ -0,0 +1,307 @@
+"""
+Stand-in local para Azure OpenAI (chat e embeddings) e Azure AI Search: grava as
+respostas reais uma vez e depois as serve sem rede, para benchmarks e CI.
+
+- record: proxy para os serviços reais (AZURE_OPENAI_ENDPOINT, AZURE_SEARCH_ENDPOINT);
+  cada resposta vai para o fixture store com a latência medida
+- replay: responde do fixture store; pergunta não gravada -> 404 (ReplayMiss),
+  nunca sai para a rede. Latência injetada (LLM_REPLAY_LATENCY): none, recorded
+  (a gravada, vezes LLM_REPLAY_LATENCY_SCALE) ou um número fixo de ms
+
+Fixture store (LLM_REPLAY_DIR): um JSONL por nó (intent_agent.jsonl, ...,
+embedding.jsonl, search.jsonl). A chave é o hash do método, do caminho (sem
+api-version) e do corpo JSON canônico, então a mesma pergunta no mesmo prompt
+cai sempre na mesma fixture. O nó sai do header x-flow-node ou, nos chats, da
+primeira linha do system prompt (PROMPT_MARKERS).
+
+Para apontar o flow para o stand-in: api_base da aoai_connection (ou
+AZURE_OPENAI_ENDPOINT) e AZURE_SEARCH_ENDPOINT = URL do servidor.
+
+Uso:
+    python llm_replay.py record --port 8765     # e rode o flow/batch_eval apontando para http://127.0.0.1:8765
+    python llm_replay.py replay --port 8765 --latency recorded
+"""
+import hashlib
+import json
+import os
+import re
+import socket
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Configuração (Variáveis de Ambiente)
+LLM_REPLAY_DIR = os.getenv(
+    "LLM_REPLAY_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "replay")
+)
+LLM_REPLAY_LATENCY = os.getenv("LLM_REPLAY_LATENCY", "none")  # none | recorded | ms
+LLM_REPLAY_LATENCY_SCALE = float(os.getenv("LLM_REPLAY_LATENCY_SCALE", "1.0"))
+LLM_REPLAY_TIMEOUT = float(os.getenv("LLM_REPLAY_TIMEOUT", "120"))
+
+# Primeira linha do system prompt de cada nó LLM -> nome do nó
+PROMPT_MARKERS = [
+    ("intent classifier", "intent_agent"),
+    ("policy summarizer", "policy_summarizer"),
+    ("fact-checker", "fact_checker"),
+    ("political analyst", "candidate_comparator"),
+    ("safety and neutrality", "safety_neutrality_checker"),
+]
+
+# Headers repassados ao serviço real no modo record
+FORWARD_HEADERS = ("api-key", "authorization", "content-type", "accept")
+
+_API_VERSION = re.compile(r"[?&]api-version=[^&]*")
+
+
+def message_text(message) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):  # formato com partes ([{"type": "text", "text": ...}])
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def node_for_messages(messages) -> str:
+    system = " ".join(message_text(m) for m in messages if m.get("role") == "system").lower()
+    for marker, node in PROMPT_MARKERS:
+        if marker in system:
+            return node
+    return "unknown"
+
+
+def request_node(path: str, body, headers) -> str:
+    if headers.get("x-flow-node"):
+        return headers["x-flow-node"]
+    if "/embeddings" in path:
+        return "embedding"
+    if path.startswith("/indexes"):
+        return "search"
+    if isinstance(body, dict) and body.get("messages"):
+        return node_for_messages(body["messages"])
+    return "unknown"
+
+
+def request_key(method: str, path: str, raw: bytes) -> tuple:
+    """(chave, corpo JSON ou None): caminho sem api-version + corpo canônico."""
+    try:
+        body = json.loads(raw) if raw else None
+        canonical = json.dumps(body, sort_keys=True, ensure_ascii=False).encode()
+    except ValueError:
+        body, canonical = None, raw
+    digest = hashlib.sha256(method.encode() + b" " + _API_VERSION.sub("", path).encode() + b"\n" + canonical)
+    return digest.hexdigest()[:32], body
+
+
+def request_preview(body) -> str:
+    """Trecho legível da requisição (última mensagem, texto do embedding ou da busca)."""
+    if not isinstance(body, dict):
+        return ""
+    if body.get("messages"):
+        return message_text(body["messages"][-1])[-200:]
+    if body.get("input") is not None:
+        return json.dumps(body["input"], ensure_ascii=False)[:200]
+    return str(body.get("search") or "")[:200]
+
+
+# --- Fixture store ---
+
+class FixtureStore:
+    def __init__(self, path: str = LLM_REPLAY_DIR):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.load()
+
+    def load(self):
+        entries = {}
+        if os.path.isdir(self.path):
+            for name in sorted(os.listdir(self.path)):
+                if not name.endswith(".jsonl"):
+                    continue
+                with open(os.path.join(self.path, name), encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            entries[entry["key"]] = entry  # a última gravação vale
+        with self._lock:
+            self._entries = entries
+
+    def get(self, key: str):
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, entry: dict):
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, f"{entry['node']}.jsonl"), "a", encoding="utf-8") as f:
+                f.write(line)
+            self._entries[entry["key"]] = entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(Counter(entry["node"] for entry in self._entries.values()))
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# --- Servidor ---
+
+class ReplayServer:
+    """
+    Servidor local (thread) no modo record ou replay. `url` vai no api_base da
+    aoai_connection e no AZURE_SEARCH_ENDPOINT; `connections` serve para o FlowExecutor.
+    """
+
+    def __init__(self, store: FixtureStore = None, mode: str = "replay", latency=LLM_REPLAY_LATENCY,
+                 latency_scale: float = LLM_REPLAY_LATENCY_SCALE, openai_upstream: str = None,
+                 search_upstream: str = None, host: str = "127.0.0.1", port: int = 0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown replay mode: {mode}")
+        self.store = store if store is not None else FixtureStore()
+        self.mode = mode
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.upstreams = {
+            "openai": (openai_upstream or os.environ.get("AZURE_OPENAI_ENDPOINT") or "").rstrip("/"),
+            "search": (search_upstream or os.environ.get("AZURE_SEARCH_ENDPOINT") or "").rstrip("/"),
+        }
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=64))
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=64))
+        self.hits = Counter()
+        self.misses = Counter()
+        self.recorded = Counter()
+        self._lock = threading.Lock()
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                status, content_type, body = replay.handle(self.command, self.path, raw, self.headers)
+                data = body.encode() if isinstance(body, str) else body
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST
+
+            def log_message(self, *args):
+                pass
+
+        if not port:
+            with socket.socket() as s:
+                s.bind((host, 0))
+                port = s.getsockname()[1]
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def handle(self, method: str, path: str, raw: bytes, headers) -> tuple:
+        """(status, content-type, corpo) da requisição."""
+        key, body = request_key(method, path, raw)
+        node = request_node(path, body, headers)
+        if self.mode == "record":
+            return self._record(key, node, method, path, raw, body, headers)
+
+        entry = self.store.get(key)
+        if entry is None:
+            self.count(self.misses, node)
+            error = {"error": {"code": "ReplayMiss", "message": f"No fixture for {node} {method} {path} ({key})"}}
+            return 404, "application/json", json.dumps(error)
+        self.count(self.hits, node)
+        self.wait(entry)
+        return entry["status"], entry["content_type"], entry["body"]
+
+    def _record(self, key, node, method, path, raw, body, headers) -> tuple:
+        service = "search" if path.startswith("/indexes") else "openai"
+        upstream = self.upstreams[service]
+        if not upstream:
+            error = {"error": {"code": "ReplayNoUpstream", "message": f"No upstream configured for {service}"}}
+            return 502, "application/json", json.dumps(error)
+        forward = {name: headers[name] for name in FORWARD_HEADERS if headers.get(name)}
+        start = time.perf_counter()
+        r = self.session.request(method, upstream + path, data=raw, headers=forward, timeout=LLM_REPLAY_TIMEOUT)
+        latency_ms = (time.perf_counter() - start) * 1000
+        content_type = r.headers.get("Content-Type", "application/json")
+        # Só respostas de sucesso viram fixture (throttling e erros não são reproduzidos)
+        if r.status_code < 400:
+            self.store.put({
+                "key": key, "node": node, "service": service, "method": method,
+                "path": _API_VERSION.sub("", path), "status": r.status_code, "content_type": content_type,
+                "body": r.text, "latency_ms": round(latency_ms, 1), "request": request_preview(body)
+            })
+            self.count(self.recorded, node)
+        return r.status_code, content_type, r.content
+
+    def wait(self, entry: dict):
+        if self.latency in (None, "none", 0):
+            return
+        if self.latency == "recorded":
+            ms = entry.get("latency_ms", 0) * self.latency_scale
+        else:
+            ms = float(self.latency)
+        time.sleep(ms / 1000)
+
+    def count(self, counter: Counter, node: str):
+        with self._lock:
+            counter[node] += 1
+
+    def reset(self):
+        with self._lock:
+            self.hits, self.misses, self.recorded = Counter(), Counter(), Counter()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"mode": self.mode, "fixtures": self.store.stats(), "hits": dict(self.hits),
+                    "misses": dict(self.misses), "recorded": dict(self.recorded)}
+
+    @property
+    def connections(self) -> dict:
+        """Conexões do FlowExecutor apontando para o stand-in."""
+        return {"aoai_connection": {"type": "AzureOpenAIConnection", "value": {
+            "api_key": os.environ.get("AZURE_OPENAI_API_KEY") or "replay", "api_base": self.url,
+            "api_type": "azure", "api_version": os.environ.get("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
+        }}}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stand-in local de Azure OpenAI e Azure AI Search (record/replay).")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("--store", default=LLM_REPLAY_DIR, help="Diretório do fixture store")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default=LLM_REPLAY_LATENCY, help="replay: none | recorded | ms")
+    parser.add_argument("--latency-scale", type=float, default=LLM_REPLAY_LATENCY_SCALE)
+    parser.add_argument("--openai-upstream", help="record: padrão AZURE_OPENAI_ENDPOINT")
+    parser.add_argument("--search-upstream", help="record: padrão AZURE_SEARCH_ENDPOINT")
+    args = parser.parse_args()
+
+    server = ReplayServer(FixtureStore(args.store), args.mode, args.latency, args.latency_scale,
+                          args.openai_upstream, args.search_upstream, args.host, args.port)
+    print(f"🎞️ {args.mode} em {server.url} ({len(server.store)} fixtures em {args.store})")
+    print(f"   AZURE_OPENAI_ENDPOINT={server.url} AZURE_SEARCH_ENDPOINT={server.url}")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"   {server.stats()}")
+    except KeyboardInterrupt:
+        server.close()
@@ -0,0 +1,271 @@
+"""
+Índice local (em processo) sobre o mesmo schema de chunks do Azure AI Search
+(content, title, url, contentVector + metadados).
+
+Arquivos no diretório do índice:
+- vectors.npy   matriz float32 (N x dim) normalizada, aberta com memmap
+- metadata.json campos dos chunks em formato compacto (lista de linhas)
+- ivf.npz       centróides e listas invertidas da busca aproximada
+
+Busca vetorial exata (produto escalar vetorizado) ou aproximada (IVF),
+BM25 sobre o conteúdo e busca híbrida com Reciprocal Rank Fusion.
+
+Uso:
+    python local_index.py build chunks.jsonl            # JSON/JSONL com contentVector
+    python local_index.py export --index json-vetorizado  # copia o índice do Azure AI Search
+"""
+import os
+import json
+import math
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from text_utils import tokenize
+
+# Configuração (Variáveis de Ambiente)
+LOCAL_INDEX_DIR = os.getenv(
+    "LOCAL_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "local_index")
+)
+# Abaixo deste tamanho a busca exata já é sub-milissegundo; IVF só acima
+LOCAL_INDEX_IVF_MIN_ROWS = int(os.getenv("LOCAL_INDEX_IVF_MIN_ROWS", "20000"))
+LOCAL_INDEX_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", "8"))
+
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "metadata.json"
+IVF_FILE = "ivf.npz"
+
+# Campos guardados no side file (o vetor vai para a matriz)
+METADATA_FIELDS = ["id", "content", "title", "url", "filepath", "candidate", "page_number", "section"]
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _train_ivf(vectors, n_lists, iterations=10, seed=0):
+    """K-means esférico (produto escalar) para particionar os vetores em listas."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = vectors[assignments == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids = _normalize_rows(centroids)
+    assignments = np.argmax(vectors @ centroids.T, axis=1)
+
+    order = np.argsort(assignments, kind="stable").astype(np.int32)
+    offsets = np.searchsorted(assignments[order], np.arange(n_lists + 1)).astype(np.int64)
+    return centroids.astype(np.float32), order, offsets
+
+
+def build_index(records, path=LOCAL_INDEX_DIR, n_lists=None):
+    """
+    Grava o índice a partir de chunks no schema do Azure AI Search.
+    Chunks sem contentVector entram com vetor zero (só aparecem via BM25).
+    """
+    records = list(records)
+    if not records:
+        raise ValueError("No chunks to index.")
+
+    dim = next((len(r["contentVector"]) for r in records if r.get("contentVector")), 0)
+    if not dim:
+        raise ValueError("No chunk has a contentVector.")
+
+    vectors = np.zeros((len(records), dim), dtype=np.float32)
+    rows = []
+    for i, r in enumerate(records):
+        if r.get("contentVector"):
+            vectors[i] = r["contentVector"]
+        rows.append([r.get(f) for f in METADATA_FIELDS])
+    vectors = _normalize_rows(vectors)
+
+    os.makedirs(path, exist_ok=True)
+    # Grava em arquivos temporários e troca no fim: leitores nunca veem um índice pela metade
+    np.save(os.path.join(path, VECTORS_FILE + ".tmp.npy"), vectors)
+    os.replace(os.path.join(path, VECTORS_FILE + ".tmp.npy"), os.path.join(path, VECTORS_FILE))
+
+    n_lists = n_lists or max(1, int(math.sqrt(len(records))))
+    centroids, order, offsets = _train_ivf(vectors, min(n_lists, len(records)))
+    with open(os.path.join(path, IVF_FILE + ".tmp"), "wb") as f:
+        np.savez(f, centroids=centroids, order=order, offsets=offsets)
+    os.replace(os.path.join(path, IVF_FILE + ".tmp"), os.path.join(path, IVF_FILE))
+
+    with open(os.path.join(path, METADATA_FILE + ".tmp"), "w", encoding="utf-8") as f:
+        json.dump({"dim": dim, "fields": METADATA_FIELDS, "rows": rows}, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(os.path.join(path, METADATA_FILE + ".tmp"), os.path.join(path, METADATA_FILE))
+
+    return len(records)
+
+
+class LocalIndex:
+    def __init__(self, path=LOCAL_INDEX_DIR):
+        self.path = path
+        with open(os.path.join(path, METADATA_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.fields = meta["fields"]
+        self.rows = meta["rows"]
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+
+        ivf = np.load(os.path.join(path, IVF_FILE))
+        self.centroids = ivf["centroids"]
+        self.ivf_order = ivf["order"]
+        self.ivf_offsets = ivf["offsets"]
+
+        self._build_bm25()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _build_bm25(self):
+        content = self.fields.index("content")
+        title = self.fields.index("title")
+        postings = defaultdict(lambda: ([], []))
+        self.doc_len = np.zeros(len(self.rows), dtype=np.float32)
+        for doc_id, row in enumerate(self.rows):
+            terms = tokenize(f"{row[title] or ''} {row[content] or ''}")
+            self.doc_len[doc_id] = len(terms)
+            for term, tf in Counter(terms).items():
+                postings[term][0].append(doc_id)
+                postings[term][1].append(tf)
+
+        n = len(self.rows)
+        self.avg_len = float(self.doc_len.mean()) if n else 0.0
+        self.postings = {}
+        for term, (doc_ids, tfs) in postings.items():
+            idf = math.log(1 + (n - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            self.postings[term] = (np.array(doc_ids, dtype=np.int32), np.array(tfs, dtype=np.float32), idf)
+
+    def document(self, doc_id):
+        return dict(zip(self.fields, self.rows[doc_id]))
+
+    @staticmethod
+    def _top_k(ids, scores, k):
+        if len(scores) > k:
+            part = np.argpartition(-scores, k)[:k]
+            ids, scores = ids[part], scores[part]
+        order = np.argsort(-scores, kind="stable")
+        return ids[order], scores[order]
+
+    def search_vector(self, query_vector, k=5, approximate=None, nprobe=LOCAL_INDEX_NPROBE):
+        q = np.asarray(query_vector, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        if approximate is None:
+            approximate = len(self.rows) >= LOCAL_INDEX_IVF_MIN_ROWS
+
+        if not approximate:
+            scores = self.vectors @ q
+            return self._top_k(np.arange(len(scores)), scores, k)
+
+        # IVF: só varre as listas dos nprobe centróides mais próximos
+        lists = np.argsort(-(self.centroids @ q))[:nprobe]
+        ids = np.concatenate([
+            self.ivf_order[self.ivf_offsets[c]:self.ivf_offsets[c + 1]] for c in lists
+        ])
+        return self._top_k(ids, self.vectors[ids] @ q, k)
+
+    def search_bm25(self, text, k=5):
+        scores = np.zeros(len(self.rows), dtype=np.float32)
+        for term in set(tokenize(text)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            doc_ids, tfs, idf = posting
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[doc_ids] / (self.avg_len or 1.0))
+            scores[doc_ids] += idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+        hits = np.nonzero(scores)[0]
+        return self._top_k(hits, scores[hits], k)
+
+    def search(self, text, query_vector=None, k=5, approximate=None):
+        """
+        Híbrida (RRF entre vetor e BM25) quando há vetor; só BM25 caso contrário.
+        Retorna lista de (doc_id, score).
+        """
+        bm25_ids, bm25_scores = self.search_bm25(text, k * 4)
+        if query_vector is None:
+            return list(zip(bm25_ids.tolist(), bm25_scores.tolist()))[:k]
+
+        vec_ids, _ = self.search_vector(query_vector, k * 4, approximate)
+        fused = defaultdict(float)
+        for ranking in (vec_ids, bm25_ids):
+            for rank, doc_id in enumerate(ranking.tolist()):
+                fused[doc_id] += 1.0 / (RRF_K + rank + 1)
+        return sorted(fused.items(), key=lambda x: -x[1])[:k]
+
+
+def iter_index_records(path=LOCAL_INDEX_DIR):
+    """Chunks já indexados (com contentVector), para regravar o índice de forma incremental."""
+    if not os.path.exists(os.path.join(path, METADATA_FILE)):
+        return
+    index = LocalIndex(path)
+    for doc_id in range(len(index)):
+        record = index.document(doc_id)
+        record["contentVector"] = index.vectors[doc_id].tolist()
+        yield record
+
+
+# --- CACHE DO ÍNDICE CARREGADO ---
+_indexes = {}  # path -> (mtime, LocalIndex)
+_indexes_lock = threading.Lock()
+
+
+def get_local_index(path=LOCAL_INDEX_DIR) -> LocalIndex:
+    """Índice carregado uma vez por processo; recarrega quando o metadata.json muda."""
+    mtime = os.stat(os.path.join(path, METADATA_FILE)).st_mtime_ns
+    cached = _indexes.get(path)
+    if cached is None or cached[0] != mtime:
+        with _indexes_lock:
+            cached = _indexes.get(path)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, LocalIndex(path))
+                _indexes[path] = cached
+    return cached[1]
+
+
+def _read_records(filename):
+    with open(filename, encoding="utf-8") as f:
+        if filename.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def _export_azure(index_name):
+    """Lê todos os chunks (com vetor) do índice do Azure AI Search."""
+    from azure.search.documents import SearchClient
+    from azure.core.credentials import AzureKeyCredential
+
+    client = SearchClient(
+        endpoint=os.environ["AZURE_SEARCH_ENDPOINT"],
+        index_name=index_name,
+        credential=AzureKeyCredential(os.environ["AZURE_SEARCH_KEY"]),
+    )
+    return list(client.search(search_text="*", select=["content", "title", "filepath", "url", "contentVector"]))
+
+
+if __name__ == "__main__":
+    import argparse
+    from answer_cache import bump_index_version
+
+    parser = argparse.ArgumentParser(description="Constrói o índice local de chunks.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="a partir de um arquivo JSON/JSONL")
+    build.add_argument("source")
+    export = sub.add_parser("export", help="a partir do índice do Azure AI Search")
+    export.add_argument("--index", default=os.environ.get("AZURE_SEARCH_INDEX", "json-vetorizado"))
+    parser.add_argument("--out", default=LOCAL_INDEX_DIR)
+    args = parser.parse_args()
+
+    records = _read_records(args.source) if args.command == "build" else _export_azure(args.index)
+    count = build_index(records, args.out)
+    bump_index_version()
+    print(f"✅ Local index: {count} chunks em {args.out}")
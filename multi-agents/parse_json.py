@@ -1,15 +1,32 @@
 from promptflow import tool
 import json
-import re
+import logging
+
+from agent_schemas import validate
+from json_extractor import extract_json
+from simple_protection import record_parse
+from text_utils import count_tokens
+from telemetry import traced_node
+
+logger = logging.getLogger(__name__)
+
+# Trecho da saída bruta anexado quando não há JSON (antes ia o texto inteiro, 12 KB+, duas vezes)
+RAW_PREVIEW_CHARS = 300
+MAX_SCHEMA_ERRORS = 5
+
 
 @tool
-def parse_json_output(llm_output: str) -> dict:
+@traced_node
+def parse_json_output(llm_output: str, schema_name: str = None) -> dict:
     """
-    Parser exclusivo para o policy_summarizer:
+    Parser dos nós LLM:
+    - com schema_name (nós em response_format json_object): json.loads + validação
+      do schema do agente (agent_schemas.py); o json_extractor só salva o que der
+      de uma saída truncada/inválida, que conta como falha
+    - sem schema_name: json_extractor (tolerante, uma passada)
     - SEMPRE retorna "summary" como objeto válido
     - Nunca retorna summary=None
     - Nunca cria "verification"
-    - Evita JSON truncado gerar null
     """
 
     # Estrutura segura para fallback
@@ -32,35 +49,47 @@ def parse_json_output(llm_output: str) -> dict:
     if not llm_output:
         fallback["error"] = "empty_output"
         fallback["raw_output"] = llm_output
+        record_parse(True)
         return fallback
 
-    # Remove markdown fences
-    text = re.sub(r"```[a-zA-Z0-9]*", "", llm_output).strip()
-
-    # Normalize JSON
-    text = text.replace("None", "null")
-    text = text.replace("True", "true").replace("False", "false")
+    error, schema_errors, repairs = None, [], []
+    if schema_name:
+        try:
+            parsed = json.loads(llm_output)
+        except ValueError:
+            parsed, repairs = extract_json(llm_output)
+            error = "truncated_output" if "truncated" in repairs else "invalid_json"
+        if isinstance(parsed, dict):
+            schema_errors = validate(parsed, schema_name)
+            if schema_errors and not error:
+                error = "schema_validation"
+    else:
+        parsed, repairs = extract_json(llm_output)
+        if "truncated" in repairs:
+            error = "truncated_output"
 
-    # Fix single quoted keys
-    text = re.sub(r"'([^']+)':", r'"\1":', text)
-    text = re.sub(r": '([^']+)'", r': "\1"', text)
-
-    # Fix accidental merges
-    text = text.replace("}\n{", "}, {")
+    if not isinstance(parsed, dict):
+        fallback["error"] = "no_json_object"
+        fallback["raw_output"] = llm_output[:RAW_PREVIEW_CHARS]
+        fallback["raw_output_chars"] = len(llm_output)
+        stats = record_parse(True, count_tokens(llm_output))
+        logger.warning(f"Parse failure ({schema_name or 'no schema'}): no JSON object | "
+                       f"failure rate today: {stats['parse_failure_rate_today']:.1%}")
+        return fallback
 
-    # Attempt parse
-    try:
-        parsed = json.loads(text)
+    record_parse(error is not None, count_tokens(llm_output) if error else 0)
+    if error:
+        logger.warning(f"Parse failure ({schema_name or 'no schema'}): {error} {schema_errors[:1]}")
 
-        # Guarantee summary ALWAYS exists and is an object
-        if "summary" not in parsed or parsed["summary"] is None:
-            parsed["summary"] = safe_summary
+    # Guarantee summary ALWAYS exists and is an object
+    if "summary" not in parsed or parsed["summary"] is None:
+        parsed["summary"] = safe_summary
 
-        return parsed
+    if repairs:
+        parsed["parse_repairs"] = repairs
+    if schema_errors:
+        parsed["schema_errors"] = schema_errors[:MAX_SCHEMA_ERRORS]
+    if error:
+        parsed.setdefault("error", error)
 
-    except Exception as e:
-        # Safe fallback
-        fallback["error"] = str(e)
-        fallback["cleaned_text_attempt"] = text
-        fallback["raw_output"] = llm_output
-        return fallback
+    return parsed
@@ -0,0 +1,27 @@
+import logging
+from promptflow import tool
+from query_router import pre_classify, CANNED_RESPONSES
+from telemetry import traced_node
+
+logger = logging.getLogger(__name__)
+
+
+@tool
+@traced_node
+def pre_classifier(user_query: str, resolved_candidates: dict = None) -> dict:
+    """
+    Pré-classificador local (antes do primeiro LLM).
+    needs_llm=False -> intent_agent e o restante do DAG são pulados via activate,
+    e o finalize_response devolve a resposta pronta.
+    """
+    candidate_names = (resolved_candidates or {}).get("candidate_names") or []
+    result = pre_classify(user_query, candidate_names)
+    needs_llm = result["route"] == "llm"
+    if not needs_llm:
+        logger.info(f"Fast path: {result['route']} ({result['reason']})")
+    return {
+        "needs_llm": needs_llm,
+        "route": result["route"],
+        "reason": result["reason"],
+        "final_response": None if needs_llm else CANNED_RESPONSES[result["route"]]
+    }
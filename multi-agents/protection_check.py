@@ -0,0 +1,18 @@
+from promptflow import tool
+from simple_protection import simple_check
+from telemetry import telemetry
+
+
+@tool
+def protection_check(traceparent: str = None) -> dict:
+    """
+    Primeiro nó do DAG: limites globais do flow (MAX_REQUESTS_PER_DAY e
+    orçamento de custo MAX_COST_PER_DAY) antes de qualquer chamada a LLM.
+    Limites por usuário e por tier ficam no backend (identidade do JWT).
+    allowed=False -> o restante do DAG é pulado via activate e o
+    finalize_response devolve a recusa.
+    Registra o traceparent do backend (spans no mesmo trace do /chat).
+    """
+    telemetry.begin_request(traceparent)
+    with telemetry.span():
+        return simple_check()
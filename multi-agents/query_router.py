@@ -0,0 +1,93 @@
+"""
+Roteamento barato de perguntas que não precisam do DAG completo.
+
+- pre_classify(): classificador local (sem LLM), roda antes do intent_agent.
+  Só pula o LLM quando tem certeza: vocabulário claramente fora do tema
+  (futebol, culinária, ...) sem nenhum candidato ou termo eleitoral, ou só saudação.
+- CANNED_RESPONSES: respostas prontas por rota/intenção. Intenções listadas aqui
+  também pulam retrieval e os nós LLM seguintes (ver intent_router.py).
+
+Uso:
+    python query_router.py "Quem ganhou a final da Libertadores?"
+"""
+import os
+import json
+
+from text_utils import normalize_text
+
+# Configuração (Variáveis de Ambiente)
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Termos que indicam pergunta fora do tema (sempre normalizados: sem acento, minúsculos).
+# Só termos sem sentido de política municipal: chuva, clima, jogo, show, receita,
+# série, Flamengo/Botafogo (bairros), Santos (Dumont) etc. ficam de fora e vão para o LLM
+OFF_TOPIC_TERMS = frozenset("""
+futebol campeonato libertadores brasileirao placar gol gols
+fluminense vasco corinthians palmeiras gremio neymar messi
+feijoada bolo cozinhar ingredientes culinaria
+filme filmes novela netflix cantor cantora
+horoscopo signo piada piadas celebridade bbb
+""".split())
+
+# Termos eleitorais / de políticas públicas: qualquer um deles mantém a pergunta no fluxo completo
+ON_TOPIC_TERMS = frozenset("""
+candidato candidata candidatos candidatas candidatura proposta propostas programa plano planos
+eleicao eleicoes eleitoral eleitor eleitores voto votos votar urna tse campanha debate
+prefeito prefeita prefeitura vereador vereadores camara governo gestao politica politicas partido
+municipio municipal cidade rio publico publica publicos publicas
+saude educacao escola escolas transporte onibus tarifa seguranca policia economia emprego
+desemprego moradia habitacao meio ambiente saneamento orcamento imposto impostos divida
+salario salarios cultura esporte turismo favela favelas assistencia social
+""".split())
+
+GREETING_TERMS = frozenset("""
+oi ola ei bom boa dia tarde noite obrigado obrigada valeu tchau ate mais tudo bem blz e ai
+""".split())
+
+CANNED_RESPONSES = {
+    "out_of_scope": {
+        "answer": (
+            "Desculpe, eu só respondo perguntas sobre as eleições municipais do Rio de Janeiro "
+            "e as propostas dos candidatos. Você pode perguntar, por exemplo, o que um "
+            "candidato propõe para saúde, educação ou transporte."
+        ),
+        "summary_bullets": [],
+        "sources": []
+    },
+    "greeting": {
+        "answer": (
+            "Olá! Posso ajudar com informações sobre as propostas dos candidatos às eleições "
+            "municipais do Rio de Janeiro. Sobre qual candidato ou tema você quer saber?"
+        ),
+        "summary_bullets": [],
+        "sources": []
+    }
+}
+
+
+def pre_classify(user_query: str, candidate_names: list = None) -> dict:
+    """
+    route: "llm" (segue para o intent_agent), "out_of_scope" ou "greeting".
+    Na dúvida, sempre "llm": um falso positivo recusa uma pergunta legítima.
+    """
+    words = normalize_text(user_query).split()
+    if not FAST_PATH_ENABLED or not words or candidate_names:
+        return {"route": "llm", "reason": None}
+
+    terms = set(words)
+    if terms & ON_TOPIC_TERMS:
+        return {"route": "llm", "reason": None}
+
+    if terms <= GREETING_TERMS:
+        return {"route": "greeting", "reason": "greeting"}
+
+    off_topic = sorted(terms & OFF_TOPIC_TERMS)
+    if off_topic:
+        return {"route": "out_of_scope", "reason": f"off_topic_terms: {', '.join(off_topic)}"}
+
+    return {"route": "llm", "reason": None}
+
+
+if __name__ == "__main__":
+    import sys
+    print(json.dumps(pre_classify(" ".join(sys.argv[1:])), indent=2, ensure_ascii=False))
@@ -0,0 +1,318 @@
+"""
+Rate limiting com estado compartilhado entre processos e réplicas.
+
+Os contadores do SimpleProtection viviam num objeto global do processo, sem
+lock: com N workers do pf flow serve o limite diário real era N × o configurado
+e incrementos concorrentes se perdiam. Aqui o estado fica num backend
+compartilhado e cada acquire() é atômico.
+
+Limites:
+- TokenBucket(capacity, refill_per_second): rajadas até capacity, reposição contínua
+- SlidingWindow(limit, window_seconds): janela deslizante aproximada (contador da
+  janela atual + fração da anterior), O(1) por chave
+
+acquire() avalia várias regras juntas (usuário, tier, global) e é tudo ou nada:
+se uma regra nega, nenhuma consome. force=True consome mesmo assim (registrar
+custo já gasto).
+
+Backends (RATE_LIMIT_BACKEND):
+- memory: dict + lock; um processo só (testes, benchmarks)
+- sqlite: arquivo local (RATE_LIMIT_DB); BEGIN IMMEDIATE serializa todos os
+  processos que abrem o mesmo arquivo
+- redis: script Lua (RATE_LIMIT_REDIS_URL), atômico entre réplicas; qualquer
+  servidor com EVAL (Redis, Azure Cache for Redis, Valkey). Pacote redis opcional.
+
+O backend do FastAPI (backend/rate_limit.py) importa este módulo (sem dependências
+além da stdlib e do redis opcional; a imagem do backend copia o arquivo); com
+prefixos diferentes (RATE_LIMIT_PREFIX) os dois podem dividir o Redis.
+"""
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+# Configuração (Variáveis de Ambiente)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "sqlite")  # memory | sqlite | redis
+RATE_LIMIT_DB = os.getenv(
+    "RATE_LIMIT_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "rate_limits.db")
+)
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_PREFIX = os.getenv("RATE_LIMIT_PREFIX", "flow")
+
+DAY_SECONDS = 86400
+
+# Limites por tier (RATE_LIMIT_TIERS em JSON sobrescreve):
+# burst/per_minute = token bucket por usuário, per_day = janela de 24h por usuário,
+# tier_per_day = janela de 24h somando todos os usuários do tier
+DEFAULT_TIERS = {
+    "anonymous": {"burst": 3, "per_minute": 5, "per_day": 30, "tier_per_day": 2000},
+    "default": {"burst": 5, "per_minute": 10, "per_day": 200, "tier_per_day": 10000},
+    "premium": {"burst": 10, "per_minute": 30, "per_day": 1000, "tier_per_day": 20000},
+}
+TIER_LIMITS = json.loads(os.getenv("RATE_LIMIT_TIERS", "null")) or DEFAULT_TIERS
+
+Rule = namedtuple("Rule", ["key", "limit", "cost"], defaults=[1.0])
+
+
+# --- Algoritmos ---
+
+class TokenBucket:
+    """Estado: (tokens, atualizado_em)."""
+
+    kind = "bucket"
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.params = (self.capacity, self.refill_per_second)
+        # Depois disso o balde está cheio de novo e a chave pode expirar
+        self.ttl = math.ceil(self.capacity / self.refill_per_second) + 1
+
+    def apply(self, state, now: float, cost: float):
+        tokens, updated = state if state else (self.capacity, now)
+        tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.refill_per_second)
+        allowed = tokens >= cost
+        retry_after = 0.0 if allowed else (cost - tokens) / self.refill_per_second
+        return allowed, (tokens - cost, now), tokens - cost, retry_after
+
+
+class SlidingWindow:
+    """Estado: (início_da_janela, contagem_atual, contagem_anterior)."""
+
+    kind = "window"
+
+    def __init__(self, limit: float, window_seconds: float):
+        self.limit = float(limit)
+        self.window = float(window_seconds)
+        self.params = (self.limit, self.window)
+        self.ttl = math.ceil(2 * self.window) + 1
+
+    def apply(self, state, now: float, cost: float):
+        start = math.floor(now / self.window) * self.window
+        window_start, current, previous = state if state else (start, 0.0, 0.0)
+        if start != window_start:
+            previous = current if abs(start - window_start - self.window) < 1e-6 else 0.0
+            current = 0.0
+        used = previous * (1 - (now - start) / self.window) + current
+        # cost=0 consulta sem consumir: nega só se o limite já foi atingido
+        allowed = used + cost <= self.limit if cost else used < self.limit
+
+        retry_after = 0.0
+        if not allowed:
+            room = self.limit - current - cost
+            if previous > 0 and room >= 0:
+                # Quando o peso da janela anterior cair o suficiente
+                retry_after = start + (1 - room / previous) * self.window - now
+            else:
+                retry_after = start + self.window - now
+        return allowed, (start, current + cost, previous), self.limit - used - cost, max(0.0, retry_after)
+
+
+def _evaluate(rules, now, force, load):
+    """Aplica as regras sobre o estado atual; devolve (resultados, estados a gravar)."""
+    results, updates = [], []
+    for rule in rules:
+        allowed, state, remaining, retry_after = rule.limit.apply(load(rule.key), now, rule.cost)
+        results.append((allowed, remaining, retry_after))
+        updates.append((rule, state))
+    if force or all(r[0] for r in results):
+        return results, updates
+    return results, []
+
+
+# --- Backends ---
+
+class MemoryBackend:
+    def __init__(self):
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, rules, now, force=False):
+        with self._lock:
+            results, updates = _evaluate(rules, now, force, self._state.get)
+            for rule, state in updates:
+                self._state[rule.key] = state
+            return results
+
+
+class SQLiteBackend:
+    # Limpa chaves expiradas a cada N acquires
+    PURGE_EVERY = 1000
+
+    def __init__(self, db_path=RATE_LIMIT_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._calls = 0
+        db = self._connection()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "key TEXT PRIMARY KEY, state TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _connection(self):
+        # Uma conexão por thread; autocommit, a transação é aberta à mão
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            self._local.db = db
+        return db
+
+    def acquire(self, rules, now, force=False):
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            def load(key):
+                row = db.execute(
+                    "SELECT state FROM rate_limits WHERE key=? AND expires_at>?", (key, now)
+                ).fetchone()
+                return tuple(json.loads(row[0])) if row else None
+
+            results, updates = _evaluate(rules, now, force, load)
+            db.executemany(
+                "INSERT OR REPLACE INTO rate_limits (key, state, expires_at) VALUES (?, ?, ?)",
+                [(rule.key, json.dumps(state), now + rule.limit.ttl) for rule, state in updates]
+            )
+            self._calls += 1
+            if self._calls % self.PURGE_EVERY == 0:
+                db.execute("DELETE FROM rate_limits WHERE expires_at<=?", (now,))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return results
+
+
+# Mesmo algoritmo de TokenBucket.apply / SlidingWindow.apply, dentro do Redis.
+# KEYS = chaves; ARGV = now, force, e por chave: kind, a, b, cost, ttl
+_REDIS_SCRIPT = """
+local now = tonumber(ARGV[1])
+local force = ARGV[2] == '1'
+local out, states, all_ok = {}, {}, true
+for i, key in ipairs(KEYS) do
+  local j = 2 + (i - 1) * 5
+  local kind, a, b, cost = ARGV[j + 1], tonumber(ARGV[j + 2]), tonumber(ARGV[j + 3]), tonumber(ARGV[j + 4])
+  local s = {}
+  local raw = redis.call('GET', key)
+  if raw then for v in string.gmatch(raw, '[^,]+') do s[#s + 1] = tonumber(v) end end
+  local ok, remaining, retry = false, 0, 0
+  if kind == 'bucket' then
+    local tokens, updated = a, now
+    if raw then tokens, updated = s[1], s[2] end
+    tokens = math.min(a, tokens + math.max(0, now - updated) * b)
+    ok = tokens >= cost
+    if not ok then retry = (cost - tokens) / b end
+    remaining = tokens - cost
+    states[i] = string.format('%.17g,%.17g', tokens - cost, now)
+  else
+    local start = math.floor(now / b) * b
+    local ws, current, previous = start, 0, 0
+    if raw then ws, current, previous = s[1], s[2], s[3] end
+    if start ~= ws then
+      if math.abs(start - ws - b) < 1e-6 then previous = current else previous = 0 end
+      current = 0
+    end
+    local used = previous * (1 - (now - start) / b) + current
+    if cost > 0 then ok = used + cost <= a else ok = used < a end
+    if not ok then
+      local room = a - current - cost
+      if previous > 0 and room >= 0 then retry = start + (1 - room / previous) * b - now else retry = start + b - now end
+      if retry < 0 then retry = 0 end
+    end
+    remaining = a - used - cost
+    states[i] = string.format('%.17g,%.17g,%.17g', start, current + cost, previous)
+  end
+  all_ok = all_ok and ok
+  out[#out + 1] = ok and 1 or 0
+  out[#out + 1] = tostring(remaining)
+  out[#out + 1] = tostring(retry)
+end
+if all_ok or force then
+  for i, key in ipairs(KEYS) do
+    redis.call('SET', key, states[i], 'EX', ARGV[2 + i * 5])
+  end
+end
+return out
+"""
+
+
+class RedisBackend:
+    def __init__(self, url=RATE_LIMIT_REDIS_URL):
+        import redis  # opcional: só quando RATE_LIMIT_BACKEND=redis
+        self.client = redis.Redis.from_url(url)
+        self._script = self.client.register_script(_REDIS_SCRIPT)
+
+    def acquire(self, rules, now, force=False):
+        args = [now, "1" if force else "0"]
+        for rule in rules:
+            args += [rule.limit.kind, *rule.limit.params, rule.cost, rule.limit.ttl]
+        raw = self._script(keys=[rule.key for rule in rules], args=args)
+        return [(bool(raw[i]), float(raw[i + 1]), float(raw[i + 2])) for i in range(0, len(raw), 3)]
+
+
+def create_backend(name: str = RATE_LIMIT_BACKEND):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SQLiteBackend()
+    if name == "redis":
+        return RedisBackend()
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {name}")
+
+
+# --- Limiter ---
+
+class RateLimiter:
+    def __init__(self, backend=None, prefix: str = RATE_LIMIT_PREFIX):
+        self.backend = backend or create_backend()
+        self.prefix = prefix
+        self._lock = threading.Lock()
+
+        # Métricas (deste processo)
+        self.allowed = 0
+        self.denied = 0
+
+    def acquire(self, rules, force: bool = False) -> dict:
+        """Consome as regras juntas (tudo ou nada, salvo force)."""
+        scoped = [Rule(f"{self.prefix}:{rule.key}", rule.limit, rule.cost) for rule in rules]
+        results = self.backend.acquire(scoped, time.time(), force)
+        denied = [(rule, result) for rule, result in zip(rules, results) if not result[0]]
+        allowed = force or not denied
+        with self._lock:
+            if allowed:
+                self.allowed += 1
+            else:
+                self.denied += 1
+        return {
+            "allowed": allowed,
+            "remaining": {rule.key: round(result[1], 4) for rule, result in zip(rules, results)},
+            "retry_after": round(max((r[2] for _, r in denied), default=0.0), 3),
+            "denied_by": denied[0][0].key if denied else None
+        }
+
+    def stats(self) -> dict:
+        return {"backend": type(self.backend).__name__, "allowed": self.allowed, "denied": self.denied}
+
+
+def tier_limits(user_tier: str):
+    """(nome do tier, limites); tier desconhecido cai em "default"."""
+    if user_tier in TIER_LIMITS:
+        return user_tier, TIER_LIMITS[user_tier]
+    return "default", TIER_LIMITS["default"]
+
+
+def request_rules(user_id: str = None, user_tier: str = "default") -> list:
+    """Regras de uma requisição: por usuário (se conhecido) e por tier."""
+    tier, limits = tier_limits(user_tier)
+    rules = []
+    if user_id:
+        rules += [
+            Rule(f"user:{user_id}:burst", TokenBucket(limits["burst"], limits["per_minute"] / 60)),
+            Rule(f"user:{user_id}:day", SlidingWindow(limits["per_day"], DAY_SECONDS)),
+        ]
+    rules.append(Rule(f"tier:{tier}:day", SlidingWindow(limits["tier_per_day"], DAY_SECONDS)))
+    return rules
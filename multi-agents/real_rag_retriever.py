@@ -1,5 +1,7 @@
 import os
 import logging
+import threading
+import time
 import warnings
 from typing import cast
 from promptflow.core import tool
@@ -7,12 +9,155 @@ from promptflow.connections import AzureOpenAIConnection, CognitiveSearchConnect
 from azure.search.documents import SearchClient
 from azure.search.documents.models import VectorizedQuery
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError
 import openai
 import requests
+from requests.adapters import HTTPAdapter
+from embedding_cache import embedding_cache, EMBEDDING_CACHE_ENABLED
+from local_index import get_local_index
+from usage_tracker import record_usage
+from telemetry import span, traced_node
+from opentelemetry.trace import SpanKind
 
 logger = logging.getLogger(__name__)
 
+# --- CLIENTES COMPARTILHADOS ---
+# Criados uma vez por processo e reaproveitados entre execuções do flow
+# (mantém conexões TCP/TLS abertas em vez de um handshake novo por pergunta)
+HTTP_POOL_SIZE = int(os.getenv("RAG_HTTP_POOL_SIZE", "20"))
+# Campos lidos do índice, incluindo os do chunker (candidate, section, page_number; criados pelo echo.py)
+SEARCH_SELECT = os.getenv("RAG_SEARCH_SELECT", "content,title,filepath,url,candidate,section,page_number").split(",")
+# Campos que todo índice tem: fallback quando o select é rejeitado (índice ainda não migrado pelo echo.py)
+BASE_SEARCH_SELECT = ["content", "title", "filepath", "url"]
+
+_clients_lock = threading.Lock()
+_http_session = None
+_search_clients = {}  # (endpoint, index, key) -> SearchClient
+_search_selects = {}  # (endpoint, index) -> select que o índice aceita
+_openai_clients = {}  # (endpoint, api_version, key) -> AzureOpenAI
+
+
+def get_http_session() -> requests.Session:
+    global _http_session
+    if _http_session is None:
+        with _clients_lock:
+            if _http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _http_session = session
+    return _http_session
+
+
+def get_search_client(endpoint: str, index_name: str, key: str) -> SearchClient:
+    # A chave entra no cache key: uma chave rotacionada gera um cliente novo
+    cache_key = (endpoint, index_name, key)
+    client = _search_clients.get(cache_key)
+    if client is None:
+        with _clients_lock:
+            client = _search_clients.get(cache_key)
+            if client is None:
+                client = SearchClient(
+                    endpoint=endpoint,
+                    index_name=index_name,
+                    credential=AzureKeyCredential(key),
+                )
+                _search_clients[cache_key] = client
+    return client
+
+
+def get_openai_client(config: dict) -> openai.AzureOpenAI:
+    cache_key = (config["api_base"], config["api_version"], config["api_key"])
+    client = _openai_clients.get(cache_key)
+    if client is None:
+        with _clients_lock:
+            client = _openai_clients.get(cache_key)
+            if client is None:
+                client = openai.AzureOpenAI(
+                    api_key=config["api_key"],
+                    api_version=config["api_version"],
+                    azure_endpoint=config["api_base"]
+                )
+                _openai_clients[cache_key] = client
+    return client
+
+
+def resolve_openai_config(openai_connection) -> dict:
+    """Credenciais do OpenAI: conexão do Prompt Flow com fallback para variáveis de ambiente."""
+    api_key = getattr(openai_connection, "api_key", None) or os.environ.get("AZURE_OPENAI_API_KEY")
+    api_base = getattr(openai_connection, "api_base", None) or os.environ.get("AZURE_OPENAI_ENDPOINT")
+    api_version = getattr(openai_connection, "api_version", None) or os.environ.get("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
+
+    if not api_key or not api_base:
+        raise ValueError("Missing OpenAI connection info.")
+
+    return {
+        "api_key": api_key,
+        "api_base": api_base,
+        "api_version": api_version,
+        "deployment": os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-small"),
+    }
+
+
+def embed_query(text: str, config: dict):
+    """
+    Embedding da query (REST, com SDK como fallback). Retorna None em caso de falha.
+    Consulta antes o cache de embeddings (query normalizada + deployment).
+    """
+    if EMBEDDING_CACHE_ENABLED:
+        cached = embedding_cache.get(text, config["deployment"])
+        if cached is not None:
+            return cached
+
+    query_vector = None
+    try:
+        url = f"{config['api_base'].rstrip('/')}/openai/deployments/{config['deployment']}/embeddings?api-version={config['api_version']}"
+        headers = {"Content-Type": "application/json", "api-key": config["api_key"]}
+        payload = {"input": [text]}
+        
+        with span("embedding", kind=SpanKind.CLIENT, **{"gen_ai.request.model": config["deployment"]}):
+            start = time.perf_counter()
+            r = get_http_session().post(url, headers=headers, json=payload, timeout=30)
+            r.raise_for_status()
+
+            body = r.json().get("body") or r.json()
+            record_usage(config["deployment"], (body.get("usage") or {}).get("prompt_tokens", 0),
+                         latency_ms=(time.perf_counter() - start) * 1000, kind="embedding")
+        items = body.get("data", [])
+        if items:
+            query_vector = items[0].get("embedding")
+    except Exception as e:
+        logger.warning(f"Embedding error: {e}")
+        # Tenta SDK como fallback
+        try:
+            client = get_openai_client(config)
+            embed_resp = client.embeddings.create(
+                model=config["deployment"],
+                input=[text]
+            )
+            query_vector = embed_resp.data[0].embedding
+        except Exception as sdk_e:
+            logger.error(f"SDK fallback failed: {sdk_e}")
+
+    if EMBEDDING_CACHE_ENABLED and query_vector:
+        embedding_cache.put(text, config["deployment"], query_vector)
+    return query_vector
+
+
+def embed_batch(texts: list, config: dict) -> list:
+    """Embeddings de vários textos em uma chamada (ingestão). Levanta exceção em caso de falha."""
+    url = f"{config['api_base'].rstrip('/')}/openai/deployments/{config['deployment']}/embeddings?api-version={config['api_version']}"
+    headers = {"Content-Type": "application/json", "api-key": config["api_key"]}
+    r = get_http_session().post(url, headers=headers, json={"input": texts}, timeout=60)
+    r.raise_for_status()
+    body = r.json().get("body") or r.json()
+    items = sorted(body.get("data", []), key=lambda item: item.get("index", 0))
+    return [item["embedding"] for item in items]
+
+
 @tool
+@traced_node
 def real_rag_retriever(
     original_query: str,
     intent: str,
@@ -20,10 +165,12 @@ def real_rag_retriever(
     openai_connection: AzureOpenAIConnection,
     index_name: str,
     search_connection: object = None, # Opcional
-    top_k: int = 5
+    top_k: int = 5,
+    retrieval_backend: str = "azure"
 ) -> dict:
     """
     RAG real: busca documentos no Azure AI Search usando vetores.
+    retrieval_backend="local" usa o índice em processo (local_index.py), sem rede na busca.
     """
 
     # 0. Proteção de input
@@ -37,45 +184,31 @@ def real_rag_retriever(
         }
 
     # 1. Resolver credenciais do OpenAI
-    openai_api_key = openai_connection.api_key or os.environ.get("AZURE_OPENAI_API_KEY")
-    openai_api_base = openai_connection.api_base or os.environ.get("AZURE_OPENAI_ENDPOINT")
-    openai_api_version = openai_connection.api_version or os.environ.get("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
-
-    if not openai_api_key or not openai_api_base:
-        raise ValueError("Missing OpenAI connection info.")
-
-    embeddings_deployment = os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-small")
+    try:
+        openai_config = resolve_openai_config(openai_connection)
+    except ValueError:
+        # O índice local funciona só com BM25 quando não há OpenAI configurado
+        if retrieval_backend != "local":
+            raise
+        openai_config = None
 
     # 2. Gerar Embeddings (REST ou SDK)
-    query_vector = None
-    try:
-        url = f"{openai_api_base.rstrip('/')}/openai/deployments/{embeddings_deployment}/embeddings?api-version={openai_api_version}"
-        headers = {"Content-Type": "application/json", "api-key": openai_api_key}
-        payload = {"input": [original_query]}
-        
-        r = requests.post(url, headers=headers, json=payload, timeout=30)
-        r.raise_for_status()
-        
-        body = r.json().get("body") or r.json()
-        items = body.get("data", [])
-        if items:
-            query_vector = items[0].get("embedding")
-    except Exception as e:
-        logger.warning(f"Embedding error: {e}")
-        # Tenta SDK como fallback
+    query_vector = embed_query(original_query, openai_config) if openai_config else None
+
+    if retrieval_backend == "local":
         try:
-            client = openai.AzureOpenAI(
-                api_key=openai_api_key,
-                api_version=openai_api_version,
-                azure_endpoint=openai_api_base
-            )
-            embed_resp = client.embeddings.create(
-                model=embeddings_deployment,
-                input=[original_query]
-            )
-            query_vector = embed_resp.data[0].embedding
-        except Exception as sdk_e:
-            logger.error(f"SDK fallback failed: {sdk_e}")
+            with span("search", **{"search.backend": "local"}):
+                results = local_search(original_query, query_vector, top_k)
+        except Exception as e:
+            logger.error(f"Local search failed: {e}")
+            return {
+                "intent": intent,
+                "entities": entities,
+                "original_query": original_query,
+                "retrieved_chunks": [],
+                "error": str(e)
+            }
+        return format_results(intent, entities, original_query, results)
 
     # 3. Configurar Search Client (CORREÇÃO DO ERRO)
     # Inicializa variáveis com None para evitar NameError
@@ -94,32 +227,35 @@ def real_rag_retriever(
     if not search_endpoint or not search_key or not resolved_index:
         raise ValueError(f"Missing Azure Search config. Endpoint: {search_endpoint}, Key: {'***' if search_key else 'None'}")
 
-    search_client = SearchClient(
-        endpoint=str(search_endpoint),
-        index_name=str(resolved_index),
-        credential=AzureKeyCredential(str(search_key)),
-    )
+    search_client = get_search_client(str(search_endpoint), str(resolved_index), str(search_key))
 
     # 4. Busca
-    try:
+    def search(select):
+        kwargs = {"search_text": original_query, "select": select, "top": top_k}
         if query_vector:
-            vector_query = VectorizedQuery(
+            kwargs["vector_queries"] = [VectorizedQuery(
                 vector=cast(list[float], query_vector),
                 k_nearest_neighbors=top_k,
                 fields="contentVector"
-            )
-            results = search_client.search(
-                search_text=original_query,
-                vector_queries=[vector_query],
-                select=["content", "title", "filepath", "url"],
-                top=top_k
-            )
-        else:
-            results = search_client.search(
-                search_text=original_query,
-                select=["content", "title", "filepath", "url"],
-                top=top_k
-            )
+            )]
+        # A busca é preguiçosa: a requisição só acontece ao iterar
+        return list(search_client.search(**kwargs))
+
+    index_key = (str(search_endpoint), str(resolved_index))
+    select = _search_selects.get(index_key, SEARCH_SELECT)
+    try:
+        with span("search", kind=SpanKind.CLIENT, **{"search.backend": "azure", "search.index": resolved_index}):
+            try:
+                results = search(select)
+            except HttpResponseError as e:
+                # Campo do select que não existe no índice: 400; repete só com os campos base
+                if e.status_code != 400 or set(select) <= set(BASE_SEARCH_SELECT):
+                    raise
+                logger.warning(f"Search select rejected by index '{resolved_index}', "
+                               f"retrying with {','.join(BASE_SEARCH_SELECT)}: {e.message}")
+                select = [field for field in select if field in BASE_SEARCH_SELECT] or BASE_SEARCH_SELECT
+                results = search(select)
+                _search_selects[index_key] = select
     except Exception as e:  
         logger.error(f"Search failed: {e}")
         return {
@@ -131,15 +267,35 @@ def real_rag_retriever(
         }
 
     # 5. Formatar Resultados
+    return format_results(intent, entities, original_query, results)
+
+
+def local_search(original_query: str, query_vector, top_k: int) -> list:
+    """Busca híbrida no índice local; devolve documentos no formato do Azure AI Search."""
+    index = get_local_index()
+    results = []
+    for doc_id, score in index.search(original_query, query_vector, top_k):
+        doc = index.document(doc_id)
+        doc["@search.score"] = score
+        results.append(doc)
+    return results
+
+
+def format_results(intent, entities, original_query, results) -> dict:
     retrieved_chunks = []
     for result in results:
-        retrieved_chunks.append({
+        chunk = {
             "content": result.get("content", ""),
             "source": result.get("title") or result.get("filepath") or "unknown",
             "url": result.get("url"),
-            "page_number": result.get("page_number", "N/A"),
+            "page_number": result.get("page_number") or "N/A",
             "relevance_score": result.get("@search.score", 0)
-        })
+        }
+        # Metadados do chunker (índices novos), em campos próprios em vez de texto repetido
+        for field in ("candidate", "section"):
+            if result.get(field):
+                chunk[field] = result[field]
+        retrieved_chunks.append(chunk)
 
     return {
         "intent": intent,
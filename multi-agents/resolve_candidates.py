@@ -0,0 +1,15 @@
+from promptflow import tool
+from candidate_resolver import resolver
+from telemetry import traced_node
+
+
+@tool
+@traced_node
+def resolve_candidates(user_query: str) -> dict:
+    """
+    Resolve nomes, apelidos, siglas de partido e erros de digitação para os nomes
+    canônicos dos candidatos, antes do intent_agent (que não precisa mais da tabela de apelidos).
+    """
+    result = resolver.resolve(user_query or "")
+    result["valid_candidates"] = resolver.names
+    return result
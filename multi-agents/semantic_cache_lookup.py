@@ -0,0 +1,37 @@
+import logging
+from promptflow import tool
+from promptflow.connections import AzureOpenAIConnection
+from answer_cache import answer_cache, ANSWER_CACHE_ENABLED
+from real_rag_retriever import resolve_openai_config, embed_query
+from telemetry import traced_node
+
+logger = logging.getLogger(__name__)
+
+
+@tool
+@traced_node
+def semantic_cache_lookup(
+    user_query: str,
+    intent: str,
+    entities: dict,
+    openai_connection: AzureOpenAIConnection = None,
+    use_embeddings: bool = False
+) -> dict:
+    """
+    Camada semântica do cache: mesma intenção + entidades resolvidas e,
+    com use_embeddings, similaridade de embedding da query acima do threshold.
+    """
+    miss = {"hit": False, "tier": None, "final_response": None, "tokens_saved": 0, "query_vector": None}
+    if not ANSWER_CACHE_ENABLED or not user_query or intent == "out_of_scope":
+        return miss
+
+    query_vector = None
+    if use_embeddings:
+        try:
+            query_vector = embed_query(user_query, resolve_openai_config(openai_connection))
+        except ValueError as e:
+            logger.warning(f"Semantic cache without embeddings: {e}")
+
+    result = answer_cache.get_semantic(user_query, intent, entities, query_vector)
+    result["query_vector"] = query_vector
+    return result
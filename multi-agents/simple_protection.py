@@ -2,58 +2,133 @@ from promptflow import tool
 from datetime import datetime, timedelta
 from typing import Dict
 import os
+import threading
+
+from rate_limiter import DAY_SECONDS, RateLimiter, Rule, SlidingWindow
+
+# Configuração (Variáveis de Ambiente)
+PROTECTION_ENABLED = os.getenv("PROTECTION_ENABLED", "true").lower() in ("1", "true", "yes")
 
 class SimpleProtection:
-    """Proteção minimalista para desenvolvimento"""
+    """
+    Proteção minimalista para desenvolvimento.
+    Os limites (requisições e custo) ficam no rate_limiter, compartilhados entre
+    workers; os contadores abaixo são só métricas deste processo.
+    """
+
+    COST_KEY = "global:cost:day"
     
-    def __init__(self):
-        # Contador simples em memória
+    def __init__(self, limiter: RateLimiter = None):
+        self.limiter = limiter or RateLimiter()
+        self._lock = threading.Lock()
+
+        # Métricas deste processo
         self.requests_today = 0
         self.total_cost_today = 0.0
         self.last_reset = datetime.utcnow().date()
+
+        # Cache de respostas (answer_cache.py)
+        self.cache_lookups_today = 0
+        self.cache_hits_today = 0
+        self.tokens_saved_today = 0
+        self.cost_saved_today = 0.0
+
+        # Parse das saídas dos agentes (parse_json.py)
+        self.parses_today = 0
+        self.parse_failures_today = 0
+        self.parse_tokens_wasted_today = 0
         
         # Limites super simples
         self.MAX_REQUESTS_PER_DAY = int(os.getenv("MAX_REQUESTS_PER_DAY", "200"))
         self.MAX_COST_PER_DAY = float(os.getenv("MAX_COST_PER_DAY", "5.0"))
-    
-    def check_and_increment(self) -> Dict:
-        """Verifica limites e incrementa contador"""
-        
-        # Reset diário
+        self._requests_rule = Rule("global:requests:day", SlidingWindow(self.MAX_REQUESTS_PER_DAY, DAY_SECONDS))
+        self._cost_limit = SlidingWindow(self.MAX_COST_PER_DAY, DAY_SECONDS)
+
+    def _reset_if_new_day(self):
         today = datetime.utcnow().date()
         if today > self.last_reset:
             self.requests_today = 0
             self.total_cost_today = 0.0
+            self.cache_lookups_today = 0
+            self.cache_hits_today = 0
+            self.tokens_saved_today = 0
+            self.cost_saved_today = 0.0
+            self.parses_today = 0
+            self.parse_failures_today = 0
+            self.parse_tokens_wasted_today = 0
             self.last_reset = today
-        
-        # Verifica limites
-        if self.requests_today >= self.MAX_REQUESTS_PER_DAY:
-            return {
-                "allowed": False,
-                "reason": f"Daily limit reached ({self.MAX_REQUESTS_PER_DAY} requests/day)"
-            }
-        
-        if self.total_cost_today >= self.MAX_COST_PER_DAY:
-            return {
-                "allowed": False,
-                "reason": f"Daily cost limit reached (${self.MAX_COST_PER_DAY}/day)"
-            }
-        
-        # Incrementa
-        self.requests_today += 1
-        
+
+    def check_and_increment(self) -> Dict:
+        """
+        Verifica limites e incrementa contador (atômico no backend do rate_limiter):
+        total diário e orçamento de custo. Limites por usuário e por tier ficam no
+        backend (backend/rate_limit.py), que conhece a identidade assinada (JWT ou
+        IP); o session_id do payload é escolhido pelo cliente e não serve de chave.
+        """
+        # Custo 0: só confere o orçamento; o gasto entra depois via record_cost
+        cost_rule = Rule(self.COST_KEY, self._cost_limit, 0.0)
+        result = self.limiter.acquire([self._requests_rule, cost_rule])
+
+        if not result["allowed"]:
+            if result["denied_by"] == cost_rule.key:
+                reason = f"Daily cost limit reached (${self.MAX_COST_PER_DAY}/day)"
+            else:
+                reason = f"Daily limit reached ({self.MAX_REQUESTS_PER_DAY} requests/day)"
+            return {"allowed": False, "reason": reason, "retry_after": result["retry_after"]}
+
+        with self._lock:
+            self._reset_if_new_day()
+            self.requests_today += 1
+
+        remaining = result["remaining"]
+        cost_remaining = remaining[cost_rule.key]
         return {
             "allowed": True,
             "requests_today": self.requests_today,
-            "requests_remaining": self.MAX_REQUESTS_PER_DAY - self.requests_today,
-            "cost_today": round(self.total_cost_today, 2),
-            "cost_remaining": round(self.MAX_COST_PER_DAY - self.total_cost_today, 2)
+            "requests_remaining": int(remaining[self._requests_rule.key]),
+            "cost_today": round(self.MAX_COST_PER_DAY - cost_remaining, 2),
+            "cost_remaining": round(cost_remaining, 2),
+            "limits_remaining": remaining
         }
     
     def record_cost(self, cost_usd: float):
-        """Registra custo"""
-        self.total_cost_today += cost_usd
-        print(f"💰 Cost: ${cost_usd:.4f} | Today: ${self.total_cost_today:.2f}")
+        """Registra custo (sempre consome o orçamento compartilhado: já foi gasto)"""
+        if cost_usd:
+            self.limiter.acquire([Rule(self.COST_KEY, self._cost_limit, cost_usd)], force=True)
+        with self._lock:
+            self._reset_if_new_day()
+            self.total_cost_today += cost_usd
+
+    def record_cache(self, hit: bool, saved_tokens: int = 0, saved_cost_usd: float = 0.0):
+        """Registra uma consulta ao cache de respostas"""
+        with self._lock:
+            self._reset_if_new_day()
+            self.cache_lookups_today += 1
+            if hit:
+                self.cache_hits_today += 1
+                self.tokens_saved_today += saved_tokens
+                self.cost_saved_today += saved_cost_usd
+
+    def record_parse(self, failed: bool, wasted_tokens: int = 0):
+        """Registra o parse de uma saída de LLM (falha = chamada desperdiçada)"""
+        with self._lock:
+            self._reset_if_new_day()
+            self.parses_today += 1
+            if failed:
+                self.parse_failures_today += 1
+                self.parse_tokens_wasted_today += wasted_tokens
+
+    @property
+    def parse_failure_rate(self) -> float:
+        if not self.parses_today:
+            return 0.0
+        return self.parse_failures_today / self.parses_today
+
+    @property
+    def cache_hit_rate(self) -> float:
+        if not self.cache_lookups_today:
+            return 0.0
+        return self.cache_hits_today / self.cache_lookups_today
 
 
 # Instância global
@@ -62,18 +137,60 @@ _protection = SimpleProtection()
 
 @tool
 def simple_check() -> dict:
-    """Tool para Prompt Flow - verifica limites simples"""
+    """Tool para Prompt Flow - verifica os limites globais (requisições/dia e custo)"""
+    if not PROTECTION_ENABLED:
+        return {"allowed": True}
     return _protection.check_and_increment()
 
 
 @tool
-def simple_cost_track(total_tokens: int, avg_cost_per_1k: float = 0.006) -> dict:
-    """Tool para Prompt Flow - tracking simples de custo"""
-    estimated_cost = (total_tokens / 1000) * avg_cost_per_1k
+def simple_cost_track(
+    total_tokens: int,
+    avg_cost_per_1k: float = 0.006,
+    cache_hit: bool = None,
+    saved_tokens: int = 0,
+    cost_usd: float = None,
+    saved_cost_usd: float = 0.0
+) -> dict:
+    """
+    Tool para Prompt Flow - tracking de custo (e do cache de respostas, se informado).
+    cost_usd: custo real da requisição (usage_tracker); sem ele, estima por avg_cost_per_1k
+    saved_cost_usd: custo real (usage_tracker) da requisição que gerou a resposta do cache
+    """
+    estimated_cost = (total_tokens / 1000) * avg_cost_per_1k if cost_usd is None else cost_usd
     _protection.record_cost(estimated_cost)
-    
-    return {
+
+    result = {
         "tokens": total_tokens,
-        "estimated_cost": round(estimated_cost, 4),
-        "cost_today": round(_protection.total_cost_today, 2)
-    }
\ No newline at end of file
+        "estimated_cost": round(estimated_cost, 6),
+        "cost_today": round(_protection.total_cost_today, 4)
+    }
+
+    if cache_hit is not None:
+        _protection.record_cache(cache_hit, saved_tokens, saved_cost_usd if cache_hit else 0.0)
+        result.update({
+            "cache_hit": cache_hit,
+            "tokens_saved": saved_tokens if cache_hit else 0,
+            "cache_hit_rate_today": round(_protection.cache_hit_rate, 4),
+            "tokens_saved_today": _protection.tokens_saved_today,
+            "cost_saved_usd": round(saved_cost_usd, 6) if cache_hit else 0.0,
+            "cost_saved_today": round(_protection.cost_saved_today, 6)
+        })
+
+    if _protection.parses_today:
+        result.update({
+            "parse_failure_rate_today": round(_protection.parse_failure_rate, 4),
+            "parse_tokens_wasted_today": _protection.parse_tokens_wasted_today
+        })
+
+    return result
+
+
+def record_parse(failed: bool, wasted_tokens: int = 0) -> dict:
+    """Contabiliza o parse de uma saída de agente; usado pelo parse_json.py"""
+    _protection.record_parse(failed, wasted_tokens)
+    return {
+        "parse_failures_today": _protection.parse_failures_today,
+        "parse_failure_rate_today": round(_protection.parse_failure_rate, 4),
+        "parse_tokens_wasted_today": _protection.parse_tokens_wasted_today
+    }
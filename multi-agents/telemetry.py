@@ -0,0 +1,225 @@
+"""
+Tracing dos nós do flow com spans OpenTelemetry.
+
+O backend manda um `traceparent` (W3C) no payload do /score; o primeiro nó
+(protection_check) registra esse contexto para a requisição (begin_request)
+e todos os spans da requisição viram filhos dele, no mesmo trace do /chat:
+- nós Python: decorator @traced_node (span com o nome do nó)
+- nós LLM: a chamada ao SDK openai (usage_tracker), com os tokens no span
+- etapas internas: span("embedding"), span("search")
+
+O finalize_response fecha a requisição (end_request) e devolve a duração de
+cada etapa; o backend junta essas durações ao seu p50/p95/p99 por etapa.
+
+Exportador (TRACE_EXPORTER): console | jsonl (TRACE_FILE) | otlp (variáveis
+OTEL_EXPORTER_OTLP_*) | none. O TracerProvider é próprio (não o global), para
+não se misturar com o tracing interno do Prompt Flow.
+"""
+import functools
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor, SpanExporter, SpanExportResult
+)
+from opentelemetry.trace import SpanKind
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+
+# Configuração (Variáveis de Ambiente)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")  # console | jsonl | otlp | none
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "civic-flow")
+
+# Requisições abertas (nó falhou antes do finalize_response)
+MAX_PENDING_REQUESTS = 1000
+
+_propagator = TraceContextTextMapPropagator()
+
+
+# --- Contexto do Prompt Flow ---
+
+def current_context():
+    """(id da requisição, nó) da chamada atual; fora do Prompt Flow: (None, None)."""
+    try:
+        from promptflow.tracing._operation_context import OperationContext
+        from promptflow.tracing._tracer import get_node_name_from_context
+        request_id = OperationContext.get_instance().get("root_run_id")
+        node = get_node_name_from_context()
+    except Exception:
+        return None, None
+    if node is None:
+        # Com o tracing desligado (padrão do pf flow serve) o nó só está no contexto
+        # do NodeLogWriter que o executor instala em sys.stdout durante o nó
+        context = getattr(sys.stdout, "_context", None)
+        info = context.get() if context is not None else None
+        node = getattr(info, "node_name", None)
+    return request_id, node
+
+
+# --- Exportadores ---
+
+def span_to_dict(span) -> dict:
+    """Span no formato OTLP/JSON simplificado (uma linha por span)."""
+    context = span.get_span_context()
+    return {
+        "trace_id": format(context.trace_id, "032x"),
+        "span_id": format(context.span_id, "016x"),
+        "parent_span_id": format(span.parent.span_id, "016x") if span.parent else None,
+        "name": span.name,
+        "kind": span.kind.name,
+        "start_time_unix_nano": span.start_time,
+        "end_time_unix_nano": span.end_time,
+        "duration_ms": round((span.end_time - span.start_time) / 1e6, 3),
+        "status": span.status.status_code.name,
+        "attributes": dict(span.attributes or {}),
+        "service": span.resource.attributes.get("service.name"),
+    }
+
+
+class JsonlSpanExporter(SpanExporter):
+    def __init__(self, path=TRACE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        lines = "".join(json.dumps(span_to_dict(s), ensure_ascii=False) + "\n" for s in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+class MemorySpanExporter(SpanExporter):
+    """Guarda os spans (testes e benchmarks)."""
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(span_to_dict(s) for s in spans)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+def create_processor(name: str = TRACE_EXPORTER):
+    if name == "none":
+        return None
+    if name == "console":
+        return SimpleSpanProcessor(ConsoleSpanExporter())
+    if name == "jsonl":
+        return BatchSpanProcessor(JsonlSpanExporter())
+    if name == "memory":
+        return SimpleSpanProcessor(MemorySpanExporter())
+    if name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return BatchSpanProcessor(OTLPSpanExporter())
+    raise ValueError(f"Unknown TRACE_EXPORTER: {name}")
+
+
+# --- Durações por requisição ---
+
+class RequestStages(SpanProcessor):
+    """Junta a duração dos spans de cada requisição (para o finalize_response)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = OrderedDict()  # requisição -> {etapa: ms}
+
+    def on_end(self, span):
+        request_id = (span.attributes or {}).get("pf.request_id")
+        if not request_id:
+            return
+        duration = (span.end_time - span.start_time) / 1e6
+        with self._lock:
+            stages = self._stages.setdefault(request_id, defaultdict(float))
+            stages[span.name] += duration
+            while len(self._stages) > MAX_PENDING_REQUESTS:
+                self._stages.popitem(last=False)
+
+    def pop(self, request_id) -> dict:
+        with self._lock:
+            stages = self._stages.pop(request_id, {})
+        return {name: round(ms, 1) for name, ms in stages.items()}
+
+
+class FlowTelemetry:
+    def __init__(self, processor=None):
+        self.provider = TracerProvider(resource=Resource.create({"service.name": TRACE_SERVICE_NAME}))
+        self.stages = RequestStages()
+        self.provider.add_span_processor(self.stages)
+        self.processor = processor if processor is not None else create_processor()
+        if self.processor is not None:
+            self.provider.add_span_processor(self.processor)
+        self.tracer = self.provider.get_tracer("civic-flow")
+        self._lock = threading.Lock()
+        self._requests = OrderedDict()  # requisição -> contexto pai (traceparent)
+
+    def begin_request(self, traceparent: str = None):
+        """Registra o traceparent do backend para a requisição atual."""
+        request_id, _ = current_context()
+        parent = _propagator.extract({"traceparent": traceparent} if traceparent else {})
+        if not trace.get_current_span(parent).get_span_context().is_valid:
+            # Chamada direta ao flow (sem backend): um trace novo para os nós da requisição
+            ids = self.provider.id_generator
+            parent = trace.set_span_in_context(trace.NonRecordingSpan(trace.SpanContext(
+                ids.generate_trace_id(), ids.generate_span_id(), is_remote=True,
+                trace_flags=trace.TraceFlags(trace.TraceFlags.SAMPLED)
+            )))
+        with self._lock:
+            self._requests[request_id] = parent
+            while len(self._requests) > MAX_PENDING_REQUESTS:
+                self._requests.popitem(last=False)
+
+    def end_request(self) -> dict:
+        """Fecha a requisição atual; devolve {trace_id, stages: {etapa: ms}}."""
+        request_id, _ = current_context()
+        with self._lock:
+            parent = self._requests.pop(request_id, None)
+        context = trace.get_current_span(parent).get_span_context() if parent else None
+        trace_id = format(context.trace_id, "032x") if context and context.is_valid else None
+        return {"trace_id": trace_id, "stages": self.stages.pop(request_id)}
+
+    @contextmanager
+    def span(self, name: str = None, kind=SpanKind.INTERNAL, **attributes):
+        """Span filho do span atual; no topo do nó, filho do traceparent da requisição."""
+        request_id, node = current_context()
+        current = trace.get_current_span().get_span_context()
+        parent = None
+        if not current.is_valid:
+            with self._lock:
+                parent = self._requests.get(request_id)
+        attributes = {k: v for k, v in attributes.items() if v is not None}
+        if request_id:
+            attributes["pf.request_id"] = request_id
+        if node:
+            attributes["pf.node"] = node
+        with self.tracer.start_as_current_span(
+            name or node or "unknown", context=parent, kind=kind, attributes=attributes,
+            record_exception=True, set_status_on_exception=True
+        ) as span:
+            yield span
+
+    def traced_node(self, func):
+        """Decorator das tools: um span por execução do nó."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.span():
+                return func(*args, **kwargs)
+        return wrapper
+
+
+# Instância global
+telemetry = FlowTelemetry()
+traced_node = telemetry.traced_node
+span = telemetry.span
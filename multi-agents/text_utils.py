@@ -0,0 +1,60 @@
+import re
+import unicodedata
+
+_PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def strip_accents(text: str) -> str:
+    """Remove diacríticos (á -> a, ç -> c)."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalização usada em chaves de cache e matching de nomes:
+    minúsculas, sem acentos, sem pontuação, espaços colapsados.
+    """
+    if not text:
+        return ""
+    text = strip_accents(str(text).lower())
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+# Palavras muito frequentes que não ajudam no ranking lexical (BM25)
+STOPWORDS = frozenset("""
+a ao aos as com da das de do dos e em na nas no nos o os ou para pela pelas pelo pelos por
+que se sem sua suas seu seus um uma umas uns qual quais como sobre ele ela eles elas isso
+""".split())
+
+
+def tokenize(text: str) -> list:
+    """Termos normalizados para busca lexical (sem acentos, sem stopwords)."""
+    return [t for t in normalize_text(text).split() if t not in STOPWORDS]
+
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # Sem tiktoken (ou sem acesso ao vocabulário): usa a estimativa por caracteres
+            _encoding = False
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Tokens do texto (tiktoken cl100k_base quando disponível, senão ~4 caracteres por token)."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return max(1, len(text) // 4)
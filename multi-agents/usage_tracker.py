@@ -0,0 +1,305 @@
+"""
+Uso real de tokens e custo por nó LLM, agregado por requisição, sessão e dia.
+
+Os nós LLM chamam o Azure OpenAI pelo SDK openai (promptflow-tools): install()
+envolve Completions.create / Embeddings.create e registra o `usage` devolvido
+pela API, o deployment e a latência da chamada, com o nó e a requisição
+atuais (contexto do Prompt Flow). O embedding por REST do real_rag_retriever
+registra direto com record_usage().
+
+O finalize_response fecha a requisição (close_request): soma por nó, emite um
+registro estruturado no sink (USAGE_SINK; padrão jsonl, fora do stdout do flow)
+e o custo real entra no orçamento do SimpleProtection (simple_cost_track).
+Agregados por sessão e por dia ficam em memória (stats()).
+
+Preços por deployment em prices.json (PRICE_TABLE_FILE), USD por 1k tokens;
+deployment fora da tabela usa "default" e sai marcado em unpriced.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+
+from opentelemetry.trace import SpanKind
+
+from telemetry import current_context, span
+
+logger = logging.getLogger(__name__)
+
+# Configuração (Variáveis de Ambiente)
+USAGE_TRACKING_ENABLED = os.getenv("USAGE_TRACKING_ENABLED", "true").lower() in ("1", "true", "yes")
+PRICE_TABLE_FILE = os.getenv(
+    "PRICE_TABLE_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "prices.json")
+)
+USAGE_SINK = os.getenv("USAGE_SINK", "jsonl")  # jsonl | stdout | memory | none
+USAGE_SINK_FILE = os.getenv("USAGE_SINK_FILE", "usage.jsonl")
+
+# Requisições abertas (nó falhou antes do finalize_response) e sessões em memória
+MAX_PENDING_REQUESTS = 1000
+MAX_SESSIONS = 10000
+
+
+class PriceTable:
+    def __init__(self, path=PRICE_TABLE_FILE):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        self.deployments = data["deployments"]
+        self.default = data["default"]
+
+    def cost(self, deployment: str, prompt_tokens: int, completion_tokens: int):
+        """(custo em USD, se o deployment está na tabela)."""
+        prices = self.deployments.get(deployment)
+        priced = prices is not None
+        prices = prices or self.default
+        cost = prompt_tokens / 1000 * prices["prompt"] + completion_tokens / 1000 * prices["completion"]
+        return cost, priced
+
+
+# --- Sinks ---
+
+class StdoutSink:
+    """Uma linha JSON por requisição (coletada pelos logs do App Service)."""
+
+    def emit(self, record: dict):
+        print(json.dumps(record, ensure_ascii=False), file=sys.stdout, flush=True)
+
+
+class JsonlSink:
+    def __init__(self, path=USAGE_SINK_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+class MemorySink:
+    """Guarda os registros (testes e benchmarks)."""
+
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record: dict):
+        self.records.append(record)
+
+
+class NullSink:
+    def emit(self, record: dict):
+        pass
+
+
+def create_sink(name: str = USAGE_SINK):
+    if name == "stdout":
+        return StdoutSink()
+    if name == "jsonl":
+        return JsonlSink()
+    if name == "memory":
+        return MemorySink()
+    if name == "none":
+        return NullSink()
+    raise ValueError(f"Unknown USAGE_SINK: {name}")
+
+
+class UsageTracker:
+    def __init__(self, prices: PriceTable = None, sink=None):
+        self.prices = prices or PriceTable()
+        self.sink = sink or create_sink()
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()   # requisição -> [chamadas]
+        self._sessions = OrderedDict()  # sessão -> totais
+        self._days = {}                 # "YYYY-MM-DD" -> {"totals", "nodes"}
+
+    def record_usage(self, deployment: str, prompt_tokens: int, completion_tokens: int = 0,
+                     latency_ms: float = 0.0, kind: str = "chat", estimated: bool = False,
+                     request_id: str = None, node: str = None):
+        """Registra uma chamada de LLM/embedding na requisição atual."""
+        if request_id is None and node is None:
+            request_id, node = current_context()
+        cost, priced = self.prices.cost(deployment, prompt_tokens, completion_tokens)
+        call = {
+            "node": node or "unknown",
+            "kind": kind,
+            "deployment": deployment,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost_usd": cost,
+            "latency_ms": round(latency_ms, 1),
+            "priced": priced,
+            "estimated": estimated
+        }
+        with self._lock:
+            calls = self._pending.setdefault(request_id or "unknown", [])
+            calls.append(call)
+            while len(self._pending) > MAX_PENDING_REQUESTS:
+                self._pending.popitem(last=False)
+        return call
+
+    def close_request(self, session_id: str = None, route: str = None, request_id: str = None) -> dict:
+        """Fecha a requisição atual: soma por nó, atualiza sessão/dia e emite no sink."""
+        if request_id is None:
+            request_id, _ = current_context()
+        with self._lock:
+            calls = self._pending.pop(request_id or "unknown", [])
+
+        nodes = defaultdict(lambda: {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                                     "cost_usd": 0.0, "latency_ms": 0.0})
+        for call in calls:
+            totals = nodes[call["node"]]
+            totals["calls"] += 1
+            totals["prompt_tokens"] += call["prompt_tokens"]
+            totals["completion_tokens"] += call["completion_tokens"]
+            totals["cost_usd"] += call["cost_usd"]
+            totals["latency_ms"] += call["latency_ms"]
+
+        prompt_tokens = sum(n["prompt_tokens"] for n in nodes.values())
+        completion_tokens = sum(n["completion_tokens"] for n in nodes.values())
+        cost = sum(n["cost_usd"] for n in nodes.values())
+        record = {
+            "type": "llm_usage",
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "request_id": request_id,
+            "session_id": session_id,
+            "route": route,
+            "llm_calls": len(calls),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "cost_usd": round(cost, 6),
+            "unpriced": sorted({c["deployment"] for c in calls if not c["priced"]}),
+            "nodes": {name: {**n, "cost_usd": round(n["cost_usd"], 6), "latency_ms": round(n["latency_ms"], 1)}
+                      for name, n in nodes.items()}
+        }
+
+        with self._lock:
+            self._aggregate(record)
+        try:
+            self.sink.emit(record)
+        except Exception as e:
+            logger.warning(f"Usage sink error: {e}")
+        return record
+
+    def _aggregate(self, record):
+        if record["session_id"]:
+            session = self._sessions.pop(record["session_id"], None) or \
+                {"requests": 0, "total_tokens": 0, "cost_usd": 0.0}
+            session["requests"] += 1
+            session["total_tokens"] += record["total_tokens"]
+            session["cost_usd"] += record["cost_usd"]
+            self._sessions[record["session_id"]] = session
+            while len(self._sessions) > MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+
+        day = self._days.setdefault(record["timestamp"][:10], {
+            "totals": {"requests": 0, "llm_calls": 0, "total_tokens": 0, "cost_usd": 0.0},
+            "nodes": defaultdict(lambda: {"calls": 0, "total_tokens": 0, "cost_usd": 0.0, "latency_ms": 0.0})
+        })
+        day["totals"]["requests"] += 1
+        day["totals"]["llm_calls"] += record["llm_calls"]
+        day["totals"]["total_tokens"] += record["total_tokens"]
+        day["totals"]["cost_usd"] += record["cost_usd"]
+        for name, n in record["nodes"].items():
+            node = day["nodes"][name]
+            node["calls"] += n["calls"]
+            node["total_tokens"] += n["prompt_tokens"] + n["completion_tokens"]
+            node["cost_usd"] += n["cost_usd"]
+            node["latency_ms"] += n["latency_ms"]
+
+    def session_usage(self, session_id: str) -> dict:
+        with self._lock:
+            return dict(self._sessions.get(session_id) or {})
+
+    def stats(self, day: str = None) -> dict:
+        """Totais do dia (UTC) e ranking dos nós por custo."""
+        day = day or datetime.utcnow().strftime("%Y-%m-%d")
+        with self._lock:
+            data = self._days.get(day)
+            if not data:
+                return {"day": day, "totals": {}, "nodes": {}}
+            nodes = sorted(data["nodes"].items(), key=lambda item: -item[1]["cost_usd"])
+            return {
+                "day": day,
+                "totals": {**data["totals"], "cost_usd": round(data["totals"]["cost_usd"], 6)},
+                "nodes": {name: {**n, "cost_usd": round(n["cost_usd"], 6),
+                                 "latency_ms_avg": round(n["latency_ms"] / n["calls"], 1) if n["calls"] else 0.0}
+                          for name, n in nodes}
+            }
+
+
+# Instância global
+usage_tracker = UsageTracker()
+
+
+def record_usage(*args, **kwargs):
+    return usage_tracker.record_usage(*args, **kwargs)
+
+
+# --- Captura no SDK openai ---
+
+def _prompt_text(kwargs):
+    parts = []
+    for message in kwargs.get("messages") or []:
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, list):
+            parts.extend(p.get("text", "") for p in content if isinstance(p, dict))
+        elif content:
+            parts.append(content)
+    inputs = kwargs.get("input")
+    parts.extend(inputs if isinstance(inputs, list) else [inputs or ""])
+    return " ".join(p for p in parts if isinstance(p, str))
+
+
+def _wrap(create, kind):
+    def wrapped(*args, **kwargs):
+        # Nós LLM não têm código Python: o span da chamada é o span do nó
+        with span(None if kind == "chat" else "embedding", kind=SpanKind.CLIENT,
+                  **{"gen_ai.system": "az.ai.openai", "gen_ai.operation.name": kind,
+                     "gen_ai.request.model": kwargs.get("model")}) as current:
+            start = time.perf_counter()
+            response = create(*args, **kwargs)
+            latency_ms = (time.perf_counter() - start) * 1000
+            try:
+                deployment = kwargs.get("model") or getattr(response, "model", None) or "unknown"
+                usage = getattr(response, "usage", None)
+                if usage is not None:
+                    call = record_usage(deployment, usage.prompt_tokens or 0,
+                                        getattr(usage, "completion_tokens", 0) or 0, latency_ms, kind)
+                else:
+                    # Stream sem usage: estima só o prompt
+                    from text_utils import count_tokens
+                    call = record_usage(deployment, count_tokens(_prompt_text(kwargs)), 0, latency_ms, kind,
+                                        estimated=True)
+                current.set_attributes({
+                    "gen_ai.usage.input_tokens": call["prompt_tokens"],
+                    "gen_ai.usage.output_tokens": call["completion_tokens"],
+                    "gen_ai.usage.cost_usd": call["cost_usd"],
+                })
+            except Exception as e:
+                logger.warning(f"Usage tracking error: {e}")
+        return response
+
+    wrapped._usage_tracked = True
+    wrapped.__wrapped__ = create
+    return wrapped
+
+
+def install():
+    """Envolve os create() síncronos do SDK openai (idempotente)."""
+    try:
+        from openai.resources import Embeddings
+        from openai.resources.chat import Completions
+    except ImportError:
+        return
+    for api, kind in ((Completions, "chat"), (Embeddings, "embedding")):
+        if not getattr(api.create, "_usage_tracked", False):
+            api.create = _wrap(api.create, kind)
+
+
+if USAGE_TRACKING_ENABLED:
+    install()